@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import importlib.util
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +48,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'trakfit_app.middleware.StudentMiddleware',
+    'trakfit_app.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -54,7 +58,8 @@ ROOT_URLCONF = 'TrakFit.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend, plus render timing for the profiling middleware
+        'BACKEND': 'trakfit_app.profiling.ProfilingDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates']
         ,
         'APP_DIRS': True,
@@ -63,6 +68,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'trakfit_app.context_processors.fragment_cache',
             ],
         },
     },
@@ -73,14 +79,120 @@ WSGI_APPLICATION = 'TrakFit.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Chosen by the environment: TRAKFIT_DB_ENGINE=sqlite (default) or postgresql
+
+TRAKFIT_DB_ENGINE = os.environ.get('TRAKFIT_DB_ENGINE', 'sqlite')
+
+if TRAKFIT_DB_ENGINE == 'postgresql':
+    # Persistent connections (TRAKFIT_DB_CONN_MAX_AGE seconds), or a psycopg
+    # connection pool per worker with TRAKFIT_DB_POOL=1 (requires psycopg[pool])
+    TRAKFIT_DB_POOL = os.environ.get('TRAKFIT_DB_POOL', '0') == '1'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('TRAKFIT_DB_NAME', 'trakfit'),
+            'USER': os.environ.get('TRAKFIT_DB_USER', ''),
+            'PASSWORD': os.environ.get('TRAKFIT_DB_PASSWORD', ''),
+            'HOST': os.environ.get('TRAKFIT_DB_HOST', ''),
+            'PORT': os.environ.get('TRAKFIT_DB_PORT', ''),
+            # A pool replaces persistent connections; Django rejects both together
+            'CONN_MAX_AGE': 0 if TRAKFIT_DB_POOL else int(os.environ.get('TRAKFIT_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('TRAKFIT_DB_POOL_MIN_SIZE', '2')),
+                    'max_size': int(os.environ.get('TRAKFIT_DB_POOL_MAX_SIZE', '20')),
+                    'timeout': 30,
+                },
+            } if TRAKFIT_DB_POOL else {},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('TRAKFIT_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite tuning for concurrent writers, applied to every new connection by
+# trakfit_app.database (TRAKFIT_SQLITE_TUNING=0 keeps SQLite's defaults):
+# WAL lets readers run alongside the writer, writers wait up to busy_timeout ms
+# for the lock instead of failing with "database is locked", synchronous=NORMAL
+# only syncs at checkpoints in WAL mode, and reads go through a memory map.
+# Transactions take the write lock when they start (IMMEDIATE), so a reader
+# never has to upgrade to a writer, which fails at once when another writer holds the lock.
+TRAKFIT_SQLITE_TUNING = os.environ.get('TRAKFIT_SQLITE_TUNING', '1') == '1'
+TRAKFIT_SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'busy_timeout': int(os.environ.get('TRAKFIT_SQLITE_BUSY_TIMEOUT', '20000')),
+    'synchronous': 'normal',
+    'mmap_size': int(os.environ.get('TRAKFIT_SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+}
+
+if TRAKFIT_DB_ENGINE != 'postgresql' and TRAKFIT_SQLITE_TUNING:
+    DATABASES['default']['OPTIONS'] = {
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': TRAKFIT_SQLITE_PRAGMAS['busy_timeout'] / 1000,
     }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per process; use FileBasedCache (or a shared cache) when running several workers
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'trakfit',
+    },
+    # {% cache %} fragments of the large templates (teacher dashboard, student profile)
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'trakfit-fragments',
+    },
 }
 
+# Cached teacher dashboard totals expire after this many seconds even without invalidation
+TRAKFIT_DASHBOARD_CACHE_TIMEOUT = 60 * 60
+
+# Template fragments are keyed by the viewer's role and the data version they show, so
+# they never go stale; the timeout only frees memory from fragments of old versions
+TRAKFIT_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+
+# Sessions
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/#configuring-the-session-engine
+# Chosen by TRAKFIT_SESSION_PROFILE, to take session reads and writes off the database:
+# - db: the django_session table (Django's default)
+# - cached_db: the table, read through the sessions cache (writes still go to the table)
+# - cache: the sessions cache only; sessions end when it is cleared or evicts them
+# - signed_cookies: in the client's cookie, nothing stored on the server; a session
+#   can't be revoked before it expires, so keep SESSION_COOKIE_AGE short
+TRAKFIT_SESSION_PROFILE = os.environ.get('TRAKFIT_SESSION_PROFILE', 'db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[TRAKFIT_SESSION_PROFILE]
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_COOKIE_AGE = int(os.environ.get('TRAKFIT_SESSION_COOKIE_AGE', str(60 * 60 * 24 * 14)))
+
+# The sessions cache has to be shared by every worker: Redis when
+# TRAKFIT_SESSION_CACHE_URL is set (redis://...), files in cache/sessions otherwise
+if TRAKFIT_SESSION_PROFILE in ('cached_db', 'cache') and os.environ.get('TRAKFIT_SESSION_CACHE_URL'):
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['TRAKFIT_SESSION_CACHE_URL'],
+    }
+elif TRAKFIT_SESSION_PROFILE in ('cached_db', 'cache'):
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'sessions',
+        'TIMEOUT': SESSION_COOKIE_AGE,
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -101,6 +213,43 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing profile, chosen by TRAKFIT_HASHER_PROFILE:
+# pbkdf2 (Django's default), scrypt, or argon2 (scrypt when argon2-cffi isn't installed).
+# The first hasher hashes new passwords; the others verify existing hashes, which
+# are rehashed with the first one when their user next logs in.
+TRAKFIT_HASHER_PROFILE = os.environ.get('TRAKFIT_HASHER_PROFILE', 'pbkdf2')
+if TRAKFIT_HASHER_PROFILE == 'argon2' and importlib.util.find_spec('argon2') is None:
+    TRAKFIT_HASHER_PROFILE = 'scrypt'
+
+# scrypt: n (CPU/memory cost), r (block size) and p; uses 128 * n * r bytes (16 MiB) per hash
+TRAKFIT_SCRYPT = {
+    'work_factor': int(os.environ.get('TRAKFIT_SCRYPT_N', str(2 ** 14))),
+    'block_size': 8,
+    'parallelism': 1,
+}
+# Argon2id: passes, memory in KiB (64 MiB) and lanes; one lane per hash, as each
+# request is served by a single thread
+TRAKFIT_ARGON2 = {
+    'time_cost': int(os.environ.get('TRAKFIT_ARGON2_TIME_COST', '2')),
+    'memory_cost': int(os.environ.get('TRAKFIT_ARGON2_MEMORY_COST', '65536')),
+    'parallelism': 1,
+}
+
+_PROFILE_HASHERS = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'trakfit_app.hashers.TunedScryptPasswordHasher',
+    'argon2': 'trakfit_app.hashers.TunedArgon2PasswordHasher',
+}
+if importlib.util.find_spec('argon2') is None:
+    del _PROFILE_HASHERS['argon2']
+PASSWORD_HASHERS = [_PROFILE_HASHERS[TRAKFIT_HASHER_PROFILE]] + [
+    hasher for profile, hasher in _PROFILE_HASHERS.items() if profile != TRAKFIT_HASHER_PROFILE
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+# Processes hashing the passwords of imported accounts (roster upload and manage.py import_roster)
+TRAKFIT_HASH_WORKERS = int(os.environ.get('TRAKFIT_HASH_WORKERS', '0')) or None
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -133,3 +282,36 @@ AUTH_USER_MODEL = 'trakfit_app.User'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'student-dashboard'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Audit feed (trakfit_app.audit): entries are written in the transaction of the change
+# they record. TRAKFIT_AUDIT_ASYNC=1 batches them in a background thread instead, which
+# is faster but loses the entries still queued when a worker process is killed.
+TRAKFIT_AUDIT_ASYNC = os.environ.get('TRAKFIT_AUDIT_ASYNC', '0') == '1'
+TRAKFIT_AUDIT_BATCH_SIZE = 200
+TRAKFIT_AUDIT_FLUSH_INTERVAL = 0.5
+
+# Per-request profiling (trakfit_app.profiling.ProfilingMiddleware)
+# Profile every request, or only staff requests that send the header below
+TRAKFIT_PROFILING = False
+TRAKFIT_PROFILING_HEADER = 'X-TrakFit-Profile'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'profiling_file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': BASE_DIR / 'profiling.log',
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'trakfit.profiling': {
+            'handlers': ['profiling_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
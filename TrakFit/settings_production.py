@@ -0,0 +1,70 @@
+"""
+Production settings for TrakFit: settings.py with debugging off and templates
+parsed once per process.
+
+    DJANGO_SETTINGS_MODULE=TrakFit.settings_production
+
+DJANGO_SECRET_KEY must be set; DJANGO_ALLOWED_HOSTS is a comma-separated list of
+host names. TRAKFIT_CACHE_URL (redis://...) points the caches at a Redis server.
+The TRAKFIT_* environment variables of settings.py apply as well.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, CACHES, TEMPLATES
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+DEBUG = False
+
+ALLOWED_HOSTS = [host.strip() for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host.strip()]
+
+# Cache invalidations (student versions, dashboard totals, template fragments) must
+# reach every worker process, so the per-process LocMemCache of settings.py is not
+# used here: Redis when TRAKFIT_CACHE_URL is set, files in cache/ otherwise (one host)
+if os.environ.get('TRAKFIT_CACHE_URL'):
+    CACHES = {
+        **CACHES,
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['TRAKFIT_CACHE_URL'],
+            'KEY_PREFIX': 'trakfit',
+        },
+        'template_fragments': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['TRAKFIT_CACHE_URL'],
+            'KEY_PREFIX': 'trakfit-fragments',
+        },
+    }
+else:
+    CACHES = {
+        **CACHES,
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'cache' / 'default',
+        },
+        'template_fragments': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'cache' / 'fragments',
+        },
+    }
+
+# Compile each template once and keep it in memory. Django also caches templates by
+# default when no loaders are given, but the large dashboard and profile templates
+# shouldn't depend on that default, so the cached loader is configured explicitly.
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+        },
+    },
+]
@@ -37,7 +37,13 @@ urlpatterns = [
     path('student/test/update/<int:test_id>/', views.update_test_view, name='update-test'),
     path('student/test/remark/', views.add_remark, name='add-remark'),
     path('teacher-dashboard/', views.teacher_dashboard, name='teacher_dashboard'),
+    path('teacher-dashboard/tests/', views.teacher_tests_api, name='teacher_tests_api'),
+    path('teacher-dashboard/averages/', views.teacher_averages_api, name='teacher_averages_api'),
+    path('teacher-dashboard/export/', views.export_tests, name='export_tests'),
     path('student-management/', views.student_management, name='student_management'),
+    path('student-management/import/', views.import_roster, name='import_roster'),
+    path('student-management/search/', views.student_search_api, name='student_search_api'),
+    path('search/', views.search_api, name='search_api'),
     path('student-profile/<str:student_no>/', views.student_profile, name='student_profile'),
     path('add-remark/', views.add_remark, name='add_remark'),
     path('change-password/', views.change_password, name='change_password'),
@@ -0,0 +1,70 @@
+"""
+Shared setup for the TrakFit benchmark scripts.
+
+Each benchmark runs against a throwaway SQLite database so it never touches
+db.sqlite3. With TRAKFIT_DB_ENGINE=postgresql the configured database is used
+instead (and emptied), so point TRAKFIT_DB_NAME at a scratch database. Run the scripts from the project root, e.g.
+`python benchmarks/query_plans.py`.
+"""
+import atexit
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(database=None):
+    """Point Django at a temporary SQLite database (unless PostgreSQL is configured) and apply all migrations."""
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TrakFit.settings')
+
+    from django.conf import settings
+    if settings.TRAKFIT_DB_ENGINE == 'sqlite':
+        if database is None:
+            fd, database = tempfile.mkstemp(prefix='trakfit-bench-', suffix='.sqlite3')
+            os.close(fd)
+            atexit.register(_remove_database, database)
+        settings.DATABASES['default']['NAME'] = database
+    settings.ALLOWED_HOSTS = ['testserver']
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return database
+
+
+def _remove_database(database):
+    # WAL mode leaves -wal/-shm files next to the database
+    for path in (database, f'{database}-wal', f'{database}-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def seed(students, tests_per_student, sections=10, seed=0):
+    """Populate the benchmark database with `manage.py seed_trakfit`."""
+    from django.core.management import call_command
+    call_command(
+        'seed_trakfit',
+        students=students,
+        tests_per_student=tests_per_student,
+        sections=sections,
+        seed=seed,
+        verbosity=0,
+    )
+
+
+def timed(func, repeat=5):
+    """Run func `repeat` times and return (result, best wall time in ms)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
@@ -0,0 +1,134 @@
+"""
+Simulate a class submitting its post-tests at once: every student POSTs to
+student_post_test_view at the same moment, each from its own thread and database
+connection, and the outcome is compared across database profiles.
+
+    python benchmarks/concurrent_writes.py [--submissions 200] [--profiles sqlite-default sqlite-tuned]
+
+Profiles: `sqlite-default` (SQLite's rollback journal and Django's defaults),
+`sqlite-tuned` (the WAL/busy_timeout settings of TRAKFIT_SQLITE_PRAGMAS) and
+`postgresql` (the TRAKFIT_DB_* environment; its database is emptied).
+Each profile runs in a fresh process, since settings are read at startup.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from common import seed, setup_django
+
+
+PROFILES = {
+    'sqlite-default': {'TRAKFIT_DB_ENGINE': 'sqlite', 'TRAKFIT_SQLITE_TUNING': '0'},
+    'sqlite-tuned': {'TRAKFIT_DB_ENGINE': 'sqlite', 'TRAKFIT_SQLITE_TUNING': '1'},
+    'postgresql': {'TRAKFIT_DB_ENGINE': 'postgresql'},
+}
+
+POST_TEST = {
+    'height_cm': '165.0',
+    'weight_kg': '60.5',
+    'vo2_distance_m': '2400',
+    'flexibility_cm': '20.0',
+    'strength_reps': '30',
+    'agility_sec': '12.50',
+    'speed_sec': '7.20',
+    'endurance_time': '12:30',
+}
+
+
+def submit_all(submissions):
+    """POST one post-test per student concurrently; return the outcome as a dict."""
+    from django.db import connection
+    from django.test import Client
+    from trakfit_app import audit
+    from trakfit_app.models import FitnessTest, Student
+
+    seed(submissions, 1)
+    clients = []
+    for student in Student.objects.select_related('user').order_by('pk'):
+        client = Client()
+        client.force_login(student.user)
+        clients.append(client)
+    connection.close()
+
+    barrier = threading.Barrier(len(clients))
+    outcomes = [None] * len(clients)
+
+    def submit(index, client):
+        barrier.wait()
+        started = time.perf_counter()
+        try:
+            response = client.post('/student-post-test/', POST_TEST)
+            # The view redirects on success and re-renders the form with the error otherwise
+            outcome = 'saved' if response.status_code == 302 else 'failed'
+        except Exception as e:
+            outcome = f'error: {type(e).__name__}: {e}'
+        finally:
+            connection.close()
+        outcomes[index] = (outcome, (time.perf_counter() - started) * 1000)
+
+    threads = [threading.Thread(target=submit, args=(i, client)) for i, client in enumerate(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    audit.flush()
+
+    latencies = [latency for _, latency in outcomes]
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    errors = {}
+    for outcome, _ in outcomes:
+        if outcome.startswith('error'):
+            errors[outcome] = errors.get(outcome, 0) + 1
+    return {
+        'saved': sum(outcome == 'saved' for outcome, _ in outcomes),
+        'failed': sum(outcome != 'saved' for outcome, _ in outcomes),
+        'stored': FitnessTest.objects.filter(test_type='post').count(),
+        'p50': cuts[49],
+        'p99': cuts[98],
+        'seconds': elapsed,
+        'errors': errors,
+    }
+
+
+def run_profile(profile, submissions):
+    """Run one profile in a child process and return its outcome."""
+    env = dict(os.environ, **PROFILES[profile])
+    output = subprocess.run(
+        [sys.executable, __file__, '--child', '--submissions', str(submissions)],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--submissions', type=int, default=200)
+    parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES), default=['sqlite-default', 'sqlite-tuned'])
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        setup_django()
+        print(json.dumps(submit_all(args.submissions)))
+        return
+
+    print(f"{'profile':<16} {'saved':>6} {'failed':>7} {'stored':>7} {'p50 ms':>9} {'p99 ms':>9} {'total s':>8}")
+    for profile in args.profiles:
+        result = run_profile(profile, args.submissions)
+        print(
+            f"{profile:<16} {result['saved']:>6} {result['failed']:>7} {result['stored']:>7} "
+            f"{result['p50']:>9.1f} {result['p99']:>9.1f} {result['seconds']:>8.2f}"
+        )
+        for error, count in sorted(result['errors'].items()):
+            print(f'    {count} x {error}')
+
+
+if __name__ == '__main__':
+    main()
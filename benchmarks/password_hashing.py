@@ -0,0 +1,62 @@
+"""
+Measure password hashing throughput of each hasher profile: registrations/sec
+(hashing a new password) and logins/sec (verifying one) on a single core, and
+accounts/sec when an imported roster's passwords are hashed in a process pool.
+
+    python benchmarks/password_hashing.py [--hashes 20] [--accounts 200] [--workers 4]
+"""
+import argparse
+import os
+import time
+
+from common import setup_django
+
+
+PROFILES = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'trakfit_app.hashers.TunedScryptPasswordHasher',
+    'argon2': 'trakfit_app.hashers.TunedArgon2PasswordHasher',
+}
+
+
+def rate(func, count):
+    """Calls per second of func, called `count` times."""
+    started = time.perf_counter()
+    for _ in range(count):
+        func()
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hashes', type=int, default=20, help='Hashes timed per single-core measurement')
+    parser.add_argument('--accounts', type=int, default=200, help='Passwords of the bulk import')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth.hashers import check_password, make_password
+    from django.test import override_settings
+    from trakfit_app.hashers import make_passwords
+
+    print(f'{args.workers} worker process(es) for bulk hashing')
+    print(f"{'profile':<8} {'registrations/s':>16} {'logins/s':>9} {'bulk serial/s':>14} {'bulk pool/s':>12}")
+    for profile, hasher in PROFILES.items():
+        try:
+            with override_settings(PASSWORD_HASHERS=[hasher]):
+                encoded = make_password('correct-horse-9')
+                registrations = rate(lambda: make_password('correct-horse-9'), args.hashes)
+                logins = rate(lambda: check_password('correct-horse-9', encoded), args.hashes)
+                passwords = [f'password-{i}' for i in range(args.accounts)]
+                serial = rate(lambda: make_passwords(passwords, workers=1), 1) * args.accounts
+                pool = rate(lambda: make_passwords(passwords, workers=args.workers), 1) * args.accounts
+        except ValueError as e:
+            # e.g. argon2-cffi is not installed
+            print(f'{profile:<8} skipped: {e}')
+            continue
+        print(f'{profile:<8} {registrations:>16.1f} {logins:>9.1f} {serial:>14.1f} {pool:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
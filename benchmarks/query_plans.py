@@ -0,0 +1,78 @@
+"""
+Show SQLite query plans for the hot fitness_tests/updates queries with and without
+the composite indexes, on a seeded dataset (100k tests by default).
+
+    python benchmarks/query_plans.py [--students 10000] [--tests-per-student 10]
+"""
+import argparse
+
+from common import seed, setup_django, timed
+
+
+def hot_queries():
+    """The queries views.py runs on every page load, keyed by a short label."""
+    from trakfit_app.models import FitnessTest, Student, updates
+
+    student_id = Student.objects.order_by('pk').values_list('pk', flat=True)[
+        Student.objects.count() // 2
+    ]
+    return {
+        'latest pre-test of a student': lambda: FitnessTest.objects.filter(
+            student_id=student_id, test_type='pre').order_by('-taken_at')[:1],
+        'test history of a student': lambda: FitnessTest.objects.filter(
+            student_id=student_id).order_by('-taken_at'),
+        'recent updates feed': lambda: updates.objects.all()[:10],
+    }
+
+
+def report(label, queries):
+    print(f'\n=== {label} ===')
+    for name, build in queries.items():
+        plan = build().explain()
+        _, elapsed = timed(lambda: list(build()))
+        print(f'\n-- {name} ({elapsed:.2f} ms)')
+        print(plan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--tests-per-student', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection
+    from trakfit_app.models import FitnessTest, updates
+
+    indexed = [
+        (model, index)
+        for model in (FitnessTest, updates)
+        for index in model._meta.indexes
+        if index.name != 'fitness_tests_taken_at_idx'
+    ]
+
+    # Seed without the composite indexes, then measure before/after adding them
+    with connection.schema_editor() as editor:
+        for model, index in indexed:
+            editor.remove_index(model, index)
+
+    print(f'Seeding {args.students} students x {args.tests_per_student} tests...')
+    seed(args.students, args.tests_per_student)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    queries = hot_queries()
+    report('Before: foreign key index only', queries)
+
+    with connection.schema_editor() as editor:
+        for model, index in indexed:
+            editor.add_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    report('After: composite indexes', queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Count the database work sessions cause per request under each session profile
+(TRAKFIT_SESSION_PROFILE): students log in, open their pages and submit a
+post-test, and every query is classified as a django_session read or write or
+another write.
+
+    python benchmarks/session_writes.py [--students 20] [--profiles db cached_db cache signed_cookies]
+
+Each profile runs in a fresh process, since settings are read at startup; the
+sessions cache lives in a temporary directory.
+"""
+import argparse
+import atexit
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from common import setup_django
+
+
+PROFILES = ['db', 'cached_db', 'cache', 'signed_cookies']
+
+PASSWORD = 'correct-horse-9'
+
+POST_TEST = {
+    'height_cm': '165.0',
+    'weight_kg': '60.5',
+    'vo2_distance_m': '2400',
+    'flexibility_cm': '20.0',
+    'strength_reps': '30',
+    'agility_sec': '12.50',
+    'speed_sec': '7.20',
+    'endurance_time': '12:30',
+}
+
+
+def student_visit(email):
+    """(method, path, data) of the requests of one student's visit."""
+    return [
+        ('post', '/', {'email': email, 'password': PASSWORD}),
+        ('get', '/student-dashboard/', None),
+        ('get', '/student-profile/', None),
+        ('get', '/student-history', None),
+        ('get', '/student-post-test/', None),
+        ('post', '/student-post-test/', POST_TEST),
+        ('get', '/student-profile/', None),
+    ]
+
+
+def count_queries(students):
+    """Session reads, session writes and other writes per request, averaged over every visit."""
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from trakfit_app.models import User
+
+    counts = {'requests': 0, 'session reads': 0, 'session writes': 0, 'other writes': 0}
+
+    def classify(execute, sql, params, many, context):
+        write = sql.startswith(('INSERT', 'UPDATE', 'DELETE'))
+        if 'django_session' in sql:
+            counts['session writes' if write else 'session reads'] += 1
+        elif write:
+            counts['other writes'] += 1
+        return execute(sql, params, many, context)
+
+    settings.TRAKFIT_AUDIT_ASYNC = False
+    call_command('seed_trakfit', students=students, tests_per_student=1, password=PASSWORD, verbosity=0)
+    emails = list(User.objects.filter(student_profile__isnull=False).values_list('email', flat=True))
+
+    with connection.execute_wrapper(classify):
+        for email in emails:
+            client = Client()
+            for method, path, data in student_visit(email):
+                response = getattr(client, method)(path, data or {})
+                if response.status_code >= 400:
+                    raise SystemExit(f'{method.upper()} {path} returned {response.status_code}')
+                counts['requests'] += 1
+    return {name: count / counts['requests'] for name, count in counts.items() if name != 'requests'}
+
+
+def run_profile(profile, students):
+    env = dict(os.environ, TRAKFIT_SESSION_PROFILE=profile)
+    output = subprocess.run(
+        [sys.executable, __file__, '--child', '--students', str(students)],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=20)
+    parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=PROFILES)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TrakFit.settings')
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from django.conf import settings
+        if 'sessions' in settings.CACHES:
+            settings.CACHES['sessions']['LOCATION'] = tempfile.mkdtemp(prefix='trakfit-bench-sessions-')
+            atexit.register(shutil.rmtree, settings.CACHES['sessions']['LOCATION'], True)
+        # Password hashing isn't measured here
+        settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+        setup_django()
+        print(json.dumps(count_queries(args.students)))
+        return
+
+    print('Queries per request')
+    print(f"{'profile':<15} {'session reads':>14} {'session writes':>15} {'other writes':>13}")
+    for profile in args.profiles:
+        result = run_profile(profile, args.students)
+        print(f"{profile:<15} {result['session reads']:>14.2f} {result['session writes']:>15.2f} {result['other writes']:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
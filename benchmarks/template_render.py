@@ -0,0 +1,121 @@
+"""
+Measure template load and render time of the teacher dashboard and the student
+profile page, without and with the cached template loader and {% cache %} fragments.
+
+    python benchmarks/template_render.py [--students 200] [--requests 50]
+
+Configurations:
+- uncached: every request finds and parses the template again (what
+  DEBUG=True did before Django 4.1 made the cached loader the default)
+- cached loader: the loaders of settings_production; fragments re-rendered
+- cached loader + fragments: settings_production as deployed
+
+Times are read from the Server-Timing header of the profiling middleware and
+averaged over the requests after a first, warm-up request. Each configuration
+runs in a fresh process.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from common import seed, setup_django
+
+
+CONFIGS = ['uncached', 'cached loader', 'cached loader + fragments']
+
+PLAIN_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def configure(config):
+    """Template and fragment cache settings of a configuration, applied before Django is set up."""
+    from django.conf import settings
+
+    options = settings.TEMPLATES[0]['OPTIONS']
+    settings.TEMPLATES[0]['APP_DIRS'] = False
+    if config == 'uncached':
+        options['loaders'] = PLAIN_LOADERS
+    else:
+        options['loaders'] = [('django.template.loaders.cached.Loader', PLAIN_LOADERS)]
+    if config != 'cached loader + fragments':
+        settings.CACHES['template_fragments'] = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    settings.TRAKFIT_PROFILING = True
+    settings.TRAKFIT_AUDIT_ASYNC = False
+
+
+def server_timing(response):
+    """{name: ms} of a response's Server-Timing header."""
+    timings = {}
+    for entry in response['Server-Timing'].split(', '):
+        name, duration = entry.split(';')[:2]
+        timings[name] = float(duration.removeprefix('dur='))
+    return timings
+
+
+def measure(students, requests):
+    """Mean load, render and total ms per page."""
+    from django.test import Client
+    from django.urls import reverse
+    from trakfit_app.models import Student, User
+
+    seed(students, 3)
+    teacher = User.objects.create(email='bench-teacher@example.com', is_staff=True)
+    client = Client()
+    client.force_login(teacher)
+    student_no = Student.objects.order_by('pk').values_list('student_no', flat=True).first()
+    pages = {
+        'teacher-dashboard.html': reverse('teacher_dashboard'),
+        'student-profile.html': reverse('student_profile', args=[student_no]),
+    }
+
+    results = {}
+    for template, url in pages.items():
+        client.get(url)
+        sums = {'template_load': 0.0, 'template': 0.0, 'total': 0.0}
+        for _ in range(requests):
+            timings = server_timing(client.get(url))
+            for name in sums:
+                sums[name] += timings.get(name, 0.0)
+        results[template] = {name: total / requests for name, total in sums.items()}
+    return results
+
+
+def run_config(config, students, requests):
+    output = subprocess.run(
+        [sys.executable, __file__, '--child', config, '--students', str(students), '--requests', str(requests)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=50, help='Timed requests per page')
+    parser.add_argument('--child', choices=CONFIGS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TrakFit.settings')
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        configure(args.child)
+        setup_django()
+        print(json.dumps(measure(args.students, args.requests)))
+        return
+
+    print(f'{args.students} students, mean ms over {args.requests} requests')
+    print(f"{'template':<24} {'configuration':<26} {'load':>7} {'render':>7} {'total':>7}")
+    for config in CONFIGS:
+        for template, timings in run_config(config, args.students, args.requests).items():
+            print(
+                f"{template:<24} {config:<26} {timings['template_load']:>7.2f} "
+                f"{timings['template']:>7.2f} {timings['total']:>7.2f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
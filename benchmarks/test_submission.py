@@ -0,0 +1,93 @@
+"""
+Compare the write load of recording a test submission the old way (create the
+test, set endurance, save it again) with recording.record_test(), which writes
+the complete test once inside one transaction.
+
+    python benchmarks/test_submission.py [--submissions 200]
+
+Prints the INSERT/UPDATE statements per table and the time per submission.
+The `updates` feed is written inline so its INSERTs are counted.
+"""
+import argparse
+import time
+
+from common import seed, setup_django
+
+
+SUBMISSION = {
+    'height_cm': '165.0',
+    'weight_kg': '60.5',
+    'vo2_distance_m': '2400',
+    'flexibility_cm': '20.0',
+    'strength_reps': '30',
+    'agility_sec': '12.50',
+    'speed_sec': '7.20',
+}
+ENDURANCE = '12:30'
+
+
+def create_then_save(student):
+    """The submission path the views used before record_test()."""
+    from django.utils import timezone
+    from trakfit_app.models import FitnessTest
+
+    test = FitnessTest.objects.create(student=student, test_type='post', taken_at=timezone.now(), **SUBMISSION)
+    test.set_endurance_from_string(ENDURANCE)
+    test.save()
+
+
+def record(student):
+    from trakfit_app.recording import record_test
+
+    record_test(student, 'post', SUBMISSION, ENDURANCE)
+
+
+def measure(submit, students):
+    """Submit one post-test per student; return ({table: writes per submission}, ms per submission)."""
+    from django.db import connection
+
+    writes = {}
+
+    def count_write(execute, sql, params, many, context):
+        if sql.startswith(('INSERT', 'UPDATE')):
+            table = sql.split('"')[1]
+            writes[table] = writes.get(table, 0) + 1
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    with connection.execute_wrapper(count_write):
+        for student in students:
+            submit(student)
+    elapsed = (time.perf_counter() - started) * 1000
+    return {table: count / len(students) for table, count in writes.items()}, elapsed / len(students)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--submissions', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from trakfit_app.models import Student
+
+    settings.TRAKFIT_AUDIT_ASYNC = False
+    results = {}
+    for label, submit in [('create + save', create_then_save), ('record_test', record)]:
+        # Same starting data for both paths
+        call_command('flush', interactive=False, verbosity=0)
+        seed(args.submissions, 2)
+        results[label] = measure(submit, list(Student.objects.order_by('pk')))
+    tables = sorted({table for writes, _ in results.values() for table in writes})
+    print(f"{'path':<14} " + ' '.join(f'{table:>26}' for table in tables) + f" {'total':>6} {'ms/test':>8}")
+    for label, (writes, elapsed) in results.items():
+        print(
+            f'{label:<14} ' + ' '.join(f'{writes.get(table, 0):>26.1f}' for table in tables)
+            + f' {sum(writes.values()):>6.1f} {elapsed:>8.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
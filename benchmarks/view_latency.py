@@ -0,0 +1,90 @@
+"""
+Measure latency percentiles and query counts of the main TrakFit pages at
+several dataset sizes, using the Django test client.
+
+    python benchmarks/view_latency.py [--scales 100 1000 10000] [--tests-per-student 5] [--repeat 20]
+"""
+import argparse
+import statistics
+import time
+
+from common import seed, setup_django
+
+
+def pages(student_no):
+    """(label, role, path) of every page measured; role picks the logged-in client."""
+    return [
+        ('teacher_dashboard', 'teacher', '/teacher-dashboard/'),
+        ('student_management', 'teacher', '/student-management/'),
+        ('student_profile', 'teacher', f'/student-profile/{student_no}/'),
+        ('student_history', 'student', '/student-history'),
+        ('student_dashboard', 'student', '/student-dashboard/'),
+    ]
+
+
+def measure(client, path, repeat):
+    """Request a page `repeat` times and return (latencies in ms, queries per request)."""
+    from django.db import connection
+
+    # Warm-up request, also used to count queries. CaptureQueriesContext can't be
+    # used here: seeding overflows the bounded query log it slices.
+    queries = []
+
+    def count_query(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query):
+        response = client.get(path)
+    if response.status_code != 200:
+        raise SystemExit(f'{path} returned {response.status_code}')
+
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(path)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, len(queries)
+
+
+def percentiles(latencies):
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return cuts[49], cuts[89], cuts[98]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--tests-per-student', type=int, default=5)
+    parser.add_argument('--sections', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.core.management import call_command
+    from django.test import Client
+    from trakfit_app.models import Student, User
+
+    print(f"{'students':>9} {'view':<20} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'queries':>8}")
+    for scale in args.scales:
+        call_command('flush', interactive=False, verbosity=0)
+        seed(scale, args.tests_per_student, sections=args.sections)
+
+        teacher = Client()
+        teacher.force_login(User.objects.create(email='bench-teacher@seed.trakfit', is_staff=True))
+        student_row = Student.objects.select_related('user').order_by('pk')[scale // 2]
+        student = Client()
+        student.force_login(student_row.user)
+        clients = {'teacher': teacher, 'student': student}
+
+        for label, role, path in pages(student_row.student_no):
+            latencies, queries = measure(clients[role], path, args.repeat)
+            p50, p90, p99 = percentiles(latencies)
+            print(f'{scale:>9} {label:<20} {p50:>9.1f} {p90:>9.1f} {p99:>9.1f} {queries:>8}')
+
+
+if __name__ == '__main__':
+    main()
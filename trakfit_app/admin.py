@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Student, FitnessTest, updates
+from .models import User, Student, FitnessTest, StudentFitnessSnapshot, SectionMetricAggregate, updates
 
 
 class UserAdmin(BaseUserAdmin):
@@ -57,7 +57,7 @@ class FitnessTestAdmin(admin.ModelAdmin):
         ('Timestamps', {'fields': ('created_at', 'updated_at')}),
     )
     
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('bmi', 'vo2_max', 'created_at', 'updated_at')
 
 
 class RemarkAdmin(admin.ModelAdmin):
@@ -90,10 +90,41 @@ class UpdatesAdmin(admin.ModelAdmin):
     readonly_fields = ('updated_at',)
 
 
+class StudentFitnessSnapshotAdmin(admin.ModelAdmin):
+    """Admin for StudentFitnessSnapshot model (read-only, rebuilt from fitness tests)."""
+    list_display = ('student', 'latest_pre', 'latest_post', 'pre_bmi', 'post_bmi', 'updated_at')
+    search_fields = ('student__student_no', 'student__first_name', 'student__last_name')
+    ordering = ('-updated_at',)
+    
+    readonly_fields = ('latest_pre', 'latest_post', 'updated_at')
+
+
+class SectionMetricAggregateAdmin(admin.ModelAdmin):
+    """Admin for SectionMetricAggregate model (read-only, see `manage.py rebuild_aggregates`)."""
+    list_display = ('section_code', 'group_code', 'test_type', 'metric', 'total', 'count', 'sum_squares', 'updated_at')
+    list_filter = ('test_type', 'metric')
+    search_fields = ('section_code', 'group_code')
+    ordering = ('section_code', 'group_code', 'test_type', 'metric')
+    
+    # Totals are maintained incrementally; an edit by hand would throw them off
+    readonly_fields = list_display
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 # Register models
 admin.site.register(User, UserAdmin)
 admin.site.register(Student, StudentAdmin)
 admin.site.register(FitnessTest, FitnessTestAdmin)
 admin.site.register(updates, UpdatesAdmin)
+admin.site.register(StudentFitnessSnapshot, StudentFitnessSnapshotAdmin)
+admin.site.register(SectionMetricAggregate, SectionMetricAggregateAdmin)
 # admin.site.register(Remark, RemarkAdmin) 
 
@@ -0,0 +1,606 @@
+import math
+import uuid
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Concat
+from django.utils import timezone
+from . import metrics
+from .models import Student, FitnessTest, SectionMetricAggregate, StudentFitnessSnapshot
+
+
+# Metric keys in the order the teacher dashboard charts expect them
+METRICS = [
+    'bmi',
+    'vo2_max',
+    'flexibility_cm',
+    'strength_reps',
+    'agility_sec',
+    'speed_sec',
+    'endurance_sec',
+]
+
+
+def _float(field):
+    """Cast a column to a float so SQLite does not fall back to integer division."""
+    return Cast(field, output_field=FloatField())
+
+
+def _present(field):
+    """Match rows where the field is set and non-zero (same as a truthiness check in Python)."""
+    return Q(**{f'{field}__isnull': False}) & ~Q(**{field: 0})
+
+
+def metric_expressions():
+    """
+    Build SQL expressions for every dashboard metric of a fitness test.
+
+    Each expression evaluates to NULL when the Python code would have skipped the
+    value, so SUM/COUNT over them match the old per-student loops. BMI and VO2 max
+    are the generated columns of FitnessTest.
+    """
+    return {
+        'bmi': F('bmi'),
+        'vo2_max': F('vo2_max'),
+        'flexibility_cm': Case(
+            When(_present('flexibility_cm'), then=_float('flexibility_cm')),
+            output_field=FloatField(),
+        ),
+        'strength_reps': Case(
+            When(_present('strength_reps'), then=_float('strength_reps')),
+            output_field=FloatField(),
+        ),
+        'agility_sec': Case(
+            When(_present('agility_sec'), then=_float('agility_sec')),
+            output_field=FloatField(),
+        ),
+        'speed_sec': Case(
+            When(_present('speed_sec'), then=_float('speed_sec')),
+            output_field=FloatField(),
+        ),
+        'endurance_sec': Case(
+            When(endurance_minutes__isnull=False,
+                 then=_float(F('endurance_minutes') * 60 + Coalesce('endurance_seconds', 0))),
+            output_field=FloatField(),
+        ),
+    }
+
+
+def _average(total, count):
+    return float(total / count) if count > 0 else 0
+
+
+def _empty_totals():
+    totals = {}
+    for metric in METRICS:
+        for test_type in ('pre', 'post'):
+            totals[f'{test_type}_total_{metric}'] = 0
+            totals[f'{test_type}_count_{metric}'] = 0
+            totals[f'{test_type}_sumsq_{metric}'] = 0
+    totals['bmi_change'] = 0
+    totals['bmi_change_count'] = 0
+    return totals
+
+
+def _averages_from_totals(data):
+    averages = {
+        metric: {
+            'pre': _average(data[f'pre_total_{metric}'], data[f'pre_count_{metric}']),
+            'post': _average(data[f'post_total_{metric}'], data[f'post_count_{metric}']),
+        }
+        for metric in METRICS
+    }
+    averages['bmi_change'] = _average(data['bmi_change'], data['bmi_change_count'])
+    return averages
+
+
+def _stddev(total, sum_squares, count):
+    if count <= 0:
+        return 0
+    mean = total / count
+    return math.sqrt(max(sum_squares / count - mean * mean, 0))
+
+
+def _stddevs_from_totals(data):
+    """Population standard deviation of every metric, keyed like the averages."""
+    return {
+        metric: {
+            test_type: _stddev(
+                data[f'{test_type}_total_{metric}'],
+                data[f'{test_type}_sumsq_{metric}'],
+                data[f'{test_type}_count_{metric}'],
+            )
+            for test_type in ('pre', 'post')
+        }
+        for metric in METRICS
+    }
+
+
+def test_metric_values(test):
+    """Python twin of metric_expressions(): {metric: float or None} for one test."""
+    if test is None:
+        return {metric: None for metric in METRICS}
+
+    def present(value):
+        return float(value) if value else None
+
+    columns = metrics.test_columns([test])
+    endurance = metrics.endurance_seconds(columns['endurance_minutes'], columns['endurance_seconds'])[0]
+    return {
+        'bmi': metrics.bmi(columns['height_cm'], columns['weight_kg'])[0],
+        'vo2_max': metrics.vo2_max(columns['vo2_distance_m'])[0],
+        'flexibility_cm': present(test.flexibility_cm),
+        'strength_reps': present(test.strength_reps),
+        'agility_sec': present(test.agility_sec),
+        'speed_sec': present(test.speed_sec),
+        'endurance_sec': float(endurance) if endurance is not None else None,
+    }
+
+
+def snapshot_contribution(snapshot):
+    """
+    The values a student's latest tests add to their section's aggregates.
+
+    Returns {"<test_type>:<metric>": value} for every value that is set. Besides
+    the METRICS, the post-test carries `bmi_change` (when both tests have a BMI)
+    and a 1.0 under `bmi_<category>` for its BMI category (metrics.BMI_CATEGORIES,
+    lowercased).
+    """
+    contribution = {}
+    pre = test_metric_values(snapshot.latest_pre)
+    post = test_metric_values(snapshot.latest_post)
+    for test_type, values in (('pre', pre), ('post', post)):
+        for metric, value in values.items():
+            if value is not None:
+                contribution[f'{test_type}:{metric}'] = value
+    if pre['bmi'] is not None and post['bmi'] is not None:
+        contribution['post:bmi_change'] = post['bmi'] - pre['bmi']
+    if post['bmi'] is not None:
+        contribution[f"post:bmi_{metrics.bmi_category([post['bmi']])[0].lower()}"] = 1.0
+    return contribution
+
+
+def _apply_deltas(section_code, group_code, deltas):
+    """Add {"<test_type>:<metric>": (total, count, sum_squares)} deltas to a section's rows."""
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    rows = [key.split(':', 1) for key in deltas]
+    # Only a row gaining a contribution can be missing: one a contribution is
+    # subtracted from or moved within was created when that contribution was added
+    added = [key.split(':', 1) for key, delta in deltas.items() if delta[1] > 0]
+    if added:
+        SectionMetricAggregate.objects.bulk_create(
+            [
+                SectionMetricAggregate(section_code=section_code, group_code=group_code, test_type=test_type, metric=metric)
+                for test_type, metric in added
+            ],
+            ignore_conflicts=True,
+        )
+
+    # One UPDATE for every row of the section, picking each row's delta with CASE
+    def delta_case(index, output_field):
+        return Case(
+            *[
+                When(test_type=test_type, metric=metric, then=Value(deltas[f'{test_type}:{metric}'][index]))
+                for test_type, metric in rows
+            ],
+            default=Value(0),
+            output_field=output_field,
+        )
+
+    rows_match = Q(pk__in=[])
+    for test_type, metric in rows:
+        rows_match |= Q(test_type=test_type, metric=metric)
+    SectionMetricAggregate.objects.filter(rows_match, section_code=section_code, group_code=group_code).update(
+        total=F('total') + delta_case(0, FloatField()),
+        count=F('count') + delta_case(1, IntegerField()),
+        sum_squares=F('sum_squares') + delta_case(2, FloatField()),
+        updated_at=timezone.now(),
+    )
+
+
+def _contribution_deltas(snapshot, removed=False):
+    """
+    Deltas moving a snapshot's contribution from what it last added to its current values.
+
+    Returns ({(section_code, group_code): {key: (total, count, sum_squares)}}, new contribution).
+    """
+    student = snapshot.student
+    old = snapshot.aggregated_metrics or {}
+    old_section = (snapshot.aggregated_section_code, snapshot.aggregated_group_code)
+    new = {} if removed else snapshot_contribution(snapshot)
+    new_section = (student.section_code, student.group_code)
+
+    def contribution_delta(values, sign):
+        return {key: (sign * value, sign, sign * value * value) for key, value in values.items()}
+
+    if old_section == new_section:
+        deltas = {}
+        for key in old.keys() | new.keys():
+            before, after = old.get(key), new.get(key)
+            deltas[key] = (
+                (after or 0) - (before or 0),
+                (after is not None) - (before is not None),
+                (after or 0) ** 2 - (before or 0) ** 2,
+            )
+        return {new_section: deltas}, new
+
+    sections = {new_section: contribution_delta(new, 1)}
+    if old and old_section[0] is not None:
+        sections[old_section] = contribution_delta(old, -1)
+    return sections, new
+
+
+def _record_contribution(snapshot, new):
+    """Store the contribution on the snapshot; True when it changed."""
+    new_section = (snapshot.student.section_code, snapshot.student.group_code)
+    old_section = (snapshot.aggregated_section_code, snapshot.aggregated_group_code)
+    if snapshot.aggregated_metrics == new and old_section == new_section:
+        return False
+    snapshot.aggregated_section_code, snapshot.aggregated_group_code = new_section
+    snapshot.aggregated_metrics = new
+    return True
+
+
+AGGREGATED_FIELDS = ['aggregated_section_code', 'aggregated_group_code', 'aggregated_metrics']
+
+
+def sync_section_aggregates(snapshot, removed=False, save=True):
+    """
+    Move a student's contribution in SectionMetricAggregate to match their snapshot.
+
+    Subtracts what the snapshot last added (possibly to another section) and adds
+    its current values, then records them on the snapshot. With `removed=True`
+    the student's contribution is only subtracted (the student is being deleted).
+    With `save=False` the snapshot is left for the caller to save.
+    """
+    sections, new = _contribution_deltas(snapshot, removed)
+    for section, deltas in sections.items():
+        _apply_deltas(*section, deltas)
+    if not removed and _record_contribution(snapshot, new) and save:
+        snapshot.save(update_fields=AGGREGATED_FIELDS)
+
+
+def refresh_student_aggregates(student):
+    """
+    Refresh a student's snapshot from their tests and move their contribution in
+    SectionMetricAggregate to match, writing the snapshot row once.
+    """
+    snapshot = StudentFitnessSnapshot.refresh_for(student, save=False)
+    sync_section_aggregates(snapshot, save=False)
+    snapshot.save()
+    return snapshot
+
+
+def sync_many_section_aggregates(snapshots):
+    """sync_section_aggregates() for many snapshots: one UPDATE per touched section."""
+    merged = {}
+    changed = []
+    for snapshot in snapshots:
+        sections, new = _contribution_deltas(snapshot)
+        for section, deltas in sections.items():
+            section_deltas = merged.setdefault(section, {})
+            for key, delta in deltas.items():
+                previous = section_deltas.get(key, (0, 0, 0))
+                section_deltas[key] = tuple(a + b for a, b in zip(previous, delta))
+        if _record_contribution(snapshot, new):
+            changed.append(snapshot)
+
+    for section, deltas in merged.items():
+        _apply_deltas(*section, deltas)
+    StudentFitnessSnapshot.objects.bulk_create(
+        changed, batch_size=1000, update_conflicts=True, unique_fields=['student'], update_fields=AGGREGATED_FIELDS,
+    )
+
+
+def _section_filter(sections, prefix=''):
+    """Q matching the given (section_code, group_code) pairs, or everything for None."""
+    if sections is None:
+        return Q()
+    match = Q(pk__in=[])
+    for section_code, group_code in sections:
+        match |= Q(**{f'{prefix}section_code': section_code, f'{prefix}group_code': group_code})
+    return match
+
+
+def _empty_section(section_code, group_code):
+    return {
+        'section': (section_code, group_code),
+        'totals': _empty_totals(),
+        'bmi_status': {},
+        'dates': {'pre_test_dates': [], 'post_test_dates': []},
+        'students': 0,
+    }
+
+
+def compute_section_totals(sections=None):
+    """
+    Read the raw dashboard sums and counts of every section, in three queries.
+
+    Totals come from the incrementally maintained SectionMetricAggregate rows, so
+    the cost depends on the number of sections, not students or tests.
+    `sections` limits the work to a list of (section_code, group_code) pairs.
+    Returns {"<section_code>-<group_code>": {'section', 'totals', 'bmi_status',
+    'dates', 'students'}}; combine_section_totals() turns any set of them into the
+    dashboard payload, so sections can be recomputed (and cached) separately.
+    """
+    # 1) Sections and student totals
+    section_data = {}
+    students = Student.objects.filter(_section_filter(sections))
+    for row in students.values('section_code', 'group_code').annotate(n=Count('pk')).order_by():
+        section = section_data[f"{row['section_code']}-{row['group_code']}"] = _empty_section(row['section_code'], row['group_code'])
+        section['students'] = row['n']
+
+    # 2) Running sums, counts and BMI categories of the latest pre/post tests
+    for row in SectionMetricAggregate.objects.filter(_section_filter(sections)).filter(count__gt=0):
+        section = section_data.get(f'{row.section_code}-{row.group_code}')
+        if section is None:
+            continue
+        totals = section['totals']
+        if row.metric == 'bmi_change':
+            totals['bmi_change'] += row.total
+            totals['bmi_change_count'] += row.count
+        elif row.metric.startswith('bmi_'):
+            status = row.metric[len('bmi_'):].capitalize()
+            section['bmi_status'][status] = section['bmi_status'].get(status, 0) + row.count
+        elif row.metric in METRICS:
+            totals[f'{row.test_type}_total_{row.metric}'] += row.total
+            totals[f'{row.test_type}_count_{row.metric}'] += row.count
+            totals[f'{row.test_type}_sumsq_{row.metric}'] += row.sum_squares
+
+    # 3) Dates of every latest pre/post test
+    snapshots = (
+        StudentFitnessSnapshot.objects
+        .filter(_section_filter(sections, 'student__'))
+        .values_list('student__section_code', 'student__group_code', 'latest_pre__taken_at', 'latest_post__taken_at')
+        .order_by('student_id')
+    )
+    for section_code, group_code, pre_taken_at, post_taken_at in snapshots:
+        dates = section_data[f'{section_code}-{group_code}']['dates']
+        if pre_taken_at:
+            dates['pre_test_dates'].append(pre_taken_at.strftime('%Y-%m-%d'))
+        if post_taken_at:
+            dates['post_test_dates'].append(post_taken_at.strftime('%Y-%m-%d'))
+
+    return section_data
+
+
+def combine_section_totals(section_data):
+    """
+    Build the teacher dashboard statistics from compute_section_totals() results.
+
+    Returns a dict with `average`, `section_averages`, `bmi_distribution`, `dates`,
+    `sections` and `total_students`, shaped exactly like the values the
+    teacher-dashboard template has always consumed, plus the matching
+    `stddev` and `section_stddevs`.
+    """
+    global_data = _empty_totals()
+    bmi_status = {}
+    dates = {'pre_test_dates': [], 'post_test_dates': []}
+    total_students = 0
+    for key in sorted(section_data):
+        section = section_data[key]
+        for name, value in section['totals'].items():
+            global_data[name] += value
+        for status, count in section['bmi_status'].items():
+            bmi_status[status] = bmi_status.get(status, 0) + count
+        for name, values in section['dates'].items():
+            dates[name].extend(values)
+        total_students += section['students']
+
+    section_averages = {key: _averages_from_totals(section['totals']) for key, section in section_data.items()}
+    section_stddevs = {key: _stddevs_from_totals(section['totals']) for key, section in section_data.items()}
+
+    # Prepare BMI distribution data for chart
+    bmi_distribution = {
+        'underweight': bmi_status.get('Underweight', 0),
+        'normal': bmi_status.get('Normal', 0),
+        'overweight': bmi_status.get('Overweight', 0),
+        'obese': bmi_status.get('Obese', 0),
+    }
+
+    return {
+        'average': _averages_from_totals(global_data),
+        'section_averages': section_averages,
+        'stddev': _stddevs_from_totals(global_data),
+        'section_stddevs': section_stddevs,
+        'bmi_distribution': bmi_distribution,
+        'dates': dates,
+        'sections': sorted(section_data),
+        'total_students': total_students,
+    }
+
+
+def compute_dashboard_aggregates():
+    """Compute the teacher dashboard statistics in a constant number of queries."""
+    return combine_section_totals(compute_section_totals())
+
+
+# Bump the version whenever the shape of the cached values changes
+DASHBOARD_CACHE_PREFIX = 'trakfit:dashboard:v3'
+DASHBOARD_PAYLOAD_KEY = f'{DASHBOARD_CACHE_PREFIX}:payload'
+DASHBOARD_SECTIONS_KEY = f'{DASHBOARD_CACHE_PREFIX}:sections'
+DASHBOARD_VERSION_KEY = f'{DASHBOARD_CACHE_PREFIX}:version'
+DASHBOARD_SECTIONS_VERSION_KEY = f'{DASHBOARD_CACHE_PREFIX}:sections-version'
+
+
+def _section_cache_key(section_code, group_code):
+    return f'{DASHBOARD_CACHE_PREFIX}:section:{section_code}:{group_code}'
+
+
+def _section_version_key(section_code, group_code):
+    return f'{DASHBOARD_CACHE_PREFIX}:section-version:{section_code}:{group_code}'
+
+
+def _versions(keys):
+    """
+    Current token of each version key; a missing one (invalidated or evicted)
+    starts a new version.
+
+    Cached values are stored with the version read before they were computed and
+    only used while it is current, so a computation that read the database before
+    a write cannot put its result back after the write invalidated it.
+    """
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        versions.update(cache.get_many(missing))
+    # Still missing when the cache keeps nothing (DummyCache): a new token, which no value has
+    return {key: versions.get(key) or uuid.uuid4().hex for key in keys}
+
+
+def get_dashboard_aggregates():
+    """
+    Cached compute_dashboard_aggregates().
+
+    The combined payload is a single cache entry, backed by one entry per
+    section. Invalidating a section drops only that section and the payload,
+    so the next load recomputes a single section and reuses the others.
+    """
+    timeout = getattr(settings, 'TRAKFIT_DASHBOARD_CACHE_TIMEOUT', 60 * 60)
+    versions = _versions([DASHBOARD_VERSION_KEY, DASHBOARD_SECTIONS_VERSION_KEY])
+    version = versions[DASHBOARD_VERSION_KEY]
+    cached = cache.get(DASHBOARD_PAYLOAD_KEY)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    sections = cache.get(DASHBOARD_SECTIONS_KEY)
+    if sections is None or sections[0] != versions[DASHBOARD_SECTIONS_VERSION_KEY]:
+        # Unknown section list: recompute every section
+        section_data = compute_section_totals()
+        cache.set(
+            DASHBOARD_SECTIONS_KEY,
+            (versions[DASHBOARD_SECTIONS_VERSION_KEY], [section['section'] for section in section_data.values()]),
+            timeout,
+        )
+        # The section versions can only be read now that the sections are known. An
+        # invalidation drops the dashboard version before the section's, so while the
+        # dashboard version is unchanged no section was invalidated since the computation.
+        section_versions = _versions(
+            [DASHBOARD_VERSION_KEY] + [_section_version_key(*section['section']) for section in section_data.values()]
+        )
+        if section_versions[DASHBOARD_VERSION_KEY] == version:
+            cache.set_many(
+                {
+                    _section_cache_key(*section['section']): (section_versions[_section_version_key(*section['section'])], section)
+                    for section in section_data.values()
+                },
+                timeout,
+            )
+    else:
+        keys = {_section_cache_key(*section): section for section in sections[1]}
+        section_versions = _versions([_section_version_key(*section) for section in sections[1]])
+        cached = cache.get_many(keys)
+        section_data = {}
+        missing = []
+        for key, section in keys.items():
+            if key in cached and cached[key][0] == section_versions[_section_version_key(*section)]:
+                section_data[f'{section[0]}-{section[1]}'] = cached[key][1]
+            else:
+                missing.append(section)
+        if missing:
+            computed = compute_section_totals(missing)
+            cache.set_many(
+                {
+                    _section_cache_key(*section['section']): (section_versions[_section_version_key(*section['section'])], section)
+                    for section in computed.values()
+                },
+                timeout,
+            )
+            section_data.update(computed)
+
+    payload = combine_section_totals(section_data)
+    cache.set(DASHBOARD_PAYLOAD_KEY, (version, payload), timeout)
+    return payload
+
+
+def dashboard_version():
+    """
+    Token that changes whenever the dashboard data is invalidated.
+
+    Template fragments of the teacher dashboard are keyed by it.
+    """
+    return _versions([DASHBOARD_VERSION_KEY])[DASHBOARD_VERSION_KEY]
+
+
+def invalidate_dashboard_section(section_code, group_code, sections_changed=False):
+    """
+    Drop a section's cached dashboard totals (and the section list if it may have changed).
+
+    Runs once the surrounding transaction commits, so a concurrent dashboard load
+    cannot re-cache the data from before the write.
+    """
+    # The dashboard version goes first (see get_dashboard_aggregates())
+    keys = [
+        DASHBOARD_VERSION_KEY, DASHBOARD_PAYLOAD_KEY,
+        _section_cache_key(section_code, group_code), _section_version_key(section_code, group_code),
+    ]
+    if sections_changed:
+        keys += [DASHBOARD_SECTIONS_KEY, DASHBOARD_SECTIONS_VERSION_KEY]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_dashboard():
+    """Drop every cached dashboard value, e.g. after bulk writes that skip signals."""
+    sections = cache.get(DASHBOARD_SECTIONS_KEY)
+    sections = sections[1] if sections is not None else []
+    cache.delete_many(
+        [DASHBOARD_VERSION_KEY, DASHBOARD_PAYLOAD_KEY, DASHBOARD_SECTIONS_KEY, DASHBOARD_SECTIONS_VERSION_KEY]
+        + [_section_cache_key(*section) for section in sections]
+        + [_section_version_key(*section) for section in sections]
+    )
+
+
+def filter_date_range(tests, start_date=None, end_date=None):
+    """
+    Restrict tests to those taken between two dates (inclusive).
+
+    Compares the raw taken_at column against day boundaries in the current time
+    zone, instead of using `__date`, so the taken_at index can be used.
+    """
+    if start_date:
+        tests = tests.filter(taken_at__gte=timezone.make_aware(datetime.combine(start_date, time.min)))
+    if end_date:
+        tests = tests.filter(taken_at__lt=timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min)))
+    return tests
+
+
+def filter_section(tests, section):
+    """Restrict tests to a "<section_code>-<group_code>" key as shown on the dashboard."""
+    if not section:
+        return tests
+    return tests.alias(
+        section_key=Concat('student__section_code', Value('-'), 'student__group_code')
+    ).filter(section_key=section)
+
+
+def compute_range_averages(start_date=None, end_date=None, section=None, test_type=None):
+    """
+    Average every metric over all tests taken in a date range, split by test type.
+
+    Returns a dict keyed like `section_averages` (e.g. {'bmi': {'pre': .., 'post': ..}})
+    computed with a single GROUP BY query. Types excluded by `test_type` average to 0.
+    """
+    tests = filter_section(filter_date_range(FitnessTest.objects.all(), start_date, end_date), section)
+    if test_type:
+        tests = tests.filter(test_type=test_type)
+
+    annotations = {}
+    for metric, expression in metric_expressions().items():
+        annotations[f'total_{metric}'] = Sum(expression)
+        annotations[f'count_{metric}'] = Count(expression)
+
+    data = _empty_totals()
+    for row in tests.values('test_type').annotate(**annotations).order_by():
+        for metric in METRICS:
+            data[f"{row['test_type']}_total_{metric}"] += row[f'total_{metric}'] or 0
+            data[f"{row['test_type']}_count_{metric}"] += row[f'count_{metric}']
+
+    averages = _averages_from_totals(data)
+    del averages['bmi_change']
+    return averages
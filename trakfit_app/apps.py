@@ -6,5 +6,6 @@ class TrakfitAppConfig(AppConfig):
     name = 'trakfit_app'
     
     def ready(self):
-        """Import signals when the app is ready."""
+        """Import signals (and the database connection hooks) when the app is ready."""
+        import trakfit_app.database
         import trakfit_app.signals
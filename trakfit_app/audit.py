@@ -0,0 +1,126 @@
+"""
+Writer for the `updates` audit feed.
+
+Signal receivers call `record()`. By default the entry is written right away,
+in the transaction of the change it records, so the two are saved or lost
+together.
+
+With TRAKFIT_AUDIT_ASYNC on, `record()` instead queues the entry once the
+surrounding transaction commits, so a request only pays for appending to an
+in-memory queue. A daemon thread writes queued entries with one bulk INSERT per
+batch of up to TRAKFIT_AUDIT_BATCH_SIZE entries, at most
+TRAKFIT_AUDIT_FLUSH_INTERVAL seconds after the first of them was queued.
+Entries still queued when the process exits normally are written by an atexit
+hook; those of a process that crashes or is killed are lost.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import updates
+
+
+logger = logging.getLogger('trakfit.audit')
+
+# Queued by flush() to make the writer thread write its batch right away
+_FLUSH = object()
+
+
+class AuditWriter:
+    """Queue of `updates` entries written in batches by a background thread."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, student, body):
+        """Add an entry to the updates feed; the entry keeps the time it was recorded."""
+        entry = updates(student=student, body=body, updated_at=timezone.now())
+        if not settings.TRAKFIT_AUDIT_ASYNC:
+            entry.save()
+            return entry
+        transaction.on_commit(lambda: self._enqueue(entry))
+        return entry
+
+    def _enqueue(self, entry):
+        self._queue.put(entry)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='trakfit-audit-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            entries = []
+            flush = False
+            deadline = None
+            while len(entries) < settings.TRAKFIT_AUDIT_BATCH_SIZE:
+                try:
+                    item = self._queue.get(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _FLUSH:
+                    flush = True
+                    break
+                entries.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + settings.TRAKFIT_AUDIT_FLUSH_INTERVAL
+            if entries:
+                close_old_connections()
+                self._write(entries)
+            if flush:
+                self._queue.task_done()
+
+    def _write(self, entries):
+        try:
+            try:
+                updates.objects.bulk_create(entries)
+            except Exception:
+                # e.g. a student deleted before the batch was written: keep the other entries
+                for entry in entries:
+                    try:
+                        updates.objects.bulk_create([entry])
+                    except Exception:
+                        logger.exception('Dropped audit entry %r for student %s', entry.body, entry.student_id)
+        finally:
+            for _ in entries:
+                self._queue.task_done()
+
+    def flush(self):
+        """Write every queued entry now and wait until they are written."""
+        with self._lock:
+            running = self._thread is not None and self._thread.is_alive()
+        if running:
+            self._queue.put(_FLUSH)
+        else:
+            entries = []
+            while True:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if entries:
+                self._write(entries)
+        self._queue.join()
+
+    def pending(self):
+        """Number of entries recorded but not written yet."""
+        return self._queue.unfinished_tasks
+
+
+writer = AuditWriter()
+record = writer.record
+flush = writer.flush
+
+
+@atexit.register
+def _flush_at_exit():
+    if writer.pending():
+        writer.flush()
@@ -0,0 +1,24 @@
+"""
+Template context for the {% cache %} fragments of the large templates.
+
+`role` is the part of a fragment key that depends on who is viewing the page;
+`fragment_cache_timeout` is TRAKFIT_FRAGMENT_CACHE_TIMEOUT.
+"""
+from django.conf import settings
+
+
+def user_role(user):
+    """'teacher', 'student' or 'anonymous'; teachers are staff or superusers."""
+    if not user.is_authenticated:
+        return 'anonymous'
+    if user.is_staff or user.is_superuser:
+        return 'teacher'
+    return 'student'
+
+
+def fragment_cache(request):
+    return {
+        # Resolved only when a template uses it, so other pages don't load the user
+        'role': lambda: user_role(request.user),
+        'fragment_cache_timeout': settings.TRAKFIT_FRAGMENT_CACHE_TIMEOUT,
+    }
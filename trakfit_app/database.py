@@ -0,0 +1,20 @@
+"""
+Per-connection database tuning.
+
+SQLite connections get the TRAKFIT_SQLITE_PRAGMAS (WAL journal, busy timeout,
+synchronous=NORMAL, mmap size) as soon as they are opened; see settings.py.
+Other backends are configured entirely through DATABASES.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    # Signal to apply the SQLite pragmas to every new connection.
+    if connection.vendor != 'sqlite' or not settings.TRAKFIT_SQLITE_TUNING:
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.TRAKFIT_SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
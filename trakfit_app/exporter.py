@@ -0,0 +1,151 @@
+"""
+Streaming export of every fitness test joined with its student.
+
+Rows are read with `.iterator(chunk_size=...)` and written one at a time, so
+memory use does not grow with the number of tests. CSV is always available;
+Parquet output needs the optional pyarrow package.
+"""
+import csv
+
+from .aggregates import filter_date_range, filter_section, metric_expressions
+from .models import FitnessTest
+
+
+CHUNK_SIZE = 2000
+
+# (column name, FitnessTest lookup or derived metric) in export order
+EXPORT_COLUMNS = [
+    ('test_id', 'test_id'),
+    ('student_no', 'student__student_no'),
+    ('last_name', 'student__last_name'),
+    ('first_name', 'student__first_name'),
+    ('section_code', 'student__section_code'),
+    ('group_code', 'student__group_code'),
+    ('gender', 'student__gender'),
+    ('age', 'student__age'),
+    ('test_type', 'test_type'),
+    ('sequence_no', 'sequence_no'),
+    ('taken_at', 'taken_at'),
+    ('height_cm', 'height_cm'),
+    ('weight_kg', 'weight_kg'),
+    ('bmi', 'bmi'),
+    ('vo2_distance_m', 'vo2_distance_m'),
+    ('vo2_max', 'vo2_max'),
+    ('flexibility_cm', 'flexibility_cm'),
+    ('strength_reps', 'strength_reps'),
+    ('agility_sec', 'agility_sec'),
+    ('speed_sec', 'speed_sec'),
+    ('endurance_minutes', 'endurance_minutes'),
+    ('endurance_seconds', 'endurance_seconds'),
+    ('endurance_sec', 'endurance_sec'),
+]
+HEADER = [name for name, _ in EXPORT_COLUMNS]
+
+# Derived columns computed in SQL, with the same expressions as the dashboard
+# (bmi and vo2_max are generated columns of the table)
+DERIVED = ['endurance_sec']
+
+
+def export_rows(start_date=None, end_date=None, section=None, chunk_size=CHUNK_SIZE):
+    """Yield one tuple per fitness test, in EXPORT_COLUMNS order, oldest test_id first."""
+    expressions = metric_expressions()
+    tests = filter_section(filter_date_range(FitnessTest.objects.all(), start_date, end_date), section)
+    tests = (
+        tests
+        .annotate(**{name: expressions[name] for name in DERIVED})
+        .values_list(*[lookup for _, lookup in EXPORT_COLUMNS])
+        .order_by('test_id')
+    )
+    return tests.iterator(chunk_size=chunk_size)
+
+
+# Cells starting with these are evaluated as formulas when the CSV is opened in a
+# spreadsheet (the OWASP CSV injection list)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, float):
+        return round(value, 4)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Student-entered text; quote it so it stays text
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """File-like object whose write() just returns the line, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    """Yield the header and every row as CSV text lines."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def write_parquet(rows, path, row_group_size=50000):
+    """
+    Write rows to a Parquet file, one row group at a time. Returns the row count.
+
+    Raises ImportError when pyarrow is not installed.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('test_id', pa.int64()),
+        ('student_no', pa.string()),
+        ('last_name', pa.string()),
+        ('first_name', pa.string()),
+        ('section_code', pa.string()),
+        ('group_code', pa.string()),
+        ('gender', pa.string()),
+        ('age', pa.int32()),
+        ('test_type', pa.string()),
+        ('sequence_no', pa.int32()),
+        ('taken_at', pa.timestamp('us', tz='UTC')),
+        ('height_cm', pa.float64()),
+        ('weight_kg', pa.float64()),
+        ('bmi', pa.float64()),
+        ('vo2_distance_m', pa.float64()),
+        ('vo2_max', pa.float64()),
+        ('flexibility_cm', pa.float64()),
+        ('strength_reps', pa.int32()),
+        ('agility_sec', pa.float64()),
+        ('speed_sec', pa.float64()),
+        ('endurance_minutes', pa.int32()),
+        ('endurance_seconds', pa.int32()),
+        ('endurance_sec', pa.float64()),
+    ])
+    float_columns = {index for index, field in enumerate(schema) if pa.types.is_floating(field.type)}
+
+    def to_table(chunk):
+        columns = [[] for _ in HEADER]
+        for row in chunk:
+            for index, value in enumerate(row):
+                columns[index].append(float(value) if index in float_columns and value is not None else value)
+        arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema)]
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= row_group_size:
+                writer.write_table(to_table(chunk))
+                count += len(chunk)
+                chunk = []
+        if chunk or not count:
+            writer.write_table(to_table(chunk))
+            count += len(chunk)
+    return count
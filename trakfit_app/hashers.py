@@ -0,0 +1,66 @@
+"""
+Password hashers of the deployment profiles and bulk password hashing.
+
+The scrypt and Argon2 hashers take their cost parameters from TRAKFIT_SCRYPT and
+TRAKFIT_ARGON2 (see settings.py). They keep Django's algorithm names, so hashes
+made with other parameters still verify and are rehashed with the configured ones
+when the user next logs in (Django's check_password upgrades them).
+
+`make_passwords()` hashes many passwords at once in a pool of processes, for
+roster imports that create hundreds of accounts.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher, make_password
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """scrypt with the TRAKFIT_SCRYPT parameters."""
+    work_factor = settings.TRAKFIT_SCRYPT['work_factor']
+    block_size = settings.TRAKFIT_SCRYPT['block_size']
+    parallelism = settings.TRAKFIT_SCRYPT['parallelism']
+    # Memory scrypt needs (128 * n * r bytes), with some headroom
+    maxmem = 256 * work_factor * block_size
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id with the TRAKFIT_ARGON2 parameters (requires argon2-cffi)."""
+    time_cost = settings.TRAKFIT_ARGON2['time_cost']
+    memory_cost = settings.TRAKFIT_ARGON2['memory_cost']
+    parallelism = settings.TRAKFIT_ARGON2['parallelism']
+
+
+# Passwords hashed per task sent to a worker process
+CHUNK_SIZE = 16
+
+
+def _setup_worker():
+    # Processes started with spawn (not fork) begin without Django set up
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def _hash_chunk(passwords):
+    return [make_password(password) for password in passwords]
+
+
+def make_passwords(passwords, workers=None):
+    """
+    make_password() of every password, in order.
+
+    Hashes in `workers` processes (default: one per CPU); with one worker, or
+    too few passwords to be worth starting processes, hashes in this process.
+    """
+    passwords = list(passwords)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(passwords) <= CHUNK_SIZE:
+        return _hash_chunk(passwords)
+
+    chunks = [passwords[start:start + CHUNK_SIZE] for start in range(0, len(passwords), CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_setup_worker) as pool:
+        return [hashed for chunk in pool.map(_hash_chunk, chunks) for hashed in chunk]
@@ -0,0 +1,324 @@
+"""
+Bulk import of student rosters and fitness test results from CSV or XLSX files.
+
+Each row may register a student (roster columns, keyed by `email`), record a
+fitness test (test columns, keyed by `test_type`), or both. Test rows for an
+existing student only need `student_no`. Rows are validated with the same rules
+as registration and FitnessTestForm, then written in batches with bulk_create.
+The `updates` feed entries, snapshots and section aggregates that signals would
+create per row are written in bulk once per batch.
+"""
+import csv
+import io
+from datetime import datetime, time
+
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import search
+from .aggregates import invalidate_dashboard, sync_many_section_aggregates
+from .forms import FitnessTestForm
+from .hashers import make_passwords
+from .middleware import invalidate_student
+from .models import User, Student, FitnessTest, StudentFitnessSnapshot, updates
+from .signals import test_created_body
+
+
+BATCH_SIZE = 1000
+
+ROSTER_REQUIRED = ['student_no', 'first_name', 'last_name', 'section_code', 'group_code', 'email', 'gender']
+TEST_FIELDS = list(FitnessTestForm.base_fields)
+
+
+class ImportResult:
+    """Counts and per-row errors of one import."""
+
+    def __init__(self):
+        self.rows = 0
+        self.students_created = 0
+        self.tests_created = 0
+        self.errors = []
+
+    def add_error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'students_created': self.students_created,
+            'tests_created': self.tests_created,
+            'errors': [{'row': row, 'error': message} for row, message in self.errors],
+        }
+
+
+def _cell(value):
+    """Normalize a CSV/XLSX cell to a stripped string."""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def read_rows(file, filename):
+    """
+    Yield (row_number, {column: value}) from a CSV or XLSX file object.
+
+    Row numbers match the spreadsheet (the header is row 1). XLSX files need the
+    optional openpyxl package.
+    """
+    if filename.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError('Importing .xlsx files requires the openpyxl package; upload a CSV instead.')
+        sheet = load_workbook(file, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+        header = [_cell(name).lower() for name in next(rows, [])]
+        for number, values in enumerate(rows, start=2):
+            yield number, {name: _cell(value) for name, value in zip(header, values) if name}
+        return
+
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    reader.fieldnames = [(name or '').strip().lower() for name in reader.fieldnames or []]
+    for number, row in enumerate(reader, start=2):
+        yield number, {name: _cell(value) for name, value in row.items() if name}
+
+
+def _age_from_row(row):
+    """Age from `birthday` (YYYY-MM-DD) or `age`, validated like registration."""
+    try:
+        if row.get('birthday'):
+            birth_date = datetime.strptime(row['birthday'][:10], '%Y-%m-%d')
+            today = datetime.today()
+            age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+        else:
+            age = int(row.get('age', ''))
+    except ValueError:
+        raise ValueError('Invalid date format.') from None
+    if age < 5 or age > 100:
+        raise ValueError('Invalid age.')
+    return age
+
+
+def _taken_at_from_row(row, now):
+    value = row.get('taken_at', '')
+    if not value:
+        return now
+    taken_at = parse_datetime(value)
+    if taken_at is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError('Invalid taken_at (use YYYY-MM-DD or YYYY-MM-DD HH:MM).')
+        taken_at = datetime.combine(date, time.min)
+    if timezone.is_naive(taken_at):
+        taken_at = timezone.make_aware(taken_at)
+    return taken_at
+
+
+class _Batch:
+    """Validated rows of one batch, ready to be written."""
+
+    def __init__(self):
+        self.users = {}
+        self.students = {}
+        self.tests = []
+        # (user, raw password) of accounts with their own password, hashed together before writing
+        self.passwords = []
+
+
+def import_rows(rows, default_password=None, batch_size=BATCH_SIZE, hash_workers=1):
+    """
+    Import (row_number, row) pairs in batches and return an ImportResult.
+
+    Accounts without a `password` column value share `default_password` (hashed
+    once), or get an unusable password when it is not given. The passwords of a
+    batch are hashed in `hash_workers` processes (None: one per CPU).
+    """
+    result = ImportResult()
+    default_hash = make_password(default_password)
+    batch = []
+    for row_number, row in rows:
+        result.rows += 1
+        batch.append((row_number, row))
+        if len(batch) >= batch_size:
+            _import_batch(batch, default_hash, result, hash_workers)
+            batch = []
+    if batch:
+        _import_batch(batch, default_hash, result, hash_workers)
+
+    if result.students_created or result.tests_created:
+        invalidate_dashboard()
+    return result
+
+
+def _import_batch(rows, default_hash, result, hash_workers=1):
+    now = timezone.now()
+    validated = _Batch()
+
+    # Everything the validation needs from the database, in a fixed number of queries
+    student_nos = {row.get('student_no', '') for _, row in rows}
+    emails = {row['email'] for _, row in rows if row.get('email')}
+    existing_students = {student.student_no: student for student in Student.objects.filter(student_no__in=student_nos)}
+    taken_emails = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+    has_pre = set(
+        FitnessTest.objects.filter(student__in=existing_students.values(), test_type='pre').values_list('student_id', flat=True)
+    )
+    counters = {
+        (student.pk, test_type): getattr(student, counter)
+        for student in existing_students.values()
+        for test_type, counter in FitnessTest.SEQUENCE_COUNTERS.items()
+    }
+    new_pre = set()
+
+    for row_number, row in rows:
+        student_no = row.get('student_no', '')
+        is_roster = bool(row.get('email'))
+        is_test = bool(row.get('test_type'))
+        if not student_no:
+            result.add_error(row_number, 'student_no is required.')
+            continue
+        if not is_roster and not is_test:
+            result.add_error(row_number, 'Row has neither roster (email) nor test (test_type) data.')
+            continue
+
+        errors = []
+        user = student = None
+        if is_roster:
+            if not all(row.get(name) for name in ROSTER_REQUIRED) or not (row.get('birthday') or row.get('age')):
+                errors.append('All roster fields are required.')
+            email = row.get('email', '')
+            if '@' not in email:
+                errors.append('Invalid email format.')
+            elif email in taken_emails:
+                errors.append('Email already registered.')
+            if student_no in existing_students or student_no in validated.students:
+                errors.append('Student number already exists.')
+            try:
+                age = _age_from_row(row)
+            except ValueError as e:
+                errors.append(str(e))
+                age = None
+            if not errors:
+                user = User(email=email, password=default_hash)
+                if row.get('password'):
+                    validated.passwords.append((user, row['password']))
+                student = Student(
+                    student_no=student_no,
+                    first_name=row['first_name'],
+                    middle_initial=row.get('middle_initial') or None,
+                    last_name=row['last_name'],
+                    age=age,
+                    gender=row['gender'],
+                    section_code=row['section_code'],
+                    group_code=row['group_code'],
+                )
+        else:
+            student = existing_students.get(student_no) or validated.students.get(student_no)
+            if student is None:
+                errors.append(f'Unknown student number {student_no}.')
+
+        test = None
+        if is_test and not errors:
+            test_type = row['test_type'].lower()
+            form = FitnessTestForm(data={name: row.get(name, '') for name in TEST_FIELDS})
+            if test_type not in ('pre', 'post'):
+                errors.append('test_type must be "pre" or "post".')
+            elif test_type == 'pre' and (student.pk in has_pre or student_no in new_pre):
+                errors.append('Student already has a pre-test.')
+            if not form.is_valid():
+                for field, messages in form.errors.items():
+                    errors.extend(f'{field}: {message}' for message in messages)
+            try:
+                taken_at = _taken_at_from_row(row, now)
+            except ValueError as e:
+                errors.append(str(e))
+            if not errors:
+                test = FitnessTest(
+                    test_type=test_type,
+                    height_cm=form.cleaned_data['height_cm'],
+                    weight_kg=form.cleaned_data['weight_kg'],
+                    vo2_distance_m=form.cleaned_data['vo2_distance_m'],
+                    flexibility_cm=form.cleaned_data['flexibility_cm'],
+                    strength_reps=form.cleaned_data['strength_reps'],
+                    agility_sec=form.cleaned_data['agility_sec'],
+                    speed_sec=form.cleaned_data['speed_sec'],
+                    taken_at=taken_at,
+                )
+                test.set_endurance_from_string(form.cleaned_data['endurance_time'])
+
+        if errors:
+            for message in errors:
+                result.add_error(row_number, message)
+            continue
+
+        if user is not None:
+            taken_emails.add(user.email)
+            validated.users[student_no] = user
+            validated.students[student_no] = student
+        if test is not None:
+            if test.test_type == 'pre':
+                new_pre.add(student_no)
+            validated.tests.append((student_no, test))
+
+    if not validated.students and not validated.tests:
+        return
+    hashed = make_passwords([password for _, password in validated.passwords], workers=hash_workers)
+    for (user, _), password in zip(validated.passwords, hashed):
+        user.password = password
+    try:
+        _write_batch(validated, existing_students, counters, now, result)
+    except IntegrityError as e:
+        # Another writer took an e-mail or student number since validation
+        for row_number, _ in rows:
+            result.add_error(row_number, f'Batch not imported: {e}')
+
+
+def _write_batch(validated, existing_students, counters, now, result):
+    with transaction.atomic():
+        users = User.objects.bulk_create(list(validated.users.values()))
+        for student, user in zip(validated.students.values(), users):
+            student.user = user
+        Student.objects.bulk_create(list(validated.students.values()))
+
+        feed = [
+            updates(student=student, body=f"Student {student.first_name} {student.last_name} registered")
+            for student in validated.students.values()
+        ]
+        # Tests are numbered per type in the order they were imported, after the student's counter
+        tests = []
+        numbered = {}
+        for student_no, test in validated.tests:
+            test.student = existing_students.get(student_no) or validated.students[student_no]
+            key = (test.student.pk, test.test_type)
+            test.sequence_no = counters[key] = numbered[key] = counters.get(key, 0) + 1
+            tests.append(test)
+            feed.append(updates(student=test.student, body=test_created_body(test.student, test.test_type, test.sequence_no)))
+        FitnessTest.objects.bulk_create(tests)
+        updates.objects.bulk_create(feed)
+
+        # Advance the sequence counters in the same UPDATE as the data timestamps
+        touched = {test.student.pk: test.student for test in tests}
+        Student.objects.filter(pk__in=touched).update(last_data_update_at=now, updated_at=now, **{
+            counter: Case(
+                *[When(pk=pk, then=Value(number)) for (pk, kind), number in numbered.items() if kind == test_type],
+                default=F(counter),
+                output_field=IntegerField(),
+            )
+            for test_type, counter in FitnessTest.SEQUENCE_COUNTERS.items()
+        })
+        sync_many_section_aggregates(StudentFitnessSnapshot.refresh_many(touched.values()))
+
+        # bulk_create skips the signals that keep the search index current
+        search.index_students(validated.students.values())
+        search.index_tests(test for test in tests if test.remarks)
+        invalidate_student(*touched)
+
+    result.students_created += len(validated.students)
+    result.tests_created += len(tests)
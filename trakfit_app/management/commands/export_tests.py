@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from trakfit_app.exporter import CHUNK_SIZE, export_rows, iter_csv, write_parquet
+
+
+class Command(BaseCommand):
+    help = 'Export every fitness test with its student and derived metrics as CSV or Parquet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-', help='Output file ("-" for stdout, CSV only)')
+        parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+        parser.add_argument('--start-date', help='Only tests taken on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--end-date', help='Only tests taken on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--section', help='Only this "<section_code>-<group_code>"')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows fetched from the database at a time')
+
+    def handle(self, *args, **options):
+        try:
+            start_date = self._date(options['start_date'])
+            end_date = self._date(options['end_date'])
+        except ValueError:
+            raise CommandError('Dates must be YYYY-MM-DD.')
+        rows = export_rows(start_date, end_date, options['section'], chunk_size=options['chunk_size'])
+
+        if options['format'] == 'parquet':
+            if options['output'] == '-':
+                raise CommandError('Parquet output needs --output <file>.')
+            try:
+                count = write_parquet(rows, options['output'])
+            except ImportError:
+                raise CommandError('Parquet export requires the pyarrow package.')
+            self.stderr.write(f'Exported {count} fitness test(s) to {options["output"]}.')
+            return
+
+        if options['output'] == '-':
+            for line in iter_csv(rows):
+                self.stdout.write(line, ending='')
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            lines = 0
+            for line in iter_csv(rows):
+                output.write(line)
+                lines += 1
+        self.stderr.write(f'Exported {lines - 1} fitness test(s) to {options["output"]}.')
+
+    @staticmethod
+    def _date(value):
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from trakfit_app.importer import BATCH_SIZE, import_rows, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import students and/or fitness test results from a CSV or XLSX file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file with a header row')
+        parser.add_argument('--default-password', default=None,
+                            help='Password for rows without a password column value (default: unusable)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows validated and inserted per transaction')
+        parser.add_argument('--hash-workers', type=int, default=settings.TRAKFIT_HASH_WORKERS,
+                            help='Processes hashing account passwords (default: one per CPU)')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as file:
+                result = import_rows(
+                    read_rows(file, options['path']),
+                    default_password=options['default_password'],
+                    batch_size=options['batch_size'],
+                    hash_workers=options['hash_workers'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for row_number, message in result.errors:
+            self.stderr.write(f'Row {row_number}: {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.students_created} student(s) and {result.tests_created} fitness test(s) '
+            f'from {result.rows} row(s); {len(result.errors)} error(s).'
+        ))
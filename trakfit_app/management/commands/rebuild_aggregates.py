@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from trakfit_app.aggregates import invalidate_dashboard, snapshot_contribution
+from trakfit_app.models import Student, SectionMetricAggregate, StudentFitnessSnapshot
+
+
+# Relative difference tolerated between stored and recomputed float sums
+TOLERANCE = 1e-9
+
+
+class Command(BaseCommand):
+    help = 'Verify the per-section running aggregates against the student snapshots and repair any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift, exit with an error if any is found')
+
+    def handle(self, *args, **options):
+        # Students with tests but no snapshot (e.g. created with bulk_create) are built first
+        if not options['check']:
+            missing = Student.objects.filter(fitness_snapshot__isnull=True, fitness_tests__isnull=False).distinct()
+            for student in missing.iterator():
+                StudentFitnessSnapshot.refresh_for(student)
+
+        expected = {}
+        stale_snapshots = []
+        snapshots = StudentFitnessSnapshot.objects.select_related('student', 'latest_pre', 'latest_post')
+        for snapshot in snapshots.iterator(chunk_size=2000):
+            student = snapshot.student
+            contribution = snapshot_contribution(snapshot)
+            for key, value in contribution.items():
+                test_type, metric = key.split(':', 1)
+                row = expected.setdefault((student.section_code, student.group_code, test_type, metric), [0.0, 0, 0.0])
+                row[0] += value
+                row[1] += 1
+                row[2] += value * value
+            if (
+                snapshot.aggregated_metrics != contribution
+                or snapshot.aggregated_section_code != student.section_code
+                or snapshot.aggregated_group_code != student.group_code
+            ):
+                snapshot.aggregated_section_code = student.section_code
+                snapshot.aggregated_group_code = student.group_code
+                snapshot.aggregated_metrics = contribution
+                stale_snapshots.append(snapshot)
+
+        stored = {
+            (row.section_code, row.group_code, row.test_type, row.metric): [row.total, row.count, row.sum_squares]
+            for row in SectionMetricAggregate.objects.all()
+        }
+        drifted = [
+            key for key in expected.keys() | stored.keys()
+            if not self._matches(expected.get(key, [0.0, 0, 0.0]), stored.get(key, [0.0, 0, 0.0]))
+        ]
+
+        if options['check']:
+            if drifted or stale_snapshots:
+                raise CommandError(
+                    f'{len(drifted)} aggregate row(s) and {len(stale_snapshots)} snapshot(s) out of date.'
+                )
+            if options['verbosity']:
+                self.stdout.write(self.style.SUCCESS(f'All {len(stored)} aggregate row(s) are up to date.'))
+            return
+
+        with transaction.atomic():
+            SectionMetricAggregate.objects.all().delete()
+            SectionMetricAggregate.objects.bulk_create(
+                [
+                    SectionMetricAggregate(
+                        section_code=section_code, group_code=group_code, test_type=test_type, metric=metric,
+                        total=total, count=count, sum_squares=sum_squares,
+                    )
+                    for (section_code, group_code, test_type, metric), (total, count, sum_squares) in expected.items()
+                ],
+                batch_size=1000,
+            )
+            StudentFitnessSnapshot.objects.bulk_create(
+                stale_snapshots,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['student'],
+                update_fields=['aggregated_section_code', 'aggregated_group_code', 'aggregated_metrics'],
+            )
+        invalidate_dashboard()
+
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt {len(expected)} aggregate row(s); repaired {len(drifted)} drifted row(s) '
+                f'and {len(stale_snapshots)} snapshot(s).'
+            ))
+
+    @staticmethod
+    def _matches(expected, stored):
+        total, count, sum_squares = expected
+        return (
+            count == stored[1]
+            and abs(total - stored[0]) <= TOLERANCE * max(1.0, abs(total))
+            and abs(sum_squares - stored[2]) <= TOLERANCE * max(1.0, abs(sum_squares))
+        )
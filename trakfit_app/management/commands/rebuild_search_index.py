@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from trakfit_app import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of students and fitness test remarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Documents written per INSERT batch')
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError('This database has no search index (SQLite with FTS5 or PostgreSQL is required).')
+
+        with transaction.atomic():
+            indexed = search.rebuild(batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} search document(s).'))
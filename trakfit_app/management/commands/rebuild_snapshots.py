@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from trakfit_app.aggregates import sync_section_aggregates
+from trakfit_app.models import Student, StudentFitnessSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the latest pre/post fitness snapshot for every student (or the given student numbers).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('student_no', nargs='*', help='Only rebuild these student numbers')
+
+    def handle(self, *args, **options):
+        students = Student.objects.all()
+        if options['student_no']:
+            students = students.filter(student_no__in=options['student_no'])
+
+        rebuilt = 0
+        with transaction.atomic():
+            for student in students.iterator():
+                sync_section_aggregates(StudentFitnessSnapshot.refresh_for(student))
+                rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} student snapshot(s).'))
@@ -0,0 +1,136 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from trakfit_app import search
+from trakfit_app.models import User, Student, FitnessTest, StudentFitnessSnapshot, updates
+
+
+# Seeded accounts use this e-mail domain so they can be told apart (and removed with --clear)
+SEED_EMAIL_DOMAIN = 'seed.trakfit'
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Bulk-create synthetic users, students and fitness tests for local load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=100, help='Number of students to create')
+        parser.add_argument('--tests-per-student', type=int, default=5, help='Tests per student (first is the pre-test)')
+        parser.add_argument('--sections', type=int, default=5, help='Number of sections to spread students over')
+        parser.add_argument('--password', default=None, help='Password for every seeded account (default: unusable)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for reproducible data')
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded accounts first')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        students = options['students']
+        tests_per_student = options['tests_per_student']
+        sections = max(options['sections'], 1)
+
+        seeded_users = User.objects.filter(email__endswith=f'@{SEED_EMAIL_DOMAIN}')
+        if options['clear']:
+            deleted, _ = seeded_users.delete()
+            if options['verbosity']:
+                self.stdout.write(f'Deleted {deleted} previously seeded row(s).')
+
+        # Hash once: every seeded account shares the same password hash
+        password = make_password(options['password'])
+        offset = seeded_users.count()
+        start = timezone.now() - timedelta(days=7 * max(tests_per_student, 1))
+
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                [
+                    User(email=f'seed{offset + i}@{SEED_EMAIL_DOMAIN}', password=password)
+                    for i in range(students)
+                ],
+                batch_size=BATCH_SIZE,
+            )
+            student_rows = Student.objects.bulk_create(
+                [self._student(rng, user, offset + i, sections, tests_per_student) for i, user in enumerate(users)],
+                batch_size=BATCH_SIZE,
+            )
+
+            tests = []
+            for student in student_rows:
+                tests.extend(self._tests(rng, student, tests_per_student, start))
+                if len(tests) >= BATCH_SIZE * 5:
+                    FitnessTest.objects.bulk_create(tests, batch_size=BATCH_SIZE)
+                    tests = []
+            FitnessTest.objects.bulk_create(tests, batch_size=BATCH_SIZE)
+
+            # bulk_create skips post_save, so add the registration entries of the updates feed here
+            updates.objects.bulk_create(
+                [
+                    updates(student=student, body=f"Student {student.first_name} {student.last_name} registered")
+                    for student in student_rows
+                ],
+                batch_size=BATCH_SIZE,
+            )
+
+            # Snapshots are normally kept current by signals, which bulk_create bypasses
+            StudentFitnessSnapshot.refresh_many(student_rows)
+            search.index_students(student_rows)
+
+        # Section running aggregates are rebuilt in bulk (this also clears the dashboard cache)
+        call_command('rebuild_aggregates', verbosity=0)
+
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Seeded {students} student(s) with {students * tests_per_student} fitness test(s) across {sections} section(s).'
+            ))
+
+    def _student(self, rng, user, number, sections, tests_per_student):
+        section = number % sections
+        return Student(
+            user=user,
+            student_no=f'SEED-{number:07d}',
+            first_name=rng.choice(['Juan', 'Maria', 'Jose', 'Ana', 'Mark', 'Grace', 'John', 'Angel']),
+            middle_initial=rng.choice('ABCDEFGHIJKLMNOPRSTV'),
+            last_name=f'{rng.choice(["Santos", "Reyes", "Cruz", "Garcia", "Mendoza", "Torres"])}{number}',
+            age=rng.randint(17, 25),
+            gender=rng.choice(['Male', 'Female']),
+            section_code=f'SEC-{section + 1:02d}',
+            group_code=f'G{rng.randint(1, 3)}',
+            # The first test is the pre-test, every later one a post-test
+            last_pre_test_no=min(tests_per_student, 1),
+            last_post_test_no=max(tests_per_student - 1, 0),
+        )
+
+    def _tests(self, rng, student, count, start):
+        """A pre-test followed by weekly post-tests that improve slightly over time."""
+        height = rng.uniform(150, 190)
+        weight = rng.uniform(45, 95)
+        distance = rng.uniform(1500, 2800)
+        flexibility = rng.uniform(5, 35)
+        strength = rng.randint(5, 45)
+        agility = rng.uniform(11, 18)
+        speed = rng.uniform(6, 9)
+        endurance = rng.randint(540, 1080)
+
+        tests = []
+        for week in range(count):
+            progress = week / max(count - 1, 1)
+            endurance_total = int(endurance * (1 - 0.1 * progress))
+            tests.append(FitnessTest(
+                student=student,
+                test_type='pre' if week == 0 else 'post',
+                sequence_no=week or 1,
+                height_cm=Decimal(f'{height:.1f}'),
+                weight_kg=Decimal(f'{weight - 2 * progress + rng.uniform(-1, 1):.1f}'),
+                vo2_distance_m=Decimal(f'{distance * (1 + 0.1 * progress):.1f}'),
+                flexibility_cm=Decimal(f'{flexibility + 3 * progress:.1f}'),
+                strength_reps=strength + int(10 * progress),
+                agility_sec=Decimal(f'{agility * (1 - 0.05 * progress):.2f}'),
+                speed_sec=Decimal(f'{speed * (1 - 0.05 * progress):.2f}'),
+                endurance_minutes=endurance_total // 60,
+                endurance_seconds=endurance_total % 60,
+                taken_at=start + timedelta(weeks=week, minutes=rng.randint(0, 600)),
+            ))
+        return tests
@@ -0,0 +1,193 @@
+"""
+Batch computation of the values derived from fitness test measurements.
+
+The functions take columns (sequences of one field's values, e.g. from
+`values_list`) and return plain lists, with None wherever FitnessTest's
+per-instance properties would return None. NumPy is used when it is installed;
+otherwise the same results are computed in pure Python.
+"""
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised when NumPy is not installed
+    np = None
+
+
+# Cooper 12-minute run: VO2 max = (distance_m - 504.9) / 44.73
+COOPER_INTERCEPT = 504.9
+COOPER_SLOPE = 44.73
+
+# BMI categories as (label, upper bound); the last one has no upper bound
+BMI_CATEGORIES = [
+    ('Underweight', 18.5),
+    ('Normal', 25),
+    ('Overweight', 30),
+    ('Obese', None),
+]
+
+# Raw FitnessTest fields the batch functions read
+TEST_FIELDS = [
+    'height_cm', 'weight_kg', 'vo2_distance_m', 'flexibility_cm', 'strength_reps',
+    'agility_sec', 'speed_sec', 'endurance_minutes', 'endurance_seconds',
+]
+
+# Improvement keys and their source field
+IMPROVEMENT_FIELDS = [
+    ('flexibility', 'flexibility_cm'),
+    ('strength', 'strength_reps'),
+    ('agility', 'agility_sec'),
+    ('speed', 'speed_sec'),
+    ('endurance', 'endurance_sec'),
+]
+# Timed metrics, where a lower post-test value is an improvement
+LOWER_IS_BETTER = {'agility', 'speed'}
+
+
+def columns(rows, names):
+    """Transpose values_list() rows into {name: column}."""
+    rows = list(rows)
+    return {name: [row[index] for row in rows] for index, name in enumerate(names)}
+
+
+def test_columns(tests):
+    """{field: column} of the raw measurements of FitnessTest instances (None entries stay None)."""
+    return {name: [getattr(test, name) if test is not None else None for test in tests] for name in TEST_FIELDS}
+
+
+# NumPy helpers: missing values are NaN while computing
+
+def _array(column):
+    """Float array of a column; None and 0 (unset in this app) become NaN."""
+    return np.array([value if value else None for value in column], dtype=float)
+
+
+def _list(values, digits=None):
+    """NaN-to-None list of Python floats, rounded like round() when digits is given."""
+    if digits is None:
+        return [None if value != value else value for value in values.tolist()]
+    return [None if value != value else round(value, digits) for value in values.tolist()]
+
+
+# Pure-Python helpers
+
+def _float(value):
+    return float(value) if value else None
+
+
+def _round(value, digits):
+    return round(value, digits) if value is not None and digits is not None else value
+
+
+def bmi(height_cm, weight_kg, digits=None):
+    """BMI of every (height, weight) pair."""
+    if np is not None:
+        height_m = _array(height_cm) / 100
+        return _list(_array(weight_kg) / (height_m ** 2), digits)
+    result = []
+    for height, weight in zip(height_cm, weight_kg):
+        height, weight = _float(height), _float(weight)
+        result.append(_round(weight / ((height / 100) ** 2), digits) if height and weight else None)
+    return result
+
+
+def vo2_max(vo2_distance_m, digits=None):
+    """VO2 max (Cooper formula) of every run distance."""
+    if np is not None:
+        return _list((_array(vo2_distance_m) - COOPER_INTERCEPT) / COOPER_SLOPE, digits)
+    return [
+        _round((float(distance) - COOPER_INTERCEPT) / COOPER_SLOPE, digits) if distance else None
+        for distance in vo2_distance_m
+    ]
+
+
+def endurance_seconds(endurance_minutes, endurance_seconds):
+    """Total endurance seconds; None when the minutes are missing, missing seconds count as 0."""
+    return [
+        minutes * 60 + (seconds or 0) if minutes is not None else None
+        for minutes, seconds in zip(endurance_minutes, endurance_seconds)
+    ]
+
+
+def endurance_display(endurance_minutes, endurance_seconds):
+    """Endurance as mm:ss strings, like FitnessTest.get_endurance_display()."""
+    return [
+        f"{minutes:02d}:{seconds:02d}" if minutes is not None and seconds is not None else None
+        for minutes, seconds in zip(endurance_minutes, endurance_seconds)
+    ]
+
+
+def bmi_category(bmi_values):
+    """BMI category label of every BMI, or 'N/A' when it is missing."""
+    bounds = [upper for _, upper in BMI_CATEGORIES[:-1]]
+    labels = [label for label, _ in BMI_CATEGORIES]
+    if np is not None:
+        values = np.array(bmi_values, dtype=float)
+        indexes = np.searchsorted(bounds, values, side='right')
+        return ['N/A' if value != value else labels[index] for value, index in zip(values.tolist(), indexes.tolist())]
+    result = []
+    for value in bmi_values:
+        if value is None:
+            result.append('N/A')
+            continue
+        index = 0
+        while index < len(bounds) and value >= bounds[index]:
+            index += 1
+        result.append(labels[index])
+    return result
+
+
+def improvement(pre, post, lower_is_better=False, digits=1):
+    """
+    Percent improvement from every pre value to the paired post value.
+
+    None when either value is missing or zero. For timed metrics a lower post
+    value is an improvement.
+    """
+    if np is not None:
+        pre_values, post_values = _array(pre), _array(post)
+        change = pre_values - post_values if lower_is_better else post_values - pre_values
+        return _list(change / pre_values * 100, digits)
+    result = []
+    for before, after in zip(pre, post):
+        before, after = _float(before), _float(after)
+        if before and after:
+            change = before - after if lower_is_better else after - before
+            result.append(round(change / before * 100, digits))
+        else:
+            result.append(None)
+    return result
+
+
+def derive(columns):
+    """
+    Derived values of a batch of tests, given {field: column} of their raw measurements.
+
+    Returns {'bmi', 'vo2_max', 'bmi_category', 'endurance_sec', 'endurance_display'} columns.
+    """
+    bmi_values = bmi(columns['height_cm'], columns['weight_kg'])
+    return {
+        'bmi': bmi_values,
+        'vo2_max': vo2_max(columns['vo2_distance_m']),
+        'bmi_category': bmi_category(bmi_values),
+        'endurance_sec': endurance_seconds(columns['endurance_minutes'], columns['endurance_seconds']),
+        'endurance_display': endurance_display(columns['endurance_minutes'], columns['endurance_seconds']),
+    }
+
+
+def improvements(pre, post):
+    """
+    Pre→post improvement percentages of paired tests, as {key: column}.
+
+    `pre` and `post` are {field: column} of the raw measurements, row i of both
+    belonging to the same student. Endurance only counts when both tests have
+    non-zero minutes.
+    """
+    def endurance(values):
+        totals = endurance_seconds(values['endurance_minutes'], values['endurance_seconds'])
+        return [total if minutes else None for total, minutes in zip(totals, values['endurance_minutes'])]
+
+    pre = dict(pre, endurance_sec=endurance(pre))
+    post = dict(post, endurance_sec=endurance(post))
+    return {
+        key: improvement(pre[field], post[field], lower_is_better=key in LOWER_IS_BETTER)
+        for key, field in IMPROVEMENT_FIELDS
+    }
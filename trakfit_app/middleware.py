@@ -0,0 +1,91 @@
+"""
+Session-cached student profile of the logged-in user.
+
+StudentMiddleware sets `request.student` to the user's Student row, or None for
+anonymous users and accounts without one (teachers). The row is read from the
+database once and then kept in the session, so student pages don't query it on
+every request. A per-student version in the cache invalidates the session copies
+when the row changes: `invalidate_student()` is called by the signal receivers
+when the student is saved or deleted and when their tests change (which touches
+the student's timestamps). The student profile page keys its template fragments
+by the same version.
+"""
+import uuid
+
+from django.core import serializers
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Student, User
+
+
+SESSION_KEY = '_trakfit_student'
+
+# Session value of accounts without a student profile
+NO_STUDENT = ''
+
+
+def _version_key(user_id):
+    return f'trakfit:student-version:{user_id}'
+
+
+def invalidate_student(*user_ids):
+    """
+    Make sessions re-read these students on their next request.
+
+    Runs once the surrounding transaction commits, so a concurrent request
+    cannot re-cache the student from before the write.
+    """
+    keys = [_version_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def student_version(user_id):
+    """Token that changes whenever invalidate_student() is called for the user."""
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # Unknown (invalidated or evicted): start a new version, which no session has yet
+        cache.add(_version_key(user_id), uuid.uuid4().hex, None)
+        version = cache.get(_version_key(user_id))
+    # Still None when the cache keeps nothing (DummyCache): then no session copy is ever current
+    return version or uuid.uuid4().hex
+
+
+def remember_student(request, student):
+    """Store the user's student (or None) in the session, as StudentMiddleware would."""
+    data = serializers.serialize('json', [student]) if student is not None else NO_STUDENT
+    request.session[SESSION_KEY] = [student_version(request.user.pk), data]
+    request.student = student
+    if student is not None:
+        student.user = request.user
+        # request.user.student_profile returns the same instance without a query
+        User.student_profile.related.set_cached_value(request.user, student)
+
+
+def get_student(request):
+    """The logged-in user's student, from the session when its copy is current."""
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    cached = request.session.get(SESSION_KEY)
+    if cached and cached[0] == student_version(user.pk):
+        student = None
+        if cached[1] != NO_STUDENT:
+            student = next(serializers.deserialize('json', cached[1])).object
+            student.user = user
+            User.student_profile.related.set_cached_value(user, student)
+        return student
+    student = Student.objects.filter(user=user).first()
+    remember_student(request, student)
+    return student
+
+
+class StudentMiddleware:
+    """Set request.student (see get_student); place after AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.student = get_student(request)
+        return self.get_response(request)
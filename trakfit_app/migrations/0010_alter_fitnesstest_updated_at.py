@@ -1,5 +1,6 @@
 # Generated by Django 5.2.8 on 2025-11-18 19:43
 
+import django.utils.timezone
 from django.db import migrations, models
 
 
@@ -13,7 +14,7 @@ class Migration(migrations.Migration):
         migrations.AlterField(
             model_name='fitnesstest',
             name='updated_at',
-            field=models.DateTimeField(auto_now=True, default='exit'),
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
             preserve_default=False,
         ),
     ]
@@ -0,0 +1,14 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:55
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trakfit_app', '0006_merge_20251118_1209'),
+        ('trakfit_app', '0010_alter_fitnesstest_updated_at'),
+    ]
+
+    operations = [
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trakfit_app', '0011_merge_20261016_2355'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentFitnessSnapshot',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fitness_snapshot', serialize=False, to='trakfit_app.student')),
+                ('pre_bmi', models.FloatField(blank=True, null=True)),
+                ('post_bmi', models.FloatField(blank=True, null=True)),
+                ('pre_vo2_max', models.FloatField(blank=True, null=True)),
+                ('post_vo2_max', models.FloatField(blank=True, null=True)),
+                ('pre_endurance_sec', models.IntegerField(blank=True, null=True)),
+                ('post_endurance_sec', models.IntegerField(blank=True, null=True)),
+                ('flexibility_improvement', models.FloatField(blank=True, null=True)),
+                ('strength_improvement', models.FloatField(blank=True, null=True)),
+                ('agility_improvement', models.FloatField(blank=True, null=True)),
+                ('speed_improvement', models.FloatField(blank=True, null=True)),
+                ('endurance_improvement', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('latest_post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='trakfit_app.fitnesstest')),
+                ('latest_pre', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='trakfit_app.fitnesstest')),
+            ],
+            options={
+                'db_table': 'student_fitness_snapshots',
+            },
+        ),
+    ]
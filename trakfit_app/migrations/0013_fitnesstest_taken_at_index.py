@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trakfit_app', '0012_studentfitnesssnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fitnesstest',
+            index=models.Index(fields=['taken_at'], name='fitness_tests_taken_at_idx'),
+        ),
+    ]
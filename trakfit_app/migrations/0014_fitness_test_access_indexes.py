@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trakfit_app', '0013_fitnesstest_taken_at_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fitnesstest',
+            index=models.Index(fields=['student', 'test_type', 'taken_at'], name='fitness_stu_type_taken_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fitnesstest',
+            index=models.Index(fields=['student', 'taken_at'], name='fitness_stu_taken_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='updates',
+            index=models.Index(fields=['updated_at'], name='updates_updated_at_idx'),
+        ),
+    ]
@@ -0,0 +1,178 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:09
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+# Frozen copies of the snapshot and aggregate rules at the time of this migration
+# (StudentFitnessSnapshot._fill and aggregates.snapshot_contribution)
+METRICS = ['bmi', 'vo2_max', 'flexibility_cm', 'strength_reps', 'agility_sec', 'speed_sec', 'endurance_sec']
+BMI_STATUSES = [('underweight', None), ('normal', 18.5), ('overweight', 25), ('obese', 30)]
+IMPROVEMENTS = [
+    ('flexibility', 'flexibility_cm', False),
+    ('strength', 'strength_reps', False),
+    ('agility', 'agility_sec', True),
+    ('speed', 'speed_sec', True),
+    ('endurance', 'endurance_sec', False),
+]
+
+
+def _present(value):
+    return float(value) if value else None
+
+
+def _metric_values(test):
+    """{metric: float or None} of one test (None for a missing test)."""
+    if test is None:
+        return {metric: None for metric in METRICS}
+    height, weight, distance = _present(test.height_cm), _present(test.weight_kg), _present(test.vo2_distance_m)
+    return {
+        'bmi': weight / (height / 100) ** 2 if height and weight else None,
+        'vo2_max': (distance - 504.9) / 44.73 if distance else None,
+        'flexibility_cm': _present(test.flexibility_cm),
+        'strength_reps': _present(test.strength_reps),
+        'agility_sec': _present(test.agility_sec),
+        'speed_sec': _present(test.speed_sec),
+        'endurance_sec': (
+            float(test.endurance_minutes * 60 + (test.endurance_seconds or 0))
+            if test.endurance_minutes is not None else None
+        ),
+    }
+
+
+def _fill_snapshot(snapshot, pre_test, post_test):
+    pre, post = _metric_values(pre_test), _metric_values(post_test)
+    snapshot.latest_pre, snapshot.latest_post = pre_test, post_test
+    snapshot.pre_bmi, snapshot.post_bmi = pre['bmi'], post['bmi']
+    snapshot.pre_vo2_max, snapshot.post_vo2_max = pre['vo2_max'], post['vo2_max']
+    snapshot.pre_endurance_sec = int(pre['endurance_sec']) if pre['endurance_sec'] is not None else None
+    snapshot.post_endurance_sec = int(post['endurance_sec']) if post['endurance_sec'] is not None else None
+    for key, metric, lower_is_better in IMPROVEMENTS:
+        before, after = pre[metric], post[metric]
+        if metric == 'endurance_sec' and not (pre_test and pre_test.endurance_minutes and post_test and post_test.endurance_minutes):
+            before = after = None
+        change = None
+        if before and after:
+            change = round(((before - after) if lower_is_better else (after - before)) / before * 100, 1)
+        setattr(snapshot, f'{key}_improvement', change)
+
+    contribution = {}
+    for test_type, values in (('pre', pre), ('post', post)):
+        for metric, value in values.items():
+            if value is not None:
+                contribution[f'{test_type}:{metric}'] = value
+    if pre['bmi'] is not None and post['bmi'] is not None:
+        contribution['post:bmi_change'] = post['bmi'] - pre['bmi']
+    if post['bmi'] is not None:
+        status = [name for name, lower in BMI_STATUSES if lower is None or post['bmi'] >= lower][-1]
+        contribution[f'post:bmi_{status}'] = 1.0
+    snapshot.aggregated_section_code = snapshot.student.section_code
+    snapshot.aggregated_group_code = snapshot.student.group_code
+    snapshot.aggregated_metrics = contribution
+    return contribution
+
+
+def backfill_aggregates(apps, schema_editor):
+    """
+    Build every student's snapshot and the section aggregates from the existing tests.
+
+    Without this the dashboard, which now reads only the aggregate rows, would
+    start from empty totals and then only add the deltas of later saves.
+    """
+    Student = apps.get_model('trakfit_app', 'Student')
+    FitnessTest = apps.get_model('trakfit_app', 'FitnessTest')
+    StudentFitnessSnapshot = apps.get_model('trakfit_app', 'StudentFitnessSnapshot')
+    SectionMetricAggregate = apps.get_model('trakfit_app', 'SectionMetricAggregate')
+
+    totals = {}
+    student_ids = list(Student.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(student_ids), BATCH_SIZE):
+        batch = list(Student.objects.filter(pk__in=student_ids[start:start + BATCH_SIZE]))
+        existing = {snapshot.student_id: snapshot for snapshot in StudentFitnessSnapshot.objects.filter(student__in=batch)}
+        # Newest first, so the first test seen per (student, type) is the latest
+        latest = {}
+        for test in FitnessTest.objects.filter(student__in=batch).order_by('-taken_at', '-test_id'):
+            latest.setdefault((test.student_id, test.test_type), test)
+
+        snapshots = []
+        for student in batch:
+            pre_test, post_test = latest.get((student.pk, 'pre')), latest.get((student.pk, 'post'))
+            if student.pk not in existing and pre_test is None and post_test is None:
+                continue
+            snapshot = existing.get(student.pk) or StudentFitnessSnapshot(student=student)
+            snapshot.student = student
+            for key, value in _fill_snapshot(snapshot, pre_test, post_test).items():
+                test_type, metric = key.split(':', 1)
+                row = totals.setdefault((student.section_code, student.group_code, test_type, metric), [0.0, 0, 0.0])
+                row[0] += value
+                row[1] += 1
+                row[2] += value * value
+            snapshots.append(snapshot)
+
+        StudentFitnessSnapshot.objects.bulk_create(
+            snapshots,
+            update_conflicts=True,
+            unique_fields=['student'],
+            update_fields=[
+                'latest_pre', 'latest_post', 'pre_bmi', 'post_bmi', 'pre_vo2_max', 'post_vo2_max',
+                'pre_endurance_sec', 'post_endurance_sec', 'flexibility_improvement', 'strength_improvement',
+                'agility_improvement', 'speed_improvement', 'endurance_improvement',
+                'aggregated_section_code', 'aggregated_group_code', 'aggregated_metrics', 'updated_at',
+            ],
+        )
+
+    SectionMetricAggregate.objects.bulk_create(
+        [
+            SectionMetricAggregate(
+                section_code=section_code, group_code=group_code, test_type=test_type, metric=metric,
+                total=total, count=count, sum_squares=sum_squares,
+            )
+            for (section_code, group_code, test_type, metric), (total, count, sum_squares) in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trakfit_app', '0014_fitness_test_access_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentfitnesssnapshot',
+            name='aggregated_group_code',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='studentfitnesssnapshot',
+            name='aggregated_metrics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='studentfitnesssnapshot',
+            name='aggregated_section_code',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.CreateModel(
+            name='SectionMetricAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section_code', models.CharField(max_length=20)),
+                ('group_code', models.CharField(max_length=20)),
+                ('test_type', models.CharField(choices=[('pre', 'Pre Test'), ('post', 'Post Test')], max_length=10)),
+                ('metric', models.CharField(max_length=30)),
+                ('total', models.FloatField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('sum_squares', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'section_metric_aggregates',
+                'constraints': [models.UniqueConstraint(fields=('section_code', 'group_code', 'test_type', 'metric'), name='section_metric_aggregate_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
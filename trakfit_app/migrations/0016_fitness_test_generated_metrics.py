@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:22
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trakfit_app', '0015_section_metric_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fitnesstest',
+            name='bmi',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.NullIf(django.db.models.functions.comparison.Cast('weight_kg', models.FloatField()), models.Value(0.0)), '/', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.NullIf(django.db.models.functions.comparison.Cast('height_cm', models.FloatField()), models.Value(0.0)), '/', models.Value(100.0)), '*', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.NullIf(django.db.models.functions.comparison.Cast('height_cm', models.FloatField()), models.Value(0.0)), '/', models.Value(100.0)))), output_field=models.FloatField()),
+        ),
+        migrations.AddField(
+            model_name='fitnesstest',
+            name='vo2_max',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.NullIf(django.db.models.functions.comparison.Cast('vo2_distance_m', models.FloatField()), models.Value(0.0)), '-', models.Value(504.9)), '/', models.Value(44.73)), output_field=models.FloatField()),
+        ),
+        migrations.AddIndex(
+            model_name='fitnesstest',
+            index=models.Index(fields=['bmi'], name='fitness_tests_bmi_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:24
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_post_tests(apps, schema_editor):
+    """Start every counter at the student's number of existing post tests, in one UPDATE."""
+    Student = apps.get_model('trakfit_app', 'Student')
+    FitnessTest = apps.get_model('trakfit_app', 'FitnessTest')
+    post_tests = (
+        FitnessTest.objects.filter(student=OuterRef('pk'), test_type='post')
+        .values('student').annotate(n=Count('test_id')).values('n')
+    )
+    Student.objects.update(last_post_test_no=Coalesce(Subquery(post_tests), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trakfit_app', '0016_fitness_test_generated_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='last_post_test_no',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_post_tests, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='updates',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
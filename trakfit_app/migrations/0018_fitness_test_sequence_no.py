@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:31
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def number_existing_tests(apps, schema_editor):
+    """Number every student's tests per type in taken_at order, a batch of students at a time."""
+    Student = apps.get_model('trakfit_app', 'Student')
+    FitnessTest = apps.get_model('trakfit_app', 'FitnessTest')
+    student_ids = list(Student.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(student_ids), BATCH_SIZE):
+        tests = list(
+            FitnessTest.objects.filter(student_id__in=student_ids[start:start + BATCH_SIZE])
+            .order_by('student_id', 'test_type', 'taken_at', 'test_id')
+            .only('test_id', 'student_id', 'test_type')
+        )
+        numbers = {}
+        for test in tests:
+            key = (test.student_id, test.test_type)
+            numbers[key] = test.sequence_no = numbers.get(key, 0) + 1
+        FitnessTest.objects.bulk_update(tests, ['sequence_no'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trakfit_app', '0017_post_test_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fitnesstest',
+            name='sequence_no',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(number_existing_tests, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='fitnesstest',
+            name='sequence_no',
+            field=models.PositiveIntegerField(editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='fitnesstest',
+            constraint=models.UniqueConstraint(fields=('student', 'test_type', 'sequence_no'), name='fitness_test_sequence_unique'),
+        ),
+    ]
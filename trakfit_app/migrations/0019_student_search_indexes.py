@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trakfit_app', '0018_fitness_test_sequence_no'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['last_name'], name='students_last_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['first_name'], name='students_first_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['section_code', 'group_code'], name='students_section_group_idx'),
+        ),
+    ]
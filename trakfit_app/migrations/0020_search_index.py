@@ -0,0 +1,81 @@
+from django.db import migrations
+
+
+# Frozen copy of the index layout in trakfit_app/search.py at the time of this migration
+TABLE = 'search_index'
+BATCH_SIZE = 1000
+
+
+def _fts5_available(cursor):
+    try:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+    except Exception:
+        return False
+
+
+def _documents(Student, FitnessTest):
+    """(rowid, kind, object_id, student_id, body) of every student and remark."""
+    for student in Student.objects.select_related('user').order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        section = f"{student.section_code}-{student.group_code}" if student.group_code else student.section_code
+        parts = [
+            student.student_no, student.first_name, student.middle_initial, student.last_name,
+            section, student.user.email,
+        ]
+        yield student.pk * 2, 'student', student.pk, student.pk, ' '.join(part for part in parts if part)
+    remarks = FitnessTest.objects.exclude(remarks__isnull=True).exclude(remarks='').order_by('pk')
+    for test_id, student_id, text in remarks.values_list('test_id', 'student_id', 'remarks').iterator(chunk_size=BATCH_SIZE):
+        if text.strip():
+            yield test_id * 2 + 1, 'remark', test_id, student_id, text
+
+
+def create_search_index(apps, schema_editor):
+    """Create the search_index table for the current backend and index the existing rows."""
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            if not _fts5_available(cursor):
+                return
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+            "kind UNINDEXED, object_id UNINDEXED, student_id UNINDEXED, body, "
+            "tokenize = 'unicode61', prefix = '2 3')"
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE TABLE {TABLE} ("
+            "rowid bigint PRIMARY KEY, kind varchar(10) NOT NULL, object_id bigint NOT NULL, "
+            "student_id bigint NOT NULL, body text NOT NULL, "
+            "document tsvector GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED)"
+        )
+        schema_editor.execute(f"CREATE INDEX {TABLE}_document_idx ON {TABLE} USING GIN (document)")
+    else:
+        return
+
+    Student = apps.get_model('trakfit_app', 'Student')
+    FitnessTest = apps.get_model('trakfit_app', 'FitnessTest')
+    insert = f"INSERT INTO {TABLE} (rowid, kind, object_id, student_id, body) VALUES (%s, %s, %s, %s, %s)"
+    with connection.cursor() as cursor:
+        batch = []
+        for document in _documents(Student, FitnessTest):
+            batch.append(document)
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(insert, batch)
+                batch = []
+        if batch:
+            cursor.executemany(insert, batch)
+
+
+def drop_search_index(apps, schema_editor):
+    schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trakfit_app', '0019_student_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:06
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def start_pre_test_counters(apps, schema_editor):
+    """Start every counter at the student's highest pre-test number, in one UPDATE."""
+    Student = apps.get_model('trakfit_app', 'Student')
+    FitnessTest = apps.get_model('trakfit_app', 'FitnessTest')
+    pre_tests = (
+        FitnessTest.objects.filter(student=OuterRef('pk'), test_type='pre')
+        .values('student').annotate(n=Max('sequence_no')).values('n')
+    )
+    Student.objects.update(last_pre_test_no=Coalesce(Subquery(pre_tests), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trakfit_app', '0020_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='last_pre_test_no',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(start_pre_test_counters, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,16 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Cast, NullIf
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from decimal import Decimal
+from . import metrics
+
+
+def _measured(field):
+    """SQL float value of a measurement, NULL when it is missing or zero."""
+    return NullIf(Cast(field, models.FloatField()), models.Value(0.0))
 
 
 class UserManager(BaseUserManager):
@@ -75,11 +82,20 @@ class Student(models.Model):
     section_code = models.CharField(max_length=20)
     group_code = models.CharField(max_length=20, help_text="Student's assigned group code (e.g., G1, G2, G3)")
     last_data_update_at = models.DateTimeField(null=True, blank=True)
+    # Numbers given to the student's latest pre- and post-test; only ever incremented
+    last_pre_test_no = models.PositiveIntegerField(default=0)
+    last_post_test_no = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'students'
+        indexes = [
+            # Student management search (prefix matches) and its keyset pagination on student_no
+            models.Index(fields=['last_name'], name='students_last_name_idx'),
+            models.Index(fields=['first_name'], name='students_first_name_idx'),
+            models.Index(fields=['section_code', 'group_code'], name='students_section_group_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student_no} - {self.first_name} {self.last_name}"
@@ -92,6 +108,8 @@ class FitnessTest(models.Model):
         ('pre', 'Pre Test'),
         ('post', 'Post Test'),
     ]
+    # Student field counting the numbers given out for each test type
+    SEQUENCE_COUNTERS = {'pre': 'last_pre_test_no', 'post': 'last_post_test_no'}
     
     test_id = models.AutoField(primary_key=True)
     student = models.ForeignKey(
@@ -101,6 +119,9 @@ class FitnessTest(models.Model):
         related_name='fitness_tests'
     )
     test_type = models.CharField(max_length=10, choices=TEST_TYPE_CHOICES)
+    # 1, 2, 3, ... per student and test type in the order the tests were recorded
+    # ("post test #3"); assigned on insert by save()
+    sequence_no = models.PositiveIntegerField(editable=False)
     height_cm = models.DecimalField(
         max_digits=5, 
         decimal_places=1, 
@@ -163,32 +184,69 @@ class FitnessTest(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     remarks = models.TextField(null=True, blank=True)
     remarksCreated= models.DateTimeField(blank=True, null=True)
+
+    # Computed and stored by the database, so they can be filtered, sorted and
+    # aggregated in SQL. NULL when a measurement they need is missing. Like any
+    # generated column they are only current on instances read after a save.
+    bmi = models.GeneratedField(
+        expression=_measured('weight_kg') / (
+            (_measured('height_cm') / models.Value(100.0)) * (_measured('height_cm') / models.Value(100.0))
+        ),
+        output_field=models.FloatField(),
+        db_persist=True,
+    )
+    vo2_max = models.GeneratedField(
+        # Cooper formula
+        expression=(_measured('vo2_distance_m') - models.Value(metrics.COOPER_INTERCEPT)) / models.Value(metrics.COOPER_SLOPE),
+        output_field=models.FloatField(),
+        db_persist=True,
+    )
     
     class Meta:
         db_table = 'fitness_tests'
+        indexes = [
+            models.Index(fields=['taken_at'], name='fitness_tests_taken_at_idx'),
+            # Latest pre/post test lookups: filter by student and type, order by taken_at
+            models.Index(fields=['student', 'test_type', 'taken_at'], name='fitness_stu_type_taken_idx'),
+            # A student's full test history ordered by taken_at
+            models.Index(fields=['student', 'taken_at'], name='fitness_stu_taken_idx'),
+            # BMI range filters (e.g. BMI >= 30)
+            models.Index(fields=['bmi'], name='fitness_tests_bmi_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'test_type', 'sequence_no'], name='fitness_test_sequence_unique'),
+        ]
     
+    def save(self, *args, **kwargs):
+        """Number a new test within the same transaction as its insert."""
+        if self._state.adding and self.sequence_no is None:
+            with transaction.atomic():
+                self.take_sequence_no()
+                super().save(*args, **kwargs)
+            return
+        super().save(*args, **kwargs)
+
+    def take_sequence_no(self, **student_fields):
+        """
+        Number this new test from the student's counter for its type and return
+        the student fields written, as {field: value}.
+
+        The counter and `student_fields` are set in one UPDATE, which locks the
+        student row until the surrounding transaction commits, so concurrent
+        tests never share a number and a deleted test's number is not reused.
+        """
+        counter = self.SEQUENCE_COUNTERS[self.test_type]
+        students = Student.objects.filter(pk=self.student_id)
+        students.update(**{counter: models.F(counter) + 1}, **student_fields)
+        self.sequence_no = students.values_list(counter, flat=True).get()
+        return {counter: self.sequence_no, **student_fields}
+
     def clean(self):
         """Validate endurance seconds is between 0-59."""
         super().clean()
         if self.endurance_seconds is not None and (self.endurance_seconds < 0 or self.endurance_seconds > 59):
             raise ValidationError({'endurance_seconds': 'Seconds must be between 0 and 59.'})
     
-    @property
-    def bmi(self):
-        """Calculate BMI from height and weight. Returns None if data is missing."""
-        if self.height_cm and self.weight_kg:
-            height_m = float(self.height_cm) / 100
-            weight = float(self.weight_kg)
-            return weight / (height_m ** 2)
-        return None
-    
-    @property
-    def vo2_max(self):
-        """Calculate VO2 Max using Cooper formula. Returns None if distance is missing."""
-        if self.vo2_distance_m:
-            return (float(self.vo2_distance_m) - 504.9) / 44.73
-        return None
-    
     def get_endurance_display(self):
         """Return endurance formatted as mm:ss string."""
         if self.endurance_minutes is not None and self.endurance_seconds is not None:
@@ -220,14 +278,206 @@ class updates(models.Model):
         related_name='updates'
     )
     body = models.TextField(help_text="Description of the update action")
-    updated_at = models.DateTimeField(auto_now_add=True)
+    # Time of the action, set when the entry is recorded (entries are written in batches, see audit.py)
+    updated_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         db_table = 'updates'
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['updated_at'], name='updates_updated_at_idx'),
+        ]
     
     def __str__(self):
         return f"{self.body} at {self.updated_at}"
+
+
+class StudentFitnessSnapshotManager(models.Manager):
+    """Manager for reading a student's snapshot together with its tests."""
+
+    def for_student(self, student):
+        """Return the student's snapshot with latest pre/post tests loaded, building it if missing."""
+        snapshot = self.select_related('latest_pre', 'latest_post').filter(student=student).first()
+        if snapshot is None:
+            snapshot = self.model.refresh_for(student)
+        return snapshot
+
+
+class StudentFitnessSnapshot(models.Model):
+    """Denormalized latest pre/post test summary, one row per student."""
+
+    student = models.OneToOneField(
+        Student,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='fitness_snapshot'
+    )
+    latest_pre = models.ForeignKey(
+        FitnessTest,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    latest_post = models.ForeignKey(
+        FitnessTest,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    pre_bmi = models.FloatField(null=True, blank=True)
+    post_bmi = models.FloatField(null=True, blank=True)
+    pre_vo2_max = models.FloatField(null=True, blank=True)
+    post_vo2_max = models.FloatField(null=True, blank=True)
+    pre_endurance_sec = models.IntegerField(null=True, blank=True)
+    post_endurance_sec = models.IntegerField(null=True, blank=True)
+    flexibility_improvement = models.FloatField(null=True, blank=True)
+    strength_improvement = models.FloatField(null=True, blank=True)
+    agility_improvement = models.FloatField(null=True, blank=True)
+    speed_improvement = models.FloatField(null=True, blank=True)
+    endurance_improvement = models.FloatField(null=True, blank=True)
+    # Values this student last added to SectionMetricAggregate, so changes can be applied as deltas
+    aggregated_section_code = models.CharField(max_length=20, null=True, blank=True)
+    aggregated_group_code = models.CharField(max_length=20, null=True, blank=True)
+    aggregated_metrics = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = StudentFitnessSnapshotManager()
+
+    class Meta:
+        db_table = 'student_fitness_snapshots'
+
+    def __str__(self):
+        return f"Snapshot for {self.student_id}"
+
+    def _fill(self, pre_test, post_test):
+        """Set every derived field from the student's latest pre/post tests."""
+        self._fill_many([self], [(pre_test, post_test)])
+
+    @staticmethod
+    def _fill_many(snapshots, pairs):
+        """_fill() for many snapshots, computing the derived values of all their tests in one batch."""
+        pre = metrics.test_columns([pre_test for pre_test, _ in pairs])
+        post = metrics.test_columns([post_test for _, post_test in pairs])
+        pre_bmi = metrics.bmi(pre['height_cm'], pre['weight_kg'])
+        post_bmi = metrics.bmi(post['height_cm'], post['weight_kg'])
+        pre_vo2_max = metrics.vo2_max(pre['vo2_distance_m'])
+        post_vo2_max = metrics.vo2_max(post['vo2_distance_m'])
+        pre_endurance = metrics.endurance_seconds(pre['endurance_minutes'], pre['endurance_seconds'])
+        post_endurance = metrics.endurance_seconds(post['endurance_minutes'], post['endurance_seconds'])
+
+        # Improvement percentages (if both pre and post exist)
+        improvements = metrics.improvements(pre, post)
+
+        for index, (snapshot, (pre_test, post_test)) in enumerate(zip(snapshots, pairs)):
+            snapshot.latest_pre = pre_test
+            snapshot.latest_post = post_test
+            snapshot.pre_bmi = pre_bmi[index]
+            snapshot.post_bmi = post_bmi[index]
+            snapshot.pre_vo2_max = pre_vo2_max[index]
+            snapshot.post_vo2_max = post_vo2_max[index]
+            snapshot.pre_endurance_sec = pre_endurance[index]
+            snapshot.post_endurance_sec = post_endurance[index]
+            snapshot.flexibility_improvement = improvements['flexibility'][index]
+            snapshot.strength_improvement = improvements['strength'][index]
+            snapshot.agility_improvement = improvements['agility'][index]
+            snapshot.speed_improvement = improvements['speed'][index]
+            snapshot.endurance_improvement = improvements['endurance'][index]
+
+    @classmethod
+    def refresh_for(cls, student, save=True):
+        """Recompute the snapshot for a student from their latest tests and save it (unless `save=False`)."""
+        pre_test = student.fitness_tests.filter(test_type='pre').order_by('-taken_at', '-test_id').first()
+        post_test = student.fitness_tests.filter(test_type='post').order_by('-taken_at', '-test_id').first()
+
+        # Reuse the existing row so the aggregated_* bookkeeping is kept
+        snapshot = cls.objects.filter(student=student).first() or cls(student=student)
+        snapshot.student = student
+        snapshot._fill(pre_test, post_test)
+        if save:
+            snapshot.save()
+        return snapshot
+
+    @classmethod
+    def refresh_many(cls, students, batch_size=1000):
+        """refresh_for() for many students, with a fixed number of queries per batch."""
+        snapshots = []
+        students = list(students)
+        for start in range(0, len(students), batch_size):
+            batch = students[start:start + batch_size]
+            existing = {snapshot.student_id: snapshot for snapshot in cls.objects.filter(student__in=batch)}
+
+            # Tests come newest first, so the first one seen per (student, type) is the latest
+            latest = {}
+            tests = FitnessTest.objects.filter(student__in=batch).order_by('-taken_at', '-test_id')
+            for test in tests:
+                latest.setdefault((test.student_id, test.test_type), test)
+
+            refreshed = []
+            now = timezone.now()
+            for student in batch:
+                snapshot = existing.get(student.pk) or cls(student=student)
+                snapshot.student = student
+                snapshot.updated_at = now
+                refreshed.append(snapshot)
+            cls._fill_many(refreshed, [(latest.get((student.pk, 'pre')), latest.get((student.pk, 'post'))) for student in batch])
+
+            # One upsert instead of bulk_update, whose CASE per row and field is slow for large batches
+            cls.objects.bulk_create(
+                refreshed,
+                update_conflicts=True,
+                unique_fields=['student'],
+                update_fields=[
+                    'latest_pre', 'latest_post', 'pre_bmi', 'post_bmi', 'pre_vo2_max', 'post_vo2_max',
+                    'pre_endurance_sec', 'post_endurance_sec', 'flexibility_improvement', 'strength_improvement',
+                    'agility_improvement', 'speed_improvement', 'endurance_improvement', 'updated_at',
+                ],
+            )
+            snapshots.extend(refreshed)
+        return snapshots
+
+    @property
+    def improvements(self):
+        """Improvement percentages keyed like the student dashboard expects."""
+        values = {
+            'flexibility': self.flexibility_improvement,
+            'strength': self.strength_improvement,
+            'agility': self.agility_improvement,
+            'speed': self.speed_improvement,
+            'endurance': self.endurance_improvement,
+        }
+        return {key: value for key, value in values.items() if value is not None}
+
+
+class SectionMetricAggregate(models.Model):
+    """
+    Running sum, count and sum of squares of one metric over a section's latest tests.
+
+    Kept current incrementally from the student snapshots (see
+    aggregates.sync_section_aggregates) and rebuilt by `manage.py rebuild_aggregates`.
+    """
+
+    section_code = models.CharField(max_length=20)
+    group_code = models.CharField(max_length=20)
+    test_type = models.CharField(max_length=10, choices=FitnessTest.TEST_TYPE_CHOICES)
+    metric = models.CharField(max_length=30)
+    total = models.FloatField(default=0)
+    count = models.IntegerField(default=0)
+    sum_squares = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'section_metric_aggregates'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['section_code', 'group_code', 'test_type', 'metric'],
+                name='section_metric_aggregate_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.section_code}-{self.group_code} {self.test_type} {self.metric}"
 # class Remark(models.Model):
 #     """Remarks/feedback for students on their fitness tests."""
 #
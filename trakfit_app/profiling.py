@@ -0,0 +1,121 @@
+"""
+Opt-in per-request profiling.
+
+ProfilingMiddleware records wall time, SQL query count and time, template load and render
+time and JSON serialization time for a request. It is enabled for every request
+with TRAKFIT_PROFILING = True, or per request by a staff user sending the
+TRAKFIT_PROFILING_HEADER header. The numbers are returned in a Server-Timing
+header and logged to the 'trakfit.profiling' logger (a rotating file in settings).
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('trakfit.profiling')
+
+# Profile of the request being handled, or None when profiling is off
+_current = ContextVar('trakfit_profile', default=None)
+
+
+class RequestProfile:
+    """Timings (in ms) collected while handling one request."""
+
+    def __init__(self):
+        self.sql_count = 0
+        self.timings = {'sql': 0.0, 'template': 0.0, 'serialize': 0.0}
+
+    def add(self, name, elapsed_ms):
+        self.timings[name] = self.timings.get(name, 0.0) + elapsed_ms
+
+    def record_sql(self, execute, sql, params, many, context):
+        """Database execute wrapper counting and timing every query."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.add('sql', (time.perf_counter() - started) * 1000)
+
+
+@contextmanager
+def timer(name):
+    """Add the time spent in the block to the current request profile, if any."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, (time.perf_counter() - started) * 1000)
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        with timer('template'):
+            return super().render(context, request)
+
+
+class ProfilingDjangoTemplates(DjangoTemplates):
+    """The standard Django template backend, with render time added to the request profile."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        # Finding and parsing the template; near zero once the cached loader has it
+        with timer('template_load'):
+            template = super().get_template(template_name)
+        return ProfiledTemplate(template.template, self)
+
+
+class ProfilingMiddleware:
+    """Profile the request when enabled; must come after AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def is_enabled(self, request):
+        if getattr(settings, 'TRAKFIT_PROFILING', False):
+            return True
+        header = getattr(settings, 'TRAKFIT_PROFILING_HEADER', 'X-TrakFit-Profile')
+        user = getattr(request, 'user', None)
+        return bool(request.headers.get(header)) and user is not None and user.is_staff
+
+    def __call__(self, request):
+        if not self.is_enabled(request):
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.record_sql))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        # Streaming responses are timed up to the first byte only
+        total_ms = (time.perf_counter() - started) * 1000
+
+        response['Server-Timing'] = ', '.join(
+            [f'total;dur={total_ms:.1f}', f'sql;dur={profile.timings["sql"]:.1f};desc="{profile.sql_count} queries"']
+            + [f'{name};dur={elapsed:.1f}' for name, elapsed in profile.timings.items() if name != 'sql']
+        )
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'sql_count': profile.sql_count,
+            **{f'{name}_ms': round(elapsed, 2) for name, elapsed in profile.timings.items()},
+        }))
+        return response
@@ -0,0 +1,48 @@
+"""
+Recording of a student's fitness test submission.
+
+`record_test()` builds the complete FitnessTest in memory, endurance included,
+and writes it in one transaction: one UPDATE of the student (data timestamp and
+the test's sequence counter) and one INSERT of the test. The
+post_save receivers in signals.py then run once, keeping the snapshot, section
+aggregates and search index current and recording the `updates` entry; if any
+of them fails, nothing is saved.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import FitnessTest
+
+
+# Measurement fields a submission sets directly (endurance is given as "mm:ss")
+MEASUREMENT_FIELDS = [
+    'height_cm', 'weight_kg', 'vo2_distance_m', 'flexibility_cm',
+    'strength_reps', 'agility_sec', 'speed_sec',
+]
+
+
+def record_test(student, test_type, measurements, endurance_time, taken_at=None):
+    """
+    Save a new test of `student` and return it.
+
+    `measurements` maps MEASUREMENT_FIELDS to their values. Raises
+    ValidationError for a malformed `endurance_time` before anything is written.
+    """
+    test = FitnessTest(
+        student=student,
+        test_type=test_type,
+        taken_at=taken_at or timezone.now(),
+        **{field: measurements[field] for field in MEASUREMENT_FIELDS},
+    )
+    test.set_endurance_from_string(endurance_time)
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Take the next number in the same UPDATE as the data timestamp
+        for field, value in test.take_sequence_no(last_data_update_at=now, updated_at=now).items():
+            setattr(student, field, value)
+
+        # Tells the post_save receiver the student row is already up to date
+        test._student_updated_at = now
+        test.save()
+    return test
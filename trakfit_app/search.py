@@ -0,0 +1,177 @@
+"""
+Full-text search over students and fitness test remarks.
+
+Documents live in the `search_index` table, one per student (student number,
+names, section/group and e-mail) and one per test that has remarks. On SQLite
+it is an FTS5 virtual table ranked with bm25; on PostgreSQL a regular table with
+a generated `tsvector` column, a GIN index and ts_rank. Other databases (or a
+SQLite build without FTS5) have no index: `enabled()` is False and callers fall
+back to plain lookups. Migration 0020 creates the table.
+
+Signal receivers keep the index current (see signals.py); bulk writers call
+`index_students()` and `manage.py rebuild_search_index` rebuilds it.
+"""
+import re
+
+from django.db import connection
+
+
+TABLE = 'search_index'
+
+STUDENT = 'student'
+REMARK = 'remark'
+
+# Document rowids are derived from the object's primary key, so updates and deletes are rowid lookups
+_KIND_BITS = {STUDENT: 0, REMARK: 1}
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def _rowid(kind, object_id):
+    return object_id * 2 + _KIND_BITS[kind]
+
+
+def enabled():
+    """True when the database has a search index."""
+    # Cached per database: introspection costs a query
+    key = (connection.alias, connection.settings_dict['NAME'])
+    if key not in enabled.cache:
+        enabled.cache[key] = TABLE in connection.introspection.table_names(include_views=False)
+    return enabled.cache[key]
+
+
+enabled.cache = {}
+
+
+def student_body(student):
+    """Indexed text of a student."""
+    section = f"{student.section_code}-{student.group_code}" if student.group_code else student.section_code
+    parts = [
+        student.student_no, student.first_name, student.middle_initial, student.last_name,
+        section, student.user.email,
+    ]
+    return ' '.join(part for part in parts if part)
+
+
+def _write(documents, deleted=()):
+    """Replace the documents [(kind, object_id, student_id, body)] and drop the `deleted` (kind, object_id)."""
+    if not enabled():
+        return
+    rowids = [_rowid(kind, object_id) for kind, object_id in deleted]
+    rows = [(_rowid(kind, object_id), kind, object_id, student_id, body) for kind, object_id, student_id, body in documents]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rowids), 500):
+            batch = rowids[start:start + 500]
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({', '.join(['%s'] * len(batch))})", batch)
+        if not rows:
+            return
+        if connection.vendor == 'postgresql':
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (rowid, kind, object_id, student_id, body) VALUES (%s, %s, %s, %s, %s) "
+                "ON CONFLICT (rowid) DO UPDATE SET body = EXCLUDED.body, student_id = EXCLUDED.student_id",
+                rows,
+            )
+        else:
+            # FTS5 tables have no upsert: delete, then insert
+            cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (rowid, kind, object_id, student_id, body) VALUES (%s, %s, %s, %s, %s)",
+                rows,
+            )
+
+
+def index_students(students):
+    """(Re)index students; their `user` should be loaded (select_related) to avoid a query each."""
+    _write([(STUDENT, student.pk, student.pk, student_body(student)) for student in students])
+
+
+def index_tests(tests):
+    """(Re)index the remarks of tests, dropping the documents of those without remarks."""
+    documents, deleted = [], []
+    for test in tests:
+        if test.remarks and test.remarks.strip():
+            documents.append((REMARK, test.pk, test.student_id, test.remarks))
+        else:
+            deleted.append((REMARK, test.pk))
+    _write(documents, deleted)
+
+
+def index_test(test):
+    index_tests([test])
+
+
+def remove_student(student_id):
+    _write([], deleted=[(STUDENT, student_id)])
+
+
+def remove_test(test_id):
+    _write([], deleted=[(REMARK, test_id)])
+
+
+def _documents(Student, FitnessTest, batch_size):
+    for student in Student.objects.select_related('user').order_by('pk').iterator(chunk_size=batch_size):
+        yield STUDENT, student.pk, student.pk, student_body(student)
+    remarks = FitnessTest.objects.exclude(remarks__isnull=True).exclude(remarks='').order_by('pk')
+    for test_id, student_id, text in remarks.values_list('test_id', 'student_id', 'remarks').iterator(chunk_size=batch_size):
+        if text.strip():
+            yield REMARK, test_id, student_id, text
+
+
+def rebuild(batch_size=1000):
+    """Reindex every student and remark. Returns the number of documents."""
+    from .models import FitnessTest, Student
+
+    if not enabled():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+    count = 0
+    batch = []
+    for document in _documents(Student, FitnessTest, batch_size):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            _write(batch)
+            count += len(batch)
+            batch = []
+    _write(batch)
+    return count + len(batch)
+
+
+def _words(query):
+    return [word.lower() for word in _WORD.findall(query)]
+
+
+def search(query, kind=None, limit=20, offset=0):
+    """
+    Ranked matches of `query`, best first, as [{'kind', 'object_id', 'student_id', 'snippet'}].
+
+    Every word of the query must match the start of a word in the document
+    (prefix search). `kind` limits the results to STUDENT or REMARK documents.
+    """
+    words = _words(query)
+    if not words or not enabled():
+        return []
+    kinds = [kind] if kind else [STUDENT, REMARK]
+    placeholders = ', '.join(['%s'] * len(kinds))
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            terms = ' & '.join(f"{word}:*" for word in words)
+            cursor.execute(
+                f"SELECT kind, object_id, student_id, "
+                f"ts_headline('simple', body, to_tsquery('simple', %s), 'MaxFragments=1, MaxWords=12, MinWords=4') "
+                f"FROM {TABLE} WHERE document @@ to_tsquery('simple', %s) AND kind IN ({placeholders}) "
+                f"ORDER BY ts_rank(document, to_tsquery('simple', %s)) DESC, rowid LIMIT %s OFFSET %s",
+                [terms, terms, *kinds, terms, limit, offset],
+            )
+        else:
+            terms = ' AND '.join(f'"{word}"*' for word in words)
+            cursor.execute(
+                f"SELECT kind, object_id, student_id, snippet({TABLE}, 3, '[', ']', '...', 12) "
+                f"FROM {TABLE} WHERE {TABLE} MATCH %s AND kind IN ({placeholders}) "
+                f"ORDER BY rank, rowid LIMIT %s OFFSET %s",
+                [terms, *kinds, limit, offset],
+            )
+        return [
+            {'kind': kind, 'object_id': object_id, 'student_id': student_id, 'snippet': snippet}
+            for kind, object_id, student_id, snippet in cursor.fetchall()
+        ]
@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import FitnessTest, Student, updates
+from . import audit, search
+from .aggregates import invalidate_dashboard_section, refresh_student_aggregates, sync_section_aggregates
+from .middleware import invalidate_student
+from .models import FitnessTest, Student, StudentFitnessSnapshot, User
 
 
 @receiver(post_save, sender=Student)
@@ -12,17 +16,62 @@ def student_registered(sender, instance, created, **kwargs):
         full_name = f"{student.first_name} {student.last_name}"
         body = f"Student {full_name} registered"
         
-        # Create an entry in the updates model
-        updates.objects.create(student=student, body=body)
+        # Create an entry in the updates model (written in the background, see audit.py)
+        audit.record(student, body)
 
 
-@receiver(post_save, sender=FitnessTest)
-def update_student_timestamp(sender, instance, created, **kwargs):
-    # Signal to update the student's updated_at field whenever a fitness test is created or updated.
-    # Also creates an entry in the updates model to track the change.
-    student = instance.student
-    full_name = f"{student.first_name} {student.last_name}"
-    
+@receiver(pre_save, sender=Student)
+def remember_student_section(sender, instance, **kwargs):
+    # Signal to remember the section a student is saved from, so a section change
+    # invalidates the cached dashboard totals of both the old and the new section.
+    instance._saved_section = (
+        Student.objects.filter(pk=instance.pk).values_list('section_code', 'group_code').first()
+    )
+
+
+def _section_has_students(section, exclude_pk=None):
+    return Student.objects.filter(section_code=section[0], group_code=section[1]).exclude(pk=exclude_pk).exists()
+
+
+@receiver(post_save, sender=Student)
+def invalidate_dashboard_on_student_save(sender, instance, created, **kwargs):
+    # Signal to drop the cached teacher dashboard totals of the student's section.
+    # The cached section list only changes when a section gains its first student
+    # or loses its last one.
+    section = (instance.section_code, instance.group_code)
+    previous = getattr(instance, '_saved_section', None)
+    if previous == section:
+        invalidate_dashboard_section(*section)
+        return
+
+    # Move the student's running-aggregate contribution to the new section
+    snapshot = StudentFitnessSnapshot.objects.select_related('latest_pre', 'latest_post').filter(student=instance).first()
+    if snapshot is not None:
+        snapshot.student = instance
+        sync_section_aggregates(snapshot)
+    invalidate_dashboard_section(*section, sections_changed=not _section_has_students(section, instance.pk))
+    if previous:
+        invalidate_dashboard_section(*previous, sections_changed=not _section_has_students(previous))
+
+
+@receiver(pre_delete, sender=Student)
+def remove_student_from_aggregates(sender, instance, **kwargs):
+    # Signal to subtract a student's values from the section running aggregates
+    # before their snapshot is deleted along with them.
+    snapshot = StudentFitnessSnapshot.objects.filter(student=instance).first()
+    if snapshot is not None:
+        snapshot.student = instance
+        sync_section_aggregates(snapshot, removed=True)
+
+
+@receiver(post_delete, sender=Student)
+def invalidate_dashboard_on_student_delete(sender, instance, **kwargs):
+    # Signal to drop the cached teacher dashboard totals when a student is removed.
+    section = (instance.section_code, instance.group_code)
+    invalidate_dashboard_section(*section, sections_changed=not _section_has_students(section))
+
+
+def student_pronoun(student):
     # Determine the pronoun based on gender
     pronoun = "his/her"
     if student.gender:
@@ -30,36 +79,119 @@ def update_student_timestamp(sender, instance, created, **kwargs):
             pronoun = "his"
         elif student.gender.lower() in ['female', 'f']:
             pronoun = "her"
+    return pronoun
+
+
+def test_created_body(student, test_type, post_test_number=None):
+    # Text of the updates entry for a newly created test (also used by bulk imports).
+    full_name = f"{student.first_name} {student.last_name}"
+    if test_type == 'pre':
+        return f"{full_name} created {student_pronoun(student)} pre-test"
+    return f"{full_name} created {student_pronoun(student)} post test #{post_test_number}"
+
+
+@receiver(post_save, sender=FitnessTest)
+def update_student_timestamp(sender, instance, created, **kwargs):
+    # Signal to update the student's updated_at field whenever a fitness test is created or updated.
+    # Also creates an entry in the updates model to track the change.
+    student = instance.student
+    full_name = f"{student.first_name} {student.last_name}"
+    pronoun = student_pronoun(student)
     
     # Update the student's last_data_update_at timestamp without triggering signals
-    Student.objects.filter(pk=student.pk).update(
-        last_data_update_at=timezone.now(),
-        updated_at=timezone.now()
-    )
+    # (already done by recording.record_test() when the test comes from there)
+    if getattr(instance, '_student_updated_at', None) is None:
+        now = timezone.now()
+        Student.objects.filter(pk=student.pk).update(last_data_update_at=now, updated_at=now)
+    
+    # Keep the denormalized latest pre/post snapshot and the section running aggregates current
+    refresh_student_aggregates(student)
+
+    # The section's cached dashboard totals are now stale
+    invalidate_dashboard_section(student.section_code, student.group_code)
     
     # Generate appropriate message based on action and test type
     if created:
         # New test created
         if instance.test_type == 'pre':
-            body = f"{full_name} created {pronoun} pre-test"
+            body = test_created_body(student, 'pre')
         else:  # post test
-            # Count existing post tests to get the number
-            post_test_count = student.fitness_tests.filter(test_type='post').count()
-            body = f"{full_name} created {pronoun} post test #{post_test_count}"
+            body = test_created_body(student, 'post', instance.sequence_no)
         
         # Create an entry in the updates model to track this change
-        updates.objects.create(student=student, body=body)
+        audit.record(student, body)
     else:
         # Test updated - only for post tests (pre-tests are not editable)
         if instance.test_type == 'post':
-            # Find which post test number this is
-            post_tests = student.fitness_tests.filter(test_type='post').order_by('taken_at')
-            test_number = 1
-            for idx, test in enumerate(post_tests, start=1):
-                if test.test_id == instance.test_id:
-                    test_number = idx
-                    break
-            body = f"{full_name} updated {pronoun} post test #{test_number}"
+            body = f"{full_name} updated {pronoun} post test #{instance.sequence_no}"
             
             # Create an entry in the updates model to track this change
-            updates.objects.create(student=student, body=body)
+            audit.record(student, body)
+
+
+@receiver(post_delete, sender=FitnessTest)
+def refresh_snapshot_on_delete(sender, instance, origin=None, **kwargs):
+    # Signal to rebuild the student's snapshot when one of their tests is removed.
+    # Skipped when the deletion cascades from the student or user (the snapshot
+    # cascades away too); the student row still exists at this point.
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model is FitnessTest and Student.objects.filter(pk=instance.student_id).exists():
+        refresh_student_aggregates(instance.student)
+        invalidate_dashboard_section(instance.student.section_code, instance.student.group_code)
+
+
+@receiver(post_save, sender=Student)
+def index_student(sender, instance, **kwargs):
+    # Signal to keep the student's search document current.
+    search.index_students([instance])
+
+
+@receiver(post_save, sender=User)
+def index_student_email(sender, instance, created, update_fields=None, **kwargs):
+    # Signal to reindex a student when their e-mail changes. Saves that name their
+    # fields without the e-mail (e.g. last_login on sign-in) are skipped.
+    if created or (update_fields is not None and 'email' not in update_fields):
+        return
+    student = Student.objects.filter(pk=instance.pk).first()
+    if student is not None:
+        student.user = instance
+        search.index_students([student])
+
+
+@receiver(post_delete, sender=Student)
+def unindex_student(sender, instance, **kwargs):
+    # Signal to drop a removed student's search document (their tests' remark
+    # documents go with the cascaded test deletions).
+    search.remove_student(instance.pk)
+
+
+@receiver(post_save, sender=FitnessTest)
+def index_test_remarks(sender, instance, created, update_fields=None, **kwargs):
+    # Signal to keep the search document of the test's remarks current. A new
+    # test without remarks has no document to add or drop.
+    if created and not (instance.remarks and instance.remarks.strip()):
+        return
+    if update_fields is None or 'remarks' in update_fields:
+        search.index_test(instance)
+
+
+@receiver(post_delete, sender=FitnessTest)
+def unindex_test_remarks(sender, instance, **kwargs):
+    # Signal to drop a removed test's remarks from the search index.
+    search.remove_test(instance.pk)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_session_student(sender, instance, **kwargs):
+    # Signal to make sessions re-read a saved or removed student (see middleware.py).
+    invalidate_student(instance.pk)
+
+
+@receiver(post_save, sender=FitnessTest)
+@receiver(post_delete, sender=FitnessTest)
+def invalidate_session_student_on_test_change(sender, instance, **kwargs):
+    # Signal to make sessions re-read the student, whose timestamps and post-test
+    # counter change with their tests (see middleware.py).
+    invalidate_student(instance.student_id)
+
@@ -1,3 +1,1124 @@
-from django.test import TestCase
+import json
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import audit, metrics, search, signals
+from .aggregates import compute_dashboard_aggregates, invalidate_dashboard
+from .models import User, Student, FitnessTest, SectionMetricAggregate, StudentFitnessSnapshot, updates
+from .recording import record_test
+
+
+# Most queries each page may run. Every budget is also checked to be constant in
+# the number of students and in the number of tests of the viewed student.
+QUERY_BUDGETS = {
+    'teacher_dashboard': 6,
+    'teacher_tests_api': 3,
+    'teacher_averages_api': 3,
+    'student_management': 3,
+    'student_search_api': 4,
+    'search_api': 5,
+    'student_profile': 6,
+    'student-dashboard': 4,
+    'student-profile': 7,
+    'student-history': 5,
+    'student-pre-test': 2,
+    'student-post-test': 3,
+    'update-test': 5,
+    'login': 10,
+    'export_tests': 3,
+    'import_roster': 19,
+    'add_remark': 13,
+}
+
+# URL names deliberately left without a budget
+UNBUDGETED_URLS = {
+    'logout',  # redirects only
+    'register', 'pre-test-register', 'enter_code', 'change_password',  # one-off account flows
+    'student-profile-update',  # redirects only
+    'add-remark',  # the add_remark view under its older URL
+}
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryBudgetTests(TestCase):
+    """Fail when a view's query count grows with the data (N+1 regressions)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', is_staff=True)
+        cls.add_students(5)
+        cls.student = Student.objects.select_related('user').order_by('pk').first()
+        cls.student.user.set_password('correct-horse-9')
+        cls.student.user.save()
+        cls.imported = 0
+
+    @staticmethod
+    def add_students(count):
+        call_command('seed_trakfit', students=count, tests_per_student=3, sections=3, verbosity=0)
+
+    def add_tests(self, count):
+        """Give the viewed student `count` more post-tests."""
+        latest = self.student.fitness_tests.order_by('-taken_at').first()
+        self.student.refresh_from_db()
+        numbers = range(self.student.last_post_test_no + 1, self.student.last_post_test_no + count + 1)
+        Student.objects.filter(pk=self.student.pk).update(last_post_test_no=numbers[-1])
+        FitnessTest.objects.bulk_create([
+            FitnessTest(
+                student=self.student,
+                test_type='post',
+                sequence_no=numbers[i],
+                height_cm=latest.height_cm,
+                weight_kg=latest.weight_kg,
+                vo2_distance_m=latest.vo2_distance_m,
+                flexibility_cm=latest.flexibility_cm,
+                strength_reps=latest.strength_reps,
+                agility_sec=latest.agility_sec,
+                speed_sec=latest.speed_sec,
+                endurance_minutes=latest.endurance_minutes,
+                endurance_seconds=latest.endurance_seconds,
+                taken_at=latest.taken_at + timedelta(days=i + 1),
+            )
+            for i in range(count)
+        ])
+        StudentFitnessSnapshot.refresh_for(self.student)
+
+    def roster_upload(self):
+        """POST data of a one-student roster import; a new student every call."""
+        QueryBudgetTests.imported += 1
+        row = f'2099-{self.imported:04d},Ana,Cruz,2005-03-01,Female,BSIT-1A,G1,import{self.imported}@example.com,pre,2026-01-05,160,50,2000,10,20,12,7,12:30\n'
+        return {'file': SimpleUploadedFile('roster.csv', (RosterImportTests.HEADER + row).encode(), content_type='text/csv')}
+
+    def pages(self):
+        """
+        (budget key, logged-in user, url, POST data) of every page under a budget.
+
+        The data is None for a GET, or a callable returning fresh POST data; the
+        user is None for anonymous requests.
+        """
+        post_test = self.student.fitness_tests.filter(test_type='post').order_by('-taken_at').first()
+        return [
+            ('login', None, reverse('login'), lambda: {'email': self.student.user.email, 'password': 'correct-horse-9'}),
+            ('teacher_dashboard', self.teacher, reverse('teacher_dashboard'), None),
+            ('teacher_tests_api', self.teacher, reverse('teacher_tests_api'), None),
+            ('teacher_averages_api', self.teacher, reverse('teacher_averages_api'), None),
+            ('export_tests', self.teacher, reverse('export_tests'), None),
+            ('student_management', self.teacher, reverse('student_management'), None),
+            ('import_roster', self.teacher, reverse('import_roster'), self.roster_upload),
+            ('student_search_api', self.teacher, reverse('student_search_api') + '?q=seed', None),
+            ('search_api', self.teacher, reverse('search_api') + '?q=seed', None),
+            ('student_profile', self.teacher, reverse('student_profile', args=[self.student.student_no]), None),
+            ('add_remark', self.teacher, reverse('add_remark'), lambda: {'test_id': post_test.test_id, 'remark': 'Keep it up'}),
+            ('student-dashboard', self.student.user, reverse('student-dashboard'), None),
+            ('student-profile', self.student.user, reverse('student-profile'), None),
+            ('student-history', self.student.user, reverse('student-history'), None),
+            ('student-pre-test', self.student.user, reverse('student-pre-test'), None),
+            ('student-post-test', self.student.user, reverse('student-post-test'), None),
+            ('update-test', self.student.user, reverse('update-test', args=[post_test.test_id]), None),
+        ]
+
+    def request(self, user, url, data):
+        if user is None:
+            self.client.logout()
+        else:
+            self.client.force_login(user)
+        return self.client.get(url) if data is None else self.client.post(url, data())
+
+    def count_queries(self):
+        """Return {budget key: number of queries} for one request to every page."""
+        counts = {}
+        for name, user, url, data in self.pages():
+            # Warm-up request: the student profile is then read from the session (see middleware.py)
+            self.request(user, url, data)
+            if user is None:
+                self.client.logout()
+            # Budgets cover the uncached path, so the cached teacher dashboard is recomputed
+            invalidate_dashboard()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url) if data is None else self.client.post(url, data())
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            self.assertLess(response.status_code, 400, f'{name} returned {response.status_code}')
+            counts[name] = len(queries)
+        return counts
+
+    def test_every_view_has_a_budget(self):
+        from django.urls import URLPattern
+        from TrakFit.urls import urlpatterns
+
+        # A new view fails here until it gets a budget (or is listed in UNBUDGETED_URLS)
+        named = {pattern.name for pattern in urlpatterns if isinstance(pattern, URLPattern) and pattern.name}
+        self.assertEqual(set(QUERY_BUDGETS), named - UNBUDGETED_URLS)
+        self.assertEqual({name for name, *_ in self.pages()}, set(QUERY_BUDGETS))
+
+    def test_views_stay_within_budget(self):
+        for name, count in self.count_queries().items():
+            with self.subTest(view=name):
+                self.assertLessEqual(count, QUERY_BUDGETS[name])
+
+    def test_queries_constant_in_number_of_students(self):
+        before = self.count_queries()
+        self.add_students(20)
+        self.assertEqual(self.count_queries(), before)
+
+    def test_queries_constant_in_number_of_tests(self):
+        before = self.count_queries()
+        self.add_tests(15)
+        self.assertEqual(self.count_queries(), before)
+
+
+
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', is_staff=True)
+        call_command('seed_trakfit', students=3, tests_per_student=2, verbosity=0)
+        cls.student = Student.objects.select_related('user').first()
+
+    def test_staff_header_adds_server_timing(self):
+        self.client.force_login(self.teacher)
+        with self.assertLogs('trakfit.profiling') as logs:
+            response = self.client.get(reverse('teacher_dashboard'), headers={'X-TrakFit-Profile': '1'})
+        timing = response['Server-Timing']
+        for name in ('total', 'sql', 'template', 'serialize'):
+            self.assertIn(f'{name};dur=', timing)
+        self.assertIn('"sql_count": ', logs.output[0])
+
+    def test_disabled_without_header_or_for_students(self):
+        self.client.force_login(self.teacher)
+        self.assertNotIn('Server-Timing', self.client.get(reverse('teacher_dashboard')))
+        self.client.force_login(self.student.user)
+        response = self.client.get(reverse('student-dashboard'), headers={'X-TrakFit-Profile': '1'})
+        self.assertNotIn('Server-Timing', response)
+
+
+class DashboardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', is_staff=True)
+        call_command('seed_trakfit', students=6, tests_per_student=2, sections=2, verbosity=0)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.teacher)
+
+    def dashboard(self):
+        return self.client.get(reverse('teacher_dashboard')).context
+
+    def test_repeated_loads_use_the_cache(self):
+        first = self.dashboard()
+        with CaptureQueriesContext(connection) as queries:
+            second = self.dashboard()
+        # Session, user and the recent updates feed only
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(first['section_averages_json'], second['section_averages_json'])
+
+    def test_saving_a_test_invalidates_only_its_section(self):
+        self.dashboard()
+        test = FitnessTest.objects.select_related('student').filter(test_type='post').first()
+        test.weight_kg += 10
+        with self.captureOnCommitCallbacks(execute=True):
+            test.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            context = self.dashboard()
+        section = f'{test.student.section_code}-{test.student.group_code}'
+        recomputed = [query['sql'] for query in queries if 'GROUP BY' in query['sql']]
+        self.assertTrue(recomputed)
+        self.assertTrue(all(test.student.section_code in sql for sql in recomputed))
+        self.assertEqual(
+            json.loads(context['section_averages_json'])[section],
+            compute_dashboard_aggregates()['section_averages'][section],
+        )
+
+    def test_load_racing_a_write_does_not_cache_stale_totals(self):
+        from . import aggregates
+
+        self.dashboard()
+        student = Student.objects.first()
+        section = (student.section_code, student.group_code)
+        compute = aggregates.compute_section_totals
+
+        def compute_then_write(*args, **kwargs):
+            # A write commits after this load has read the database
+            totals = compute(*args, **kwargs)
+            with self.captureOnCommitCallbacks(execute=True):
+                aggregates.invalidate_dashboard_section(*section)
+            return totals
+
+        with self.captureOnCommitCallbacks(execute=True):
+            aggregates.invalidate_dashboard_section(*section)
+        with mock.patch.object(aggregates, 'compute_section_totals', side_effect=compute_then_write):
+            aggregates.get_dashboard_aggregates()
+        with mock.patch.object(aggregates, 'compute_section_totals', side_effect=compute) as recompute:
+            payload = aggregates.get_dashboard_aggregates()
+        self.assertEqual([call.args for call in recompute.call_args_list], [([section],)])
+        self.assertEqual(payload['section_averages'], compute_dashboard_aggregates()['section_averages'])
+
+
+def brute_force_dashboard():
+    """The teacher dashboard numbers computed student by student, as the view did before aggregating in SQL."""
+
+    def values(test):
+        def present(value):
+            return float(value) if value else None
+
+        height, weight, distance = present(test.height_cm), present(test.weight_kg), present(test.vo2_distance_m)
+        return {
+            'bmi': weight / (height / 100) ** 2 if height and weight else None,
+            'vo2_max': (distance - 504.9) / 44.73 if distance else None,
+            'flexibility_cm': present(test.flexibility_cm),
+            'strength_reps': present(test.strength_reps),
+            'agility_sec': present(test.agility_sec),
+            'speed_sec': present(test.speed_sec),
+            'endurance_sec': (
+                test.endurance_minutes * 60 + (test.endurance_seconds or 0)
+                if test.endurance_minutes is not None else None
+            ),
+        }
+
+    def averages(collected):
+        result = {
+            metric: {
+                test_type: sum(collected[test_type][metric]) / len(collected[test_type][metric])
+                if collected[test_type][metric] else 0
+                for test_type in ('pre', 'post')
+            }
+            for metric in values(FitnessTest())
+        }
+        result['bmi_change'] = sum(collected['bmi_change']) / len(collected['bmi_change']) if collected['bmi_change'] else 0
+        return result
+
+    def empty():
+        return {'pre': {metric: [] for metric in values(FitnessTest())},
+                'post': {metric: [] for metric in values(FitnessTest())},
+                'bmi_change': []}
+
+    overall, sections = empty(), {}
+    bmi_distribution = {'underweight': 0, 'normal': 0, 'overweight': 0, 'obese': 0}
+    dates = {'pre_test_dates': [], 'post_test_dates': []}
+    students = Student.objects.order_by('pk')
+    for student in students:
+        section = sections.setdefault(f'{student.section_code}-{student.group_code}', empty())
+        latest = {
+            test_type: student.fitness_tests.filter(test_type=test_type).order_by('-taken_at', '-test_id').first()
+            for test_type in ('pre', 'post')
+        }
+        measured = {test_type: values(test) if test else None for test_type, test in latest.items()}
+        for test_type, test in latest.items():
+            if test is None:
+                continue
+            if test.taken_at:
+                dates[f'{test_type}_test_dates'].append(test.taken_at.strftime('%Y-%m-%d'))
+            for metric, value in measured[test_type].items():
+                if value is not None:
+                    overall[test_type][metric].append(value)
+                    section[test_type][metric].append(value)
+        if measured['pre'] and measured['post'] and measured['pre']['bmi'] and measured['post']['bmi']:
+            change = measured['post']['bmi'] - measured['pre']['bmi']
+            overall['bmi_change'].append(change)
+            section['bmi_change'].append(change)
+        if measured['post'] and measured['post']['bmi']:
+            bmi = measured['post']['bmi']
+            status = 'underweight' if bmi < 18.5 else 'normal' if bmi < 25 else 'overweight' if bmi < 30 else 'obese'
+            bmi_distribution[status] += 1
+
+    return {
+        'average': averages(overall),
+        'section_averages': {key: averages(section) for key, section in sections.items()},
+        'bmi_distribution': bmi_distribution,
+        'dates': dates,
+        'sections': sorted(sections),
+        'total_students': students.count(),
+    }
+
+
+class DashboardAggregateParityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_trakfit', students=30, tests_per_student=3, sections=3, verbosity=0)
+
+    def assertAlmostEqualNested(self, first, second, path='payload'):
+        if isinstance(first, dict):
+            self.assertEqual(set(first), set(second), path)
+            for key in first:
+                self.assertAlmostEqualNested(first[key], second[key], f'{path}.{key}')
+        else:
+            self.assertAlmostEqual(first, second, places=6, msg=path)
+
+    def assertMatchesBruteForce(self):
+        expected = brute_force_dashboard()
+        actual = compute_dashboard_aggregates()
+        self.assertAlmostEqualNested(actual['average'], expected['average'])
+        self.assertAlmostEqualNested(actual['section_averages'], expected['section_averages'])
+        self.assertEqual(actual['bmi_distribution'], expected['bmi_distribution'])
+        self.assertEqual(actual['sections'], expected['sections'])
+        self.assertEqual(actual['total_students'], expected['total_students'])
+        for name, dates in expected['dates'].items():
+            self.assertEqual(sorted(actual['dates'][name]), sorted(dates))
+
+    def latest(self, student, test_type):
+        return student.fitness_tests.filter(test_type=test_type).order_by('-taken_at', '-test_id').first()
+
+    def test_seeded_data(self):
+        self.assertMatchesBruteForce()
+
+    def test_missing_and_zero_measurements_and_single_test_types(self):
+        students = list(Student.objects.order_by('pk'))
+        # Only a pre-test, only a post-test, no tests at all
+        FitnessTest.objects.filter(student=students[0], test_type='post').delete()
+        FitnessTest.objects.filter(student=students[1], test_type='pre').delete()
+        FitnessTest.objects.filter(student=students[2]).delete()
+
+        post = self.latest(students[3], 'post')
+        post.height_cm = None
+        post.flexibility_cm = 0
+        post.strength_reps = None
+        post.endurance_minutes = None
+        post.save()
+        pre = self.latest(students[4], 'pre')
+        pre.vo2_distance_m = None
+        pre.agility_sec = 0
+        pre.speed_sec = None
+        pre.strength_reps = 0
+        pre.endurance_seconds = None
+        pre.save()
+
+        # Moved to another section, and removed
+        students[5].section_code = students[6].section_code
+        students[5].group_code = 'G9'
+        students[5].save()
+        students[7].user.delete()
+
+        self.assertMatchesBruteForce()
+
+class TeacherTestsApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', is_staff=True)
+        call_command('seed_trakfit', students=10, tests_per_student=3, sections=2, verbosity=0)
+        cls.tests = list(FitnessTest.objects.select_related('student').order_by('test_id'))
+
+    def setUp(self):
+        self.client.force_login(self.teacher)
+
+    def fetch_all(self, **params):
+        """Test ids of every page, following next_cursor, and the number of pages."""
+        ids, pages, cursor = [], 0, None
+        while True:
+            query = dict(params, **({'after': cursor} if cursor else {}))
+            response = self.client.get(reverse('teacher_tests_api'), query)
+            self.assertEqual(response.status_code, 200)
+            page = json.loads(b''.join(response.streaming_content))
+            ids += [record['test_id'] for record in page['results']]
+            pages += 1
+            cursor = page['next_cursor']
+            if cursor is None:
+                return ids, pages
+            self.assertEqual(cursor, ids[-1])
+
+    def test_cursor_walks_every_test_once(self):
+        ids, pages = self.fetch_all(limit=7)
+        self.assertEqual(ids, [test.test_id for test in self.tests])
+        self.assertEqual(pages, -(-len(self.tests) // 7))
+
+    def test_filters_apply_across_pages(self):
+        test = self.tests[len(self.tests) // 2]
+        day = timezone.localtime(test.taken_at).date()
+        section = f'{test.student.section_code}-{test.student.group_code}'
+
+        ids, _ = self.fetch_all(limit=2, start_date=day.isoformat(), end_date=day.isoformat())
+        self.assertEqual(ids, [t.test_id for t in self.tests if timezone.localtime(t.taken_at).date() == day])
+        ids, _ = self.fetch_all(limit=2, section=section)
+        self.assertEqual(ids, [
+            t.test_id for t in self.tests if f'{t.student.section_code}-{t.student.group_code}' == section
+        ])
+        ids, _ = self.fetch_all(limit=2, section=section, start_date=day.isoformat())
+        self.assertEqual(ids, [
+            t.test_id for t in self.tests
+            if f'{t.student.section_code}-{t.student.group_code}' == section
+            and timezone.localtime(t.taken_at).date() >= day
+        ])
+
+    def test_invalid_parameters(self):
+        for params in ({'after': 'x'}, {'limit': 'x'}, {'start_date': '2024-13-01'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('teacher_tests_api'), params).status_code, 400)
+
+    def test_students_are_denied(self):
+        self.client.force_login(self.tests[0].student.user)
+        self.assertEqual(self.client.get(reverse('teacher_tests_api')).status_code, 403)
+
+class TeacherAveragesApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', is_staff=True)
+        for number, section_code, tests in [
+            (1, 'BSIT1', [('pre', datetime(2024, 3, 1, 10), 10), ('post', datetime(2024, 3, 10, 23, 30), 20)]),
+            (2, 'BSIT2', [('pre', datetime(2024, 3, 5, 10), 30), ('post', datetime(2024, 3, 20, 10), 40)]),
+        ]:
+            student = Student.objects.create(
+                user=User.objects.create(email=f'student{number}@example.com'), student_no=f'2024-000{number}',
+                first_name='Ana', last_name='Reyes', age=18, section_code=section_code, group_code='G1',
+            )
+            for test_type, taken_at, flexibility in tests:
+                FitnessTest.objects.create(
+                    student=student, test_type=test_type, taken_at=timezone.make_aware(taken_at),
+                    flexibility_cm=flexibility,
+                )
+        cls.student = student
+
+    def setUp(self):
+        self.client.force_login(self.teacher)
+
+    def flexibility(self, **params):
+        response = self.client.get(reverse('teacher_averages_api'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['averages']['flexibility_cm']
+
+    def test_end_date_is_inclusive(self):
+        # The post-test at 23:30 on the end date counts
+        self.assertEqual(self.flexibility(end_date='2024-03-10'), {'pre': 20, 'post': 20})
+        self.assertEqual(self.flexibility(start_date='2024-03-11'), {'pre': 0, 'post': 40})
+
+    def test_section_and_test_type_filters(self):
+        self.assertEqual(self.flexibility(section='BSIT1-G1'), {'pre': 10, 'post': 20})
+        self.assertEqual(self.flexibility(test_type='pre'), {'pre': 20, 'post': 0})
+        self.assertEqual(self.flexibility(section='BSIT2-G1', test_type='post'), {'pre': 0, 'post': 40})
+
+    def test_invalid_parameters(self):
+        for params in ({'start_date': 'March'}, {'end_date': '2024-02-30'}, {'test_type': 'mid'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('teacher_averages_api'), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+
+    def test_students_are_denied(self):
+        self.client.force_login(self.student.user)
+        self.assertEqual(self.client.get(reverse('teacher_averages_api')).status_code, 403)
+
+class SectionMetricAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_trakfit', students=8, tests_per_student=3, sections=2, verbosity=0)
+
+    def test_signals_keep_aggregates_in_sync(self):
+        test = FitnessTest.objects.filter(test_type='post').order_by('-taken_at').first()
+        test.weight_kg += 5
+        test.save()
+        student = Student.objects.exclude(pk=test.student_id).first()
+        student.section_code = 'SEC-99'
+        student.save()
+        FitnessTest.objects.filter(test_type='post').order_by('-taken_at').last().delete()
+        Student.objects.last().user.delete()
+
+        call_command('rebuild_aggregates', check=True, verbosity=0)
+
+    def test_failed_edit_leaves_test_and_aggregates_unchanged(self):
+        test = FitnessTest.objects.select_related('student__user').filter(test_type='post').first()
+        self.client.force_login(test.student.user)
+        submission = {
+            'height_cm': test.height_cm, 'weight_kg': test.weight_kg + 5, 'vo2_distance_m': test.vo2_distance_m,
+            'flexibility_cm': test.flexibility_cm, 'strength_reps': test.strength_reps, 'agility_sec': test.agility_sec,
+            'speed_sec': test.speed_sec, 'endurance_time': test.get_endurance_display(),
+        }
+        # The edit and its aggregate deltas are saved in one transaction
+        with mock.patch('trakfit_app.signals.invalidate_dashboard_section', side_effect=RuntimeError('cache down')):
+            self.client.post(reverse('update-test', args=[test.test_id]), submission)
+        self.assertEqual(FitnessTest.objects.get(pk=test.pk).weight_kg, test.weight_kg)
+        call_command('rebuild_aggregates', check=True, verbosity=0)
+
+        self.client.post(reverse('update-test', args=[test.test_id]), submission)
+        self.assertEqual(FitnessTest.objects.get(pk=test.pk).weight_kg, test.weight_kg + 5)
+        call_command('rebuild_aggregates', check=True, verbosity=0)
+
+    def test_admin_is_read_only(self):
+        self.client.force_login(User.objects.create_superuser(email='admin@example.com', password='correct-horse-9'))
+        row = SectionMetricAggregate.objects.first()
+        change_url = reverse('admin:trakfit_app_sectionmetricaggregate_change', args=[row.pk])
+        self.assertEqual(self.client.get(reverse('admin:trakfit_app_sectionmetricaggregate_add')).status_code, 403)
+        self.assertEqual(self.client.post(change_url, {'total': 0}).status_code, 403)
+        self.assertEqual(self.client.get(reverse('admin:trakfit_app_sectionmetricaggregate_delete', args=[row.pk])).status_code, 403)
+        self.assertNotContains(self.client.get(change_url), 'name="total"')
+        self.assertEqual(SectionMetricAggregate.objects.get(pk=row.pk).total, row.total)
+
+    def test_rebuild_repairs_drift(self):
+        SectionMetricAggregate.objects.filter(metric='bmi').update(total=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_aggregates', check=True, verbosity=0)
+
+        call_command('rebuild_aggregates', verbosity=0)
+        call_command('rebuild_aggregates', check=True, verbosity=0)
+
+
+class RosterImportTests(TestCase):
+    HEADER = (
+        'student_no,first_name,last_name,birthday,gender,section_code,group_code,email,'
+        'test_type,taken_at,height_cm,weight_kg,vo2_distance_m,flexibility_cm,strength_reps,'
+        'agility_sec,speed_sec,endurance_time\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', is_staff=True)
+
+    def upload(self, body):
+        return self.client.post(reverse('import_roster'), {
+            'file': SimpleUploadedFile('roster.csv', (self.HEADER + body).encode(), content_type='text/csv'),
+        })
+
+    def test_imports_rows_and_reports_errors(self):
+        self.client.force_login(self.teacher)
+        response = self.upload(
+            '2024-001,Ana,Cruz,2005-03-01,Female,BSIT-1A,G1,ana@example.com,pre,2026-01-05,160,50,2000,10,20,12,7,12:30\n'
+            '2024-001,,,,,,,,post,2026-02-05,160,49,2100,12,22,11.5,6.8,12:00\n'
+            '2024-001,,,,,,,,pre,,160,50,2000,10,20,12,7,12:30\n'
+            '2024-002,Ben,Reyes,not-a-date,Male,BSIT-1A,G1,ben@example.com,,,,,,,,,,\n'
+            '2024-003,,,,,,,,post,,300,50,2000,10,20,12,7,12:30\n'
+        )
+        data = response.json()
+        self.assertEqual((data['students_created'], data['tests_created']), (1, 2))
+        self.assertEqual([error['row'] for error in data['errors']], [4, 5, 6])
+
+        student = Student.objects.get(student_no='2024-001')
+        self.assertEqual(student.updates.count(), 3)
+        self.assertEqual(StudentFitnessSnapshot.objects.for_student(student).latest_post.weight_kg, 49)
+        call_command('rebuild_aggregates', check=True, verbosity=0)
+
+    @override_settings(TRAKFIT_HASH_WORKERS=3)
+    def test_hashes_with_the_configured_workers(self):
+        self.client.force_login(self.teacher)
+        with mock.patch('trakfit_app.importer.make_passwords', side_effect=lambda passwords, workers: [
+            'unusable' for _ in passwords
+        ]) as make_passwords:
+            self.upload('2024-001,Ana,Cruz,2005-03-01,Female,BSIT-1A,G1,ana@example.com,,,,,,,,,,\n')
+        self.assertEqual(make_passwords.call_args.kwargs['workers'], 3)
+
+    def test_staff_only(self):
+        call_command('seed_trakfit', students=1, verbosity=0)
+        self.client.force_login(Student.objects.get().user)
+        self.assertEqual(self.upload('').status_code, 403)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_trakfit', students=5, tests_per_student=3, verbosity=0)
+        cls.teacher = User.objects.create(email='teacher@example.com', is_staff=True)
+
+    def test_streams_every_test_with_derived_metrics(self):
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('export_tests'))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith('test_id,student_no,'))
+        self.assertEqual(len(lines) - 1, FitnessTest.objects.count())
+
+        test = FitnessTest.objects.order_by('test_id').first()
+        row = dict(zip(lines[0].split(','), lines[1].split(',')))
+        self.assertAlmostEqual(float(row['bmi']), test.bmi, places=3)
+
+    def test_staff_only(self):
+        self.client.force_login(Student.objects.first().user)
+        self.assertEqual(self.client.get(reverse('export_tests')).status_code, 403)
+
+    def test_command_writes_to_stdout(self):
+        out = StringIO()
+        call_command('export_tests', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('test_id,student_no,'))
+        self.assertEqual(len(lines) - 1, FitnessTest.objects.count())
+
+    def test_formula_cells_are_quoted(self):
+        Student.objects.filter(pk=FitnessTest.objects.order_by('test_id').first().student_id).update(
+            first_name='=HYPERLINK("http://example.com")', last_name='@SUM(A1)',
+        )
+        out = StringIO()
+        call_command('export_tests', stdout=out)
+        row = out.getvalue().splitlines()[1]
+        self.assertIn("'=HYPERLINK", row)
+        self.assertIn("'@SUM(A1)", row)
+        self.assertNotIn(',=', row)
+
+    def test_tab_and_carriage_return_cells_are_quoted(self):
+        import csv
+
+        test = FitnessTest.objects.order_by('test_id').first()
+        Student.objects.filter(pk=test.student_id).update(first_name='\t=1+1', last_name='\r=2+2')
+        out = StringIO()
+        call_command('export_tests', stdout=out)
+        header, row = list(csv.reader(StringIO(out.getvalue())))[:2]
+        row = dict(zip(header, row))
+        self.assertEqual(row['first_name'], "'\t=1+1")
+        self.assertEqual(row['last_name'], "'\r=2+2")
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_trakfit', students=10, tests_per_student=3, verbosity=0)
+        FitnessTest.objects.create(student=Student.objects.first(), test_type='post', endurance_minutes=0, endurance_seconds=40)
+        cls.tests = list(FitnessTest.objects.all())
+
+    def check_matches_database(self):
+        derived = metrics.derive(metrics.test_columns(self.tests))
+        for index, test in enumerate(self.tests):
+            self.assertEqual(derived['bmi'][index], test.bmi)
+            self.assertEqual(derived['vo2_max'][index], test.vo2_max)
+            self.assertEqual(derived['endurance_display'][index], test.get_endurance_display())
+        return derived
+
+    def test_batch_values_match_generated_columns(self):
+        derived = self.check_matches_database()
+        with mock.patch.object(metrics, 'np', None):
+            self.assertEqual(self.check_matches_database(), derived)
+
+    def test_improvements(self):
+        pre = {field: [None] * 2 for field in metrics.TEST_FIELDS}
+        post = {field: [None] * 2 for field in metrics.TEST_FIELDS}
+        pre.update(agility_sec=[Decimal('12.00'), None], strength_reps=[20, 0], endurance_minutes=[10, 0], endurance_seconds=[0, 30])
+        post.update(agility_sec=[Decimal('11.40'), 11], strength_reps=[25, 5], endurance_minutes=[11, 12], endurance_seconds=[0, 0])
+        for numpy in (metrics.np, None):
+            with mock.patch.object(metrics, 'np', numpy):
+                result = metrics.improvements(pre, post)
+                self.assertEqual(result['agility'], [5.0, None])
+                self.assertEqual(result['strength'], [25.0, None])
+                self.assertEqual(result['endurance'], [10.0, None])
+                self.assertEqual(metrics.bmi_category([18.4, 18.5, 30, None]), ['Underweight', 'Normal', 'Obese', 'N/A'])
+
+    def test_bmi_range_filter(self):
+        self.client.force_login(User.objects.create(email='teacher@example.com', is_staff=True))
+        response = self.client.get(reverse('teacher_tests_api'), {'bmi_min': 25, 'bmi_max': 30, 'limit': 2000})
+        ids = [record['test_id'] for record in json.loads(b''.join(response.streaming_content))['results']]
+        expected = [test.test_id for test in self.tests if test.bmi is not None and 25 <= test.bmi < 30]
+        self.assertEqual(ids, expected)
+        self.assertEqual(self.client.get(reverse('teacher_tests_api'), {'bmi_min': 'x'}).status_code, 400)
+
+
+class PostTestCounterTests(TestCase):
+    def test_post_tests_are_numbered_from_the_counter(self):
+        call_command('seed_trakfit', students=1, tests_per_student=3, verbosity=0)
+        student = Student.objects.get()
+        self.assertEqual(student.last_post_test_no, 2)
+
+        test = FitnessTest.objects.create(student=student, test_type='post', taken_at=student.created_at)
+        student.refresh_from_db()
+        self.assertEqual(student.last_post_test_no, 3)
+        self.assertTrue(student.updates.filter(body__endswith='post test #3').exists())
+
+        test.delete()
+        test = FitnessTest.objects.create(student=student, test_type='post')
+        self.assertEqual(test.sequence_no, 4)
+        self.assertTrue(student.updates.filter(body__endswith='post test #4').exists())
+        self.assertEqual(
+            list(student.fitness_tests.order_by('test_id').values_list('test_type', 'sequence_no')),
+            [('pre', 1), ('post', 1), ('post', 2), ('post', 4)],
+        )
+
+        test.save()
+        self.assertTrue(student.updates.filter(body__endswith='updated her post test #4').exists()
+                        or student.updates.filter(body__endswith='updated his post test #4').exists())
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            FitnessTest.objects.create(student=student, test_type='post', sequence_no=1)
+
+    def test_pre_tests_are_numbered_from_the_counter(self):
+        call_command('seed_trakfit', students=1, tests_per_student=2, verbosity=0)
+        student = Student.objects.get()
+        self.assertEqual(student.last_pre_test_no, 1)
+
+        second = FitnessTest.objects.create(student=student, test_type='pre')
+        self.assertEqual(second.sequence_no, 2)
+        student.fitness_tests.get(test_type='pre', sequence_no=1).delete()
+        third = record_test(student, 'pre', RecordTestTests.SUBMISSION, '12:30')
+        self.assertEqual(third.sequence_no, 3)
+        self.assertEqual(student.last_pre_test_no, 3)
+        self.assertEqual(
+            list(student.fitness_tests.filter(test_type='pre').order_by('sequence_no').values_list('sequence_no', flat=True)),
+            [2, 3],
+        )
+
+
+class RecordTestTests(TestCase):
+    SUBMISSION = {
+        'height_cm': '165.0', 'weight_kg': '60.5', 'vo2_distance_m': '2400', 'flexibility_cm': '20.0',
+        'strength_reps': '30', 'agility_sec': '12.50', 'speed_sec': '7.20', 'endurance_time': '12:30',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_trakfit', students=1, tests_per_student=2, verbosity=0)
+        cls.student = Student.objects.select_related('user').get()
+
+    def writes(self, queries):
+        """Counter of INSERT/UPDATE/DELETE statements per table in captured queries."""
+        statement = re.compile(r'(?:INSERT INTO|UPDATE|DELETE FROM) "?(\w+)')
+        return Counter(match[1] for match in (statement.match(query['sql']) for query in queries) if match)
+
+    def test_post_test_submission_writes_each_table_once(self):
+        self.client.force_login(self.student.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('student-post-test'), self.SUBMISSION)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.writes(queries), Counter({
+            'fitness_tests': 1, 'students': 1, 'updates': 1,
+            'student_fitness_snapshots': 1, 'section_metric_aggregates': 1,
+            # The session's copy of the student (see middleware.py)
+            'django_session': 1,
+        }))
+
+        test = self.student.fitness_tests.get(test_type='post', sequence_no=2)
+        self.assertEqual((test.endurance_minutes, test.endurance_seconds), (12, 30))
+        self.assertEqual(list(self.student.updates.filter(body__contains='post test #2').values_list('body', flat=True)),
+                         [f'{self.student.first_name} {self.student.last_name} created {signals.student_pronoun(self.student)} post test #2'])
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.last_post_test_no, 2)
+        self.assertEqual(StudentFitnessSnapshot.objects.get(student=self.student).latest_post, test)
+
+    def test_malformed_endurance_writes_nothing(self):
+        before = FitnessTest.objects.count()
+        with self.assertRaises(ValidationError):
+            record_test(self.student, 'post', self.SUBMISSION, '1x:30')
+        self.assertEqual(FitnessTest.objects.count(), before)
+        self.assertEqual(Student.objects.get().last_post_test_no, 1)
+
+
+@override_settings(TRAKFIT_AUDIT_ASYNC=True, TRAKFIT_AUDIT_FLUSH_INTERVAL=60)
+class AuditWriterTests(TransactionTestCase):
+    def test_entries_are_written_in_one_batch_after_commit(self):
+        call_command('seed_trakfit', students=3, tests_per_student=1, verbosity=0)
+        students = list(Student.objects.all())
+        before = audit.writer.pending()
+        with transaction.atomic():
+            for student in students:
+                audit.record(student, 'checked')
+            self.assertEqual(audit.writer.pending(), before)
+
+        # Queued on commit; the writer thread holds the batch until the flush interval ends
+        self.assertEqual(audit.writer.pending(), before + 3)
+        audit.flush()
+        self.assertEqual(audit.writer.pending(), 0)
+        self.assertEqual(updates.objects.filter(body='checked').count(), 3)
+
+    @override_settings(TRAKFIT_AUDIT_FLUSH_INTERVAL=0.05)
+    def test_writer_thread_flushes_after_the_interval(self):
+        call_command('seed_trakfit', students=2, tests_per_student=0, verbosity=0)
+        with transaction.atomic():
+            for student in Student.objects.all():
+                audit.record(student, 'flushed')
+
+        # No flush(): the writer thread writes the batch once the interval ends
+        deadline = time.monotonic() + 10
+        while audit.writer.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(audit.writer.pending(), 0)
+        self.assertEqual(updates.objects.filter(body='flushed').count(), 2)
+
+
+class StudentSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_trakfit', students=12, tests_per_student=1, sections=3, verbosity=0)
+        cls.teacher = User.objects.create(email='teacher@example.com', is_staff=True)
+
+    def search(self, **params):
+        return self.client.get(reverse('student_search_api'), params).json()
+
+    def pages(self, q):
+        seen, cursor = [], ''
+        while True:
+            data = self.search(q=q, after=cursor, limit=2)
+            seen += [student['student_no'] for student in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                return seen
+
+    def test_keyset_pages_cover_every_student(self):
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.pages(''), list(Student.objects.order_by('student_no').values_list('student_no', flat=True)))
+
+    def test_ranked_pages_cover_every_match(self):
+        self.client.force_login(self.teacher)
+        expected = Student.objects.filter(section_code='SEC-02').values_list('student_no', flat=True)
+        seen = self.pages('sec-02')
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(sorted(seen), sorted(expected))
+
+    def test_every_word_must_match(self):
+        self.client.force_login(self.teacher)
+        student = Student.objects.order_by('student_no').last()
+        data = self.search(q=f'{student.first_name.lower()} {student.last_name}')
+        self.assertEqual([result['student_no'] for result in data['results']], [student.student_no])
+        self.assertEqual(data['results'][0]['email'], student.user.email)
+
+    def test_staff_only(self):
+        self.client.force_login(Student.objects.first().user)
+        self.assertEqual(self.client.get(reverse('student_search_api')).status_code, 403)
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_trakfit', students=4, tests_per_student=2, sections=2, verbosity=0)
+        cls.teacher = User.objects.create(email='teacher@example.com', is_staff=True)
+
+    def setUp(self):
+        self.student = Student.objects.select_related('user').order_by('student_no').first()
+
+    def found(self, query, kind=None):
+        return [(match['kind'], match['object_id']) for match in search.search(query, kind=kind)]
+
+    def test_index_follows_student_and_email_changes(self):
+        self.assertIn((search.STUDENT, self.student.pk), self.found(self.student.student_no))
+        self.student.last_name = 'Villanueva'
+        self.student.save()
+        self.assertEqual(self.found('villa'), [(search.STUDENT, self.student.pk)])
+
+        self.student.user.email = 'renamed@school.example'
+        self.student.user.save()
+        self.assertEqual(self.found('renamed'), [(search.STUDENT, self.student.pk)])
+        self.student.user.save(update_fields=['last_login'])
+        self.assertEqual(self.found('renamed'), [(search.STUDENT, self.student.pk)])
+
+        self.student.user.delete()
+        self.assertEqual(self.found('villa'), [])
+
+    def test_index_follows_remarks(self):
+        test = self.student.fitness_tests.order_by('taken_at').first()
+        test.remarks = 'Great improvement on the shuttle run'
+        test.save()
+        self.assertEqual(self.found('shuttle', kind=search.REMARK), [(search.REMARK, test.pk)])
+        self.assertEqual(self.found('shuttle', kind=search.STUDENT), [])
+
+        test.remarks = ''
+        test.save()
+        self.assertEqual(self.found('shuttle'), [])
+
+    def test_rebuild_matches_signals(self):
+        test = self.student.fitness_tests.order_by('taken_at').first()
+        test.remarks = 'Needs stretching'
+        test.save()
+        before = sorted(self.found('seed')) + self.found('stretching')
+        self.assertEqual(search.rebuild(), Student.objects.count() + 1)
+        self.assertEqual(sorted(self.found('seed')) + self.found('stretching'), before)
+
+    def test_best_match_ranks_first(self):
+        other = Student.objects.exclude(pk=self.student.pk).first()
+        self.student.first_name = other.first_name = 'Lorenzo'
+        other.save()
+        self.student.last_name = 'Lorenzo'
+        self.student.save()
+        self.assertEqual(self.found('lorenzo')[0], (search.STUDENT, self.student.pk))
+
+    def test_search_api_returns_remarks_with_their_test(self):
+        test = self.student.fitness_tests.order_by('taken_at').first()
+        test.remarks = 'Sprained ankle, retake agility'
+        test.save()
+        self.client.force_login(self.teacher)
+        data = self.client.get(reverse('search_api'), {'q': 'sprain agil'}).json()
+        self.assertEqual(len(data['results']), 1)
+        result = data['results'][0]
+        self.assertEqual((result['kind'], result['test_id'], result['student_no']), ('remark', test.pk, self.student.student_no))
+        self.assertIn('[Sprained]', result['snippet'])
+
+        self.client.force_login(self.student.user)
+        self.assertEqual(self.client.get(reverse('search_api'), {'q': 'sprain'}).status_code, 403)
+
+
+class DatabaseTuningTests(TestCase):
+    def test_sqlite_connections_get_the_pragmas(self):
+        from django.conf import settings
+
+        if connection.vendor != 'sqlite' or not settings.TRAKFIT_SQLITE_TUNING:
+            self.skipTest('SQLite tuning is off')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.TRAKFIT_SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+class SessionStudentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='juan@example.com', password='correct-horse-9')
+        cls.student = Student.objects.create(
+            user=cls.user, student_no='2024-0001', first_name='Juan', last_name='Cruz', age=18,
+            section_code='BSIT1', group_code='G1',
+        )
+
+    def student_queries(self, url):
+        """Response and number of queries reading the students table."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, sum(query['sql'].startswith('SELECT') and 'FROM "students"' in query['sql'] for query in queries)
+
+    def test_failed_login_hashes_once(self):
+        from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+        with mock.patch.object(PBKDF2PasswordHasher, 'verify', autospec=True, side_effect=PBKDF2PasswordHasher.verify) as verify:
+            response = self.client.post(reverse('login'), {'email': 'juan@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(verify.call_count, 1)
+
+    def test_student_is_read_once_per_session_until_it_changes(self):
+        response = self.client.post(reverse('login'), {'email': 'juan@example.com', 'password': 'correct-horse-9'})
+        self.assertRedirects(response, reverse('student-dashboard'), fetch_redirect_response=False)
+
+        response, queries = self.student_queries(reverse('student-profile'))
+        self.assertEqual(queries, 0)
+        self.assertEqual(response.context['student'].first_name, 'Juan')
+
+        self.student.first_name = 'Juanito'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.save()
+        response, queries = self.student_queries(reverse('student-profile'))
+        self.assertEqual(queries, 1)
+        self.assertEqual(response.context['student'].first_name, 'Juanito')
+
+        # A new test touches the student's timestamps
+        with self.captureOnCommitCallbacks(execute=True):
+            FitnessTest.objects.create(student=self.student, test_type='pre')
+        response = self.client.get(reverse('student-profile'))
+        self.assertEqual(response.context['student'].last_data_update_at, Student.objects.get().last_data_update_at)
+
+    def test_student_version_changes_after_commit(self):
+        from .middleware import student_version
+
+        version = student_version(self.student.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.save()
+            # A request during the write still sees the old version
+            self.assertEqual(student_version(self.student.pk), version)
+        self.assertNotEqual(student_version(self.student.pk), version)
+
+    def test_teachers_have_no_student(self):
+        teacher = User.objects.create_user(email='teacher@example.com', password='correct-horse-9', is_staff=True)
+        self.client.force_login(teacher)
+        self.client.get(reverse('teacher_tests_api'))
+        response, queries = self.student_queries(reverse('teacher_tests_api'))
+        self.assertEqual(queries, 0)
+        self.assertIsNone(response.wsgi_request.student)
+
+
+class PasswordHashingTests(TestCase):
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_make_passwords_in_a_process_pool(self):
+        from django.contrib.auth.hashers import check_password
+        from .hashers import CHUNK_SIZE, make_passwords
+
+        passwords = [f'password-{i}' for i in range(CHUNK_SIZE * 3)]
+        hashed = make_passwords(passwords, workers=2)
+        self.assertEqual(len(hashed), len(passwords))
+        self.assertTrue(all(check_password(password, encoded) for password, encoded in zip(passwords, hashed)))
+
+    def test_login_upgrades_hashes_of_another_profile(self):
+        user = User.objects.create_user(email='juan@example.com')
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            user.set_password('correct-horse-9')
+            user.save()
+        Student.objects.create(user=user, student_no='2024-0001', first_name='Juan', last_name='Cruz', age=18,
+                               section_code='BSIT1', group_code='G1')
+
+        with override_settings(PASSWORD_HASHERS=[
+            'trakfit_app.hashers.TunedScryptPasswordHasher', 'django.contrib.auth.hashers.MD5PasswordHasher',
+        ]):
+            response = self.client.post(reverse('login'), {'email': 'juan@example.com', 'password': 'correct-horse-9'})
+            self.assertEqual(response.status_code, 302)
+            user.refresh_from_db()
+            self.assertTrue(user.password.startswith('scrypt$16384$'))
+            self.assertTrue(user.check_password('correct-horse-9'))
+
+
+class SessionProfileTests(TestCase):
+    ENGINES = [
+        'django.contrib.sessions.backends.db',
+        'django.contrib.sessions.backends.cached_db',
+        'django.contrib.sessions.backends.cache',
+        'django.contrib.sessions.backends.signed_cookies',
+    ]
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'trakfit-tests'},
+        'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'trakfit-tests-sessions'},
+    }
+
+    def register(self, number):
+        return self.client.post(reverse('register'), {
+            'student_no': f'2024-{number:04d}', 'first_name': 'Ana', 'last_name': 'Reyes', 'birthday': '2006-05-01',
+            'section_code': 'BSIT1', 'group_code': 'G1', 'email': f'ana{number}@example.com', 'gender': 'Female',
+            'password': 'correct-horse-9', 'confirm_password': 'correct-horse-9',
+        })
+
+    def test_registration_flags_work_with_every_engine(self):
+        for number, engine in enumerate(self.ENGINES, start=1):
+            with self.subTest(engine=engine), override_settings(SESSION_ENGINE=engine, CACHES=self.CACHES):
+                self.client = self.client_class()
+                self.assertRedirects(self.register(number), reverse('pre-test-register'), fetch_redirect_response=False)
+                self.assertEqual(self.client.session['new_user_id'], User.objects.get(email=f'ana{number}@example.com').pk)
+                self.assertEqual(self.client.get(reverse('pre-test-register')).status_code, 200)
+
+                response = self.client.post(reverse('pre-test-register'), {'skip_pretest': 'true'})
+                self.assertRedirects(response, reverse('student-dashboard'), fetch_redirect_response=False)
+                self.assertNotIn('registration_complete', self.client.session)
+                self.assertRedirects(self.client.get(reverse('pre-test-register')), reverse('login'), fetch_redirect_response=False)
+                self.assertEqual(self.client.get(reverse('student-dashboard')).status_code, 200)
+
+
+
+class TemplateFragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(email='teacher@example.com', is_staff=True)
+        call_command('seed_trakfit', students=4, tests_per_student=2, sections=2, verbosity=0)
+        cls.student = Student.objects.order_by('pk').first()
+
+    def setUp(self):
+        cache.clear()
+        caches['template_fragments'].clear()
+        self.client.force_login(self.teacher)
+
+    def test_dashboard_fragments_follow_the_data_version(self):
+        first = self.client.get(reverse('teacher_dashboard'))
+        self.assertEqual(self.client.get(reverse('teacher_dashboard')).content, first.content)
+
+        test = FitnessTest.objects.filter(test_type='post').first()
+        test.weight_kg += 10
+        with self.captureOnCommitCallbacks(execute=True):
+            test.save()
+        response = self.client.get(reverse('teacher_dashboard'))
+        self.assertNotEqual(response.context['data_version'], first.context['data_version'])
+        # The cached script is re-rendered with the new averages
+        self.assertContains(response, f"const sectionAverages = {response.context['section_averages_json']};")
+        self.assertNotEqual(response.context['section_averages_json'], first.context['section_averages_json'])
+
+    def test_profile_fragments_follow_the_student_version(self):
+        url = reverse('student_profile', args=[self.student.student_no])
+        self.client.get(url)
+        test = self.student.fitness_tests.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('add_remark'), {'test_id': test.test_id, 'remark': 'Great sprint'})
+        self.assertTrue(response.json()['success'])
+        self.assertContains(self.client.get(url), 'Great sprint')
+
+    def test_csrf_token_is_not_cached(self):
+        url = reverse('student_profile', args=[self.student.student_no])
+        tokens = set()
+        for _ in range(2):
+            self.client = self.client_class()
+            self.client.force_login(self.teacher)
+            response = self.client.get(url)
+            self.assertContains(response, 'name="csrfmiddlewaretoken"', count=1)
+            tokens.add(str(response.context['csrf_token']))
+        self.assertEqual(len(tokens), 2)
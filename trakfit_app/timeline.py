@@ -0,0 +1,86 @@
+from . import metrics
+
+
+def derive_tests(tests):
+    """{test_id: derived values} of FitnessTest instances, computed in one batch (see metrics.derive)."""
+    tests = [test for test in tests if test is not None]
+    derived = metrics.derive(metrics.test_columns(tests))
+    return {
+        test.test_id: {name: column[index] for name, column in derived.items()}
+        for index, test in enumerate(tests)
+    }
+
+
+def serialize_test(test, precision=1, derived=None):
+    """Serialize the measured and derived values of a fitness test for JSON/template use."""
+    if derived is None:
+        derived = derive_tests([test])[test.test_id]
+    bmi = derived['bmi']
+    vo2_max = derived['vo2_max']
+    return {
+        'test_id': test.test_id,
+        'height_cm': float(test.height_cm) if test.height_cm else None,
+        'weight_kg': float(test.weight_kg) if test.weight_kg else None,
+        'bmi': round(bmi, precision) if bmi else None,
+        'vo2_distance_m': float(test.vo2_distance_m) if test.vo2_distance_m else None,
+        'vo2_max': round(vo2_max, precision) if vo2_max else None,
+        'flexibility_cm': float(test.flexibility_cm) if test.flexibility_cm else None,
+        'strength_reps': test.strength_reps,
+        'agility_sec': float(test.agility_sec) if test.agility_sec else None,
+        'speed_sec': float(test.speed_sec) if test.speed_sec else None,
+        'endurance_display': derived['endurance_display'],
+    }
+
+
+class TestTimeline:
+    """
+    A student's tests ordered most recent first, each paired with the test taken before it.
+
+    The ordered list is walked once to link every test to its predecessor, the
+    pre-test baseline is serialized a single time, and serialized tests are
+    memoized so looking up a comparison is O(1) per test. Derived values (BMI,
+    VO2 max, ...) of every test are computed once, in a batch.
+    """
+
+    def __init__(self, tests, pre_test=None, precision=1):
+        self.tests = list(tests)
+        self.precision = precision
+        self._previous = {}
+        for current, previous in zip(self.tests, self.tests[1:] + [None]):
+            self._previous[current.test_id] = previous
+        self._serialized = {}
+        self._derived = derive_tests(self.tests + [pre_test])
+        self.pre_test = pre_test
+        self.pre_test_data = self.serialize(pre_test) if pre_test else None
+
+    def __iter__(self):
+        """Yield (test, previous_test) pairs, most recent first."""
+        for test in self.tests:
+            yield test, self._previous[test.test_id]
+
+    def __len__(self):
+        return len(self.tests)
+
+    @property
+    def latest(self):
+        return self.tests[0] if self.tests else None
+
+    def previous(self, test):
+        """Return the test taken before `test`, or None if it is the first one."""
+        return self._previous.get(test.test_id)
+
+    def derived(self, test):
+        """Derived values of one of the timeline's tests (or its pre-test)."""
+        return self._derived[test.test_id]
+
+    def serialize(self, test):
+        """Serialize a test once and reuse the result on later lookups."""
+        if test is None:
+            return None
+        if test.test_id not in self._serialized:
+            self._serialized[test.test_id] = serialize_test(test, self.precision, self._derived.get(test.test_id))
+        return self._serialized[test.test_id]
+
+    def previous_data(self, test):
+        """Serialized predecessor of `test`, or None."""
+        return self.serialize(self.previous(test))
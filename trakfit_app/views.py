@@ -2,11 +2,17 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from datetime import datetime
 from django.utils import timezone
-from .models import User, Student, FitnessTest
+from .models import User, Student, FitnessTest, StudentFitnessSnapshot
 from .forms import FitnessTestForm
+from .aggregates import get_dashboard_aggregates, dashboard_version, compute_range_averages, filter_date_range, filter_section
+from .timeline import TestTimeline
+from .middleware import remember_student, student_version
+from .recording import record_test
+from . import metrics
+from .profiling import timer
 
 
 def login(request):
@@ -19,28 +25,23 @@ def login(request):
             return render(request, 'login.html')
 
 
-        # Authenticate user (primary) - ModelBackend expects `username` param
+        # Authenticate user - ModelBackend expects `username` param. This is the only
+        # password hash of a login, successful or not.
         user = authenticate(request, username=email, password=password)
 
-        # Fallback: if authenticate returns None, try direct lookup + password check
-        # This helps when a custom auth backend is in use or the backend expects a different kwarg.
-        if user is None:
-            try:
-                potential = User.objects.get(email=email)
-                if potential.check_password(password):
-                    user = potential
-            except User.DoesNotExist:
-                user = None
-
         if user is not None:
             # Allow admins (superuser or staff) to access teacher dashboard
             if user.is_superuser or user.is_staff:
                 auth_login(request, user)
+                remember_student(request, None)
                 return redirect('teacher_dashboard')
             # Check if user has a student profile (student-only login)
-            if hasattr(user, 'student_profile'):
+            student = Student.objects.filter(user=user).first()
+            if student is not None:
                 auth_login(request, user)
-                messages.success(request, f'Welcome back, {user.student_profile.first_name}!')
+                # Cached in the session for the following requests (see middleware.py)
+                remember_student(request, student)
+                messages.success(request, f'Welcome back, {student.first_name}!')
                 return redirect('student-dashboard')
             else:
                 messages.error(request, 'Only students can login through this portal.')
@@ -137,6 +138,7 @@ def register(request):
             
             # Auto-login the user
             auth_login(request, user)
+            remember_student(request, student)
             
             # Store registration data in session for pre-test step
             request.session['registration_complete'] = True
@@ -173,7 +175,7 @@ def pre_test_register(request):
             return redirect('student-dashboard')
         
         # User submitted pre-test data
-        student = request.user.student_profile
+        student = request.student
         
         try:
             # Extract and validate pre-test fields
@@ -192,23 +194,16 @@ def pre_test_register(request):
                 messages.error(request, 'All fields are required for pre-test submission.')
                 return render(request, 'student/pre_test_on_register.html')
             
-            # Create fitness test
-            fitness_test = FitnessTest.objects.create(
-                student=student,
-                test_type='pre',
-                height_cm=height_cm,
-                weight_kg=weight_kg,
-                vo2_distance_m=vo2_distance_m,
-                flexibility_cm=flexibility_cm,
-                strength_reps=strength_reps,
-                agility_sec=agility_sec,
-                speed_sec=speed_sec,
-                taken_at=timezone.now()
-            )
-            
-            # Parse and set endurance time
-            fitness_test.set_endurance_from_string(endurance_time)
-            fitness_test.save()
+            # Save the complete test (endurance included) in one transaction
+            record_test(student, 'pre', {
+                'height_cm': height_cm,
+                'weight_kg': weight_kg,
+                'vo2_distance_m': vo2_distance_m,
+                'flexibility_cm': flexibility_cm,
+                'strength_reps': strength_reps,
+                'agility_sec': agility_sec,
+                'speed_sec': speed_sec,
+            }, endurance_time)
             
             # Clear registration session
             request.session.pop('registration_complete', None)
@@ -238,98 +233,75 @@ def student_dashboard(request):
     from datetime import datetime
     import json
     
-    student = request.user.student_profile
+    student = request.student
     
-    # Get latest test for BMI data
-    latest_test = student.fitness_tests.order_by('-taken_at').first()
+    # Latest pre-test and post-test come from the denormalized snapshot
+    snapshot = StudentFitnessSnapshot.objects.for_student(student)
+    pre_test = snapshot.latest_pre
+    post_test = snapshot.latest_post
     
-    # Get pre-test (only one per student)
-    pre_test = student.fitness_tests.filter(test_type='pre').order_by('-taken_at').first()
+    # Get all tests for the student (most recent first), each paired with its previous test
+    remarks_data = []
+    timeline = TestTimeline(student.fitness_tests.all().order_by('-taken_at'), precision=2)
     
-    # Get latest post-test
-    post_test = student.fitness_tests.filter(test_type='post').order_by('-taken_at').first()
+    # Get latest test for BMI data
+    latest_test = timeline.latest
     
     # Add BMI status if latest test exists
-    if latest_test and latest_test.bmi:
-        latest_test.bmi_status = get_bmi_status(latest_test.bmi)
-    
-    # Get all tests for the student (most recent first)
-    remarks_data = []
-    all_tests = student.fitness_tests.all().order_by('-taken_at')
+    if latest_test and timeline.derived(latest_test)['bmi']:
+        latest_test.bmi_status = timeline.derived(latest_test)['bmi_category']
     
-    # Create a list of all tests with previous test data for comparison
-    tests_list = list(all_tests)
-    for i, test in enumerate(tests_list):
-        # Find previous test (next in the list since ordered by -taken_at)
-        previous_test = tests_list[i + 1] if i + 1 < len(tests_list) else None
-        
+    for test, previous_test in timeline:
         # Build test data with previous test comparison
+        derived = timeline.derived(test)
         test_data = {
             'test_id': test.test_id,
             'test_type': test.get_test_type_display(),
             'test_type_key': test.test_type,
             'date': test.taken_at.strftime('%B %d, %Y') if test.taken_at else 'N/A',
-            'bmi': round(test.bmi, 2) if test.bmi else None,
-            'vo2_max': round(test.vo2_max, 2) if test.vo2_max else None,
+            'bmi': round(derived['bmi'], 2) if derived['bmi'] else None,
+            'vo2_max': round(derived['vo2_max'], 2) if derived['vo2_max'] else None,
             'remarks': test.remarks if test.remarks else None,
         }
         
         # Add previous test data for comparison
         if previous_test:
+            previous_data = timeline.serialize(previous_test)
             test_data['previous_test'] = {
-                'bmi': round(previous_test.bmi, 2) if previous_test.bmi else None,
-                'vo2_max': round(previous_test.vo2_max, 2) if previous_test.vo2_max else None,
+                'bmi': previous_data['bmi'],
+                'vo2_max': previous_data['vo2_max'],
             }
         else:
             test_data['previous_test'] = None
         
         remarks_data.append(test_data)
     
-    # Calculate VO2 Max trend data (last 5 tests with VO2 data)
-    vo2_tests = student.fitness_tests.exclude(vo2_distance_m__isnull=True).order_by('taken_at')[:5]
+    # Calculate VO2 Max trend data (first 5 tests with VO2 data, oldest first)
+    vo2_tests = [test for test in reversed(timeline.tests) if test.vo2_distance_m is not None][:5]
     vo2_dates = []
     vo2_values = []
     
     for test in vo2_tests:
-        if test.vo2_max:
+        vo2_max = timeline.derived(test)['vo2_max']
+        if vo2_max:
             # Format date as short month name
             date_str = test.taken_at.strftime('%b') if test.taken_at else 'N/A'
             vo2_dates.append(date_str)
-            vo2_values.append(round(test.vo2_max, 1))
+            vo2_values.append(round(vo2_max, 1))
     
     # If no VO2 data, provide default empty arrays
     if not vo2_dates:
         vo2_dates = ['No Data']
         vo2_values = [0]
     
-    # Calculate improvement percentages (if both pre and post exist)
-    improvements = {}
-    if pre_test and post_test:
-        if pre_test.flexibility_cm and post_test.flexibility_cm:
-            improvements['flexibility'] = round(
-                ((float(post_test.flexibility_cm) - float(pre_test.flexibility_cm)) / float(pre_test.flexibility_cm)) * 100, 1
-            )
-        if pre_test.strength_reps and post_test.strength_reps:
-            improvements['strength'] = round(
-                ((post_test.strength_reps - pre_test.strength_reps) / pre_test.strength_reps) * 100, 1
-            )
-        if pre_test.agility_sec and post_test.agility_sec:
-            # For agility/speed, lower is better, so reverse the calculation
-            improvements['agility'] = round(
-                ((float(pre_test.agility_sec) - float(post_test.agility_sec)) / float(pre_test.agility_sec)) * 100, 1
-            )
-        if pre_test.speed_sec and post_test.speed_sec:
-            improvements['speed'] = round(
-                ((float(pre_test.speed_sec) - float(post_test.speed_sec)) / float(pre_test.speed_sec)) * 100, 1
-            )
-        if pre_test.endurance_minutes and post_test.endurance_minutes:
-            pre_total_sec = (pre_test.endurance_minutes * 60) + (pre_test.endurance_seconds or 0)
-            post_total_sec = (post_test.endurance_minutes * 60) + (post_test.endurance_seconds or 0)
-            if pre_total_sec > 0:
-                improvements['endurance'] = round(
-                    ((post_total_sec - pre_total_sec) / pre_total_sec) * 100, 1
-                )
+    # Improvement percentages are precomputed on the snapshot
+    improvements = snapshot.improvements
     
+    with timer('serialize'):
+        remarks_json = json.dumps(remarks_data)
+        vo2_dates_json = json.dumps(vo2_dates)
+        vo2_values_json = json.dumps(vo2_values)
+
     context = {
         'student': student,
         'full_name': f"{student.first_name} {student.last_name}",
@@ -337,71 +309,40 @@ def student_dashboard(request):
         'latest_test': latest_test,
         'pre_test': pre_test,
         'post_test': post_test,
-        'remarks_json': json.dumps(remarks_data),
-        'vo2_dates_json': json.dumps(vo2_dates),
-        'vo2_values_json': json.dumps(vo2_values),
+        'remarks_json': remarks_json,
+        'vo2_dates_json': vo2_dates_json,
+        'vo2_values_json': vo2_values_json,
         'improvements': improvements,
     }
     return render(request, 'student/dashboard.html', context)
 
 @login_required
 def student_profile_view(request):
-    student = request.user.student_profile
-    latest_test = student.fitness_tests.order_by('-taken_at').first()
+    student = request.student
+    snapshot = StudentFitnessSnapshot.objects.for_student(student)
+    
+    # Get pre-test for button lock check and comparison
+    pre_test = snapshot.latest_pre
+    
+    # Only the latest test and the one before it are needed for comparison
+    timeline = TestTimeline(student.fitness_tests.all().order_by('-taken_at')[:2], pre_test=pre_test)
+    latest_test = timeline.latest
     
     # Add BMI status if latest test exists
-    if latest_test and latest_test.bmi:
-        latest_test.bmi_status = get_bmi_status(latest_test.bmi)
+    if latest_test and timeline.derived(latest_test)['bmi']:
+        latest_test.bmi_status = timeline.derived(latest_test)['bmi_category']
     
     # Calculate test counts
     pre_test_count = student.fitness_tests.filter(test_type='pre').count()
     post_test_count = student.fitness_tests.filter(test_type='post').count()
     
-    # Get pre-test for button lock check and comparison
-    pre_test = student.fitness_tests.filter(test_type='pre').order_by('-taken_at').first()
-    
     # Prepare comparison data for latest test
     pre_test_data = None
     previous_test_data = None
     
     if latest_test:
-        # Build pre-test data
-        if pre_test:
-            pre_test_data = {
-                'height_cm': float(pre_test.height_cm) if pre_test.height_cm else None,
-                'weight_kg': float(pre_test.weight_kg) if pre_test.weight_kg else None,
-                'bmi': round(pre_test.bmi, 1) if pre_test.bmi else None,
-                'vo2_distance_m': float(pre_test.vo2_distance_m) if pre_test.vo2_distance_m else None,
-                'vo2_max': round(pre_test.vo2_max, 1) if pre_test.vo2_max else None,
-                'flexibility_cm': float(pre_test.flexibility_cm) if pre_test.flexibility_cm else None,
-                'strength_reps': pre_test.strength_reps,
-                'agility_sec': float(pre_test.agility_sec) if pre_test.agility_sec else None,
-                'speed_sec': float(pre_test.speed_sec) if pre_test.speed_sec else None,
-                'endurance_display': pre_test.get_endurance_display(),
-            }
-        
-        # Get all tests ordered by date to find previous test
-        all_tests_ordered = list(student.fitness_tests.all().order_by('-taken_at'))
-        
-        # Find previous test (the one before latest_test)
-        try:
-            current_test_index = next(i for i, t in enumerate(all_tests_ordered) if t.test_id == latest_test.test_id)
-            if current_test_index + 1 < len(all_tests_ordered):
-                previous_test = all_tests_ordered[current_test_index + 1]
-                previous_test_data = {
-                    'height_cm': float(previous_test.height_cm) if previous_test.height_cm else None,
-                    'weight_kg': float(previous_test.weight_kg) if previous_test.weight_kg else None,
-                    'bmi': round(previous_test.bmi, 1) if previous_test.bmi else None,
-                    'vo2_distance_m': float(previous_test.vo2_distance_m) if previous_test.vo2_distance_m else None,
-                    'vo2_max': round(previous_test.vo2_max, 1) if previous_test.vo2_max else None,
-                    'flexibility_cm': float(previous_test.flexibility_cm) if previous_test.flexibility_cm else None,
-                    'strength_reps': previous_test.strength_reps,
-                    'agility_sec': float(previous_test.agility_sec) if previous_test.agility_sec else None,
-                    'speed_sec': float(previous_test.speed_sec) if previous_test.speed_sec else None,
-                    'endurance_display': previous_test.get_endurance_display(),
-                }
-        except StopIteration:
-            pass
+        pre_test_data = timeline.pre_test_data
+        previous_test_data = timeline.previous_data(latest_test)
     
     context = {
         'student': student,
@@ -426,10 +367,7 @@ def student_profile_update_view(request):
 
 @login_required
 def student_pre_test_view(request):
-    from .models import FitnessTest
-    from django.utils import timezone
-    
-    student = request.user.student_profile
+    student = request.student
     form = FitnessTestForm()
     
     if request.method == 'POST':
@@ -437,24 +375,8 @@ def student_pre_test_view(request):
         
         if form.is_valid():
             try:
-                # Create fitness test with validated data
-                fitness_test = FitnessTest.objects.create(
-                    student=student,
-                    test_type='pre',
-                    height_cm=form.cleaned_data['height_cm'],
-                    weight_kg=form.cleaned_data['weight_kg'],
-                    vo2_distance_m=form.cleaned_data['vo2_distance_m'],
-                    flexibility_cm=form.cleaned_data['flexibility_cm'],
-                    strength_reps=form.cleaned_data['strength_reps'],
-                    agility_sec=form.cleaned_data['agility_sec'],
-                    speed_sec=form.cleaned_data['speed_sec'],
-                    taken_at=timezone.now()
-                )
-                
-                # Parse and set endurance time
-                endurance_time = form.cleaned_data['endurance_time']
-                fitness_test.set_endurance_from_string(endurance_time)
-                fitness_test.save()
+                # Save the complete test (endurance included) in one transaction
+                record_test(student, 'pre', form.cleaned_data, form.cleaned_data['endurance_time'])
                 
                 messages.success(request, 'Pre-test saved successfully!')
                 return redirect('student-profile')
@@ -474,11 +396,8 @@ def student_pre_test_view(request):
 
 @login_required
 def student_post_test_view(request):
-    from .models import FitnessTest
-    from django.utils import timezone
-    
-    student = request.user.student_profile
-    pre_test = student.fitness_tests.filter(test_type='pre').order_by('-taken_at').first()
+    student = request.student
+    pre_test = StudentFitnessSnapshot.objects.for_student(student).latest_pre
     form = FitnessTestForm()
     
     if request.method == 'POST':
@@ -486,24 +405,8 @@ def student_post_test_view(request):
         
         if form.is_valid():
             try:
-                # Create fitness test with validated data
-                fitness_test = FitnessTest.objects.create(
-                    student=student,
-                    test_type='post',
-                    height_cm=form.cleaned_data['height_cm'],
-                    weight_kg=form.cleaned_data['weight_kg'],
-                    vo2_distance_m=form.cleaned_data['vo2_distance_m'],
-                    flexibility_cm=form.cleaned_data['flexibility_cm'],
-                    strength_reps=form.cleaned_data['strength_reps'],
-                    agility_sec=form.cleaned_data['agility_sec'],
-                    speed_sec=form.cleaned_data['speed_sec'],
-                    taken_at=timezone.now()
-                )
-                
-                # Parse and set endurance time
-                endurance_time = form.cleaned_data['endurance_time']
-                fitness_test.set_endurance_from_string(endurance_time)
-                fitness_test.save()
+                # Save the complete test (endurance included) in one transaction
+                record_test(student, 'post', form.cleaned_data, form.cleaned_data['endurance_time'])
                 
                 messages.success(request, 'Post-test saved successfully!')
                 return redirect('student-profile')
@@ -530,7 +433,7 @@ def update_test_view(request, test_id):
     from .models import FitnessTest
     from django.utils import timezone
     
-    student = request.user.student_profile
+    student = request.student
     
     # Get the test and verify ownership
     try:
@@ -567,8 +470,13 @@ def update_test_view(request, test_id):
                 endurance_time = form.cleaned_data['endurance_time']
                 test.set_endurance_from_string(endurance_time)
                 
-                # Save (updated_at will be automatically updated by Django)
-                test.save()
+                # Save (updated_at will be automatically updated by Django). The post_save
+                # receivers move the student's section aggregates by the difference from
+                # the snapshot, so the student row stays locked until they are done and
+                # concurrent edits of the student apply their differences one at a time.
+                with transaction.atomic():
+                    Student.objects.select_for_update().only('pk').get(pk=student.pk)
+                    test.save()
 
                 messages.success(request, "Test record updated successfully!")
                 return redirect('student-history')
@@ -593,7 +501,7 @@ def update_test_view(request, test_id):
         form = FitnessTestForm(initial=initial_data)
 
     # Get pre-test for comparison
-    pre_test = student.fitness_tests.filter(test_type='pre').order_by('-taken_at').first()
+    pre_test = StudentFitnessSnapshot.objects.for_student(student).latest_pre
     
     # Render the form with existing values
     context = {
@@ -610,316 +518,399 @@ def teacher_dashboard(request):
     from .models import updates
     import json
 
-    students= Student.objects.all()
-    
     # Get all updates ordered by most recent
     all_updates = updates.objects.select_related('student').all()[:10]  # Get latest 10 updates
 
-    # Dictionary to store section-wise data
-    section_data = {}
-    sections= {}
-    bmi_status= {}
-
-    # Get Total Pre-Test and Post-Test for each student
-    pre_total_bmi= 0
-    post_total_bmi= 0
-    pre_count_bmi = 0
-    post_count_bmi = 0
-
-    pre_total_vo2= 0
-    post_total_vo2= 0
-    pre_count_vo2 = 0
-    post_count_vo2 = 0
-
-    pre_total_flexibility= 0
-    post_total_flexibility= 0
-    pre_count_flexibility = 0
-    post_count_flexibility = 0
-
-    pre_total_strength= 0
-    post_total_strength= 0
-    pre_count_strength = 0
-    post_count_strength = 0
-
-    pre_total_agility= 0
-    post_total_agility= 0
-    pre_count_agility = 0
-    post_count_agility = 0
-
-    pre_total_speed= 0
-    post_total_speed= 0
-    pre_count_speed = 0
-    post_count_speed = 0
-
-    post_total_endurance= 0
-    pre_total_endurance= 0
-    pre_count_endurance = 0
-    post_count_endurance = 0
-
-    bmi_change= 0
-    bmi_change_count = 0
-    
-    # Lists to store all pre-test and post-test dates
-    pre_test_dates = []
-    post_test_dates = []
-
-    for i, stud in enumerate(students):
-
-        section_key = f'{stud.section_code}-{stud.group_code}'
-        sections[section_key] = None
-        
-        # Initialize section data if not exists
-        if section_key not in section_data:
-            section_data[section_key] = {
-                'pre_total_bmi': 0, 'post_total_bmi': 0, 'pre_count_bmi': 0, 'post_count_bmi': 0,
-                'pre_total_vo2': 0, 'post_total_vo2': 0, 'pre_count_vo2': 0, 'post_count_vo2': 0,
-                'pre_total_flexibility': 0, 'post_total_flexibility': 0, 'pre_count_flexibility': 0, 'post_count_flexibility': 0,
-                'pre_total_strength': 0, 'post_total_strength': 0, 'pre_count_strength': 0, 'post_count_strength': 0,
-                'pre_total_agility': 0, 'post_total_agility': 0, 'pre_count_agility': 0, 'post_count_agility': 0,
-                'pre_total_speed': 0, 'post_total_speed': 0, 'pre_count_speed': 0, 'post_count_speed': 0,
-                'pre_total_endurance': 0, 'post_total_endurance': 0, 'pre_count_endurance': 0, 'post_count_endurance': 0,
-                'bmi_change': 0, 'bmi_change_count': 0
-            }
-
-        pre_test= stud.fitness_tests.filter(test_type='pre').order_by('-taken_at').first()
-        post_test= stud.fitness_tests.filter(test_type='post').order_by('-taken_at').first()
-        
-        # Collect pre-test and post-test dates
-        if pre_test and pre_test.taken_at:
-            pre_test_dates.append(pre_test.taken_at.strftime('%Y-%m-%d'))
-        if post_test and post_test.taken_at:
-            post_test_dates.append(post_test.taken_at.strftime('%Y-%m-%d'))
-        
-        if pre_test and pre_test.bmi:
-            pre_total_bmi += pre_test.bmi
-            pre_count_bmi += 1
-            section_data[section_key]['pre_total_bmi'] += pre_test.bmi
-            section_data[section_key]['pre_count_bmi'] += 1
-        if post_test and post_test.bmi:
-            post_total_bmi += post_test.bmi
-            post_count_bmi += 1
-            section_data[section_key]['post_total_bmi'] += post_test.bmi
-            section_data[section_key]['post_count_bmi'] += 1
-            
-        if pre_test and pre_test.vo2_max:
-            pre_total_vo2 += pre_test.vo2_max
-            pre_count_vo2 += 1
-            section_data[section_key]['pre_total_vo2'] += pre_test.vo2_max
-            section_data[section_key]['pre_count_vo2'] += 1
-        if post_test and post_test.vo2_max:
-            post_total_vo2 += post_test.vo2_max
-            post_count_vo2 += 1
-            section_data[section_key]['post_total_vo2'] += post_test.vo2_max
-            section_data[section_key]['post_count_vo2'] += 1
-            
-        if pre_test and pre_test.flexibility_cm:
-            pre_total_flexibility += pre_test.flexibility_cm
-            pre_count_flexibility += 1
-            section_data[section_key]['pre_total_flexibility'] += pre_test.flexibility_cm
-            section_data[section_key]['pre_count_flexibility'] += 1
-        if post_test and post_test.flexibility_cm:
-            post_total_flexibility += post_test.flexibility_cm
-            post_count_flexibility += 1
-            section_data[section_key]['post_total_flexibility'] += post_test.flexibility_cm
-            section_data[section_key]['post_count_flexibility'] += 1
-            
-        if pre_test and pre_test.strength_reps:
-            pre_total_strength += pre_test.strength_reps
-            pre_count_strength += 1
-            section_data[section_key]['pre_total_strength'] += pre_test.strength_reps
-            section_data[section_key]['pre_count_strength'] += 1
-        if post_test and post_test.strength_reps:
-            post_total_strength += post_test.strength_reps
-            post_count_strength += 1
-            section_data[section_key]['post_total_strength'] += post_test.strength_reps
-            section_data[section_key]['post_count_strength'] += 1
-            
-        if pre_test and pre_test.agility_sec:
-            pre_total_agility += pre_test.agility_sec
-            pre_count_agility += 1
-            section_data[section_key]['pre_total_agility'] += pre_test.agility_sec
-            section_data[section_key]['pre_count_agility'] += 1
-        if post_test and post_test.agility_sec:
-            post_total_agility += post_test.agility_sec
-            post_count_agility += 1
-            section_data[section_key]['post_total_agility'] += post_test.agility_sec
-            section_data[section_key]['post_count_agility'] += 1
-            
-        if pre_test and pre_test.speed_sec:
-            pre_total_speed += pre_test.speed_sec
-            pre_count_speed += 1
-            section_data[section_key]['pre_total_speed'] += pre_test.speed_sec
-            section_data[section_key]['pre_count_speed'] += 1
-        if post_test and post_test.speed_sec:
-            post_total_speed += post_test.speed_sec
-            post_count_speed += 1
-            section_data[section_key]['post_total_speed'] += post_test.speed_sec
-            section_data[section_key]['post_count_speed'] += 1
-            
-        if pre_test and pre_test.endurance_minutes is not None:
-            pre_total_endurance += (pre_test.endurance_minutes * 60) + (pre_test.endurance_seconds or 0)
-            pre_count_endurance += 1
-            section_data[section_key]['pre_total_endurance'] += (pre_test.endurance_minutes * 60) + (pre_test.endurance_seconds or 0)
-            section_data[section_key]['pre_count_endurance'] += 1
-        if post_test and post_test.endurance_minutes is not None:
-            post_total_endurance += (post_test.endurance_minutes * 60) + (post_test.endurance_seconds or 0)
-            post_count_endurance += 1
-            section_data[section_key]['post_total_endurance'] += (post_test.endurance_minutes * 60) + (post_test.endurance_seconds or 0)
-            section_data[section_key]['post_count_endurance'] += 1
-        
-        # Calculate BMI change only for students who have both tests
-        if pre_test and pre_test.bmi and post_test and post_test.bmi:
-            bmi_change += post_test.bmi - pre_test.bmi
-            bmi_change_count += 1
-            section_data[section_key]['bmi_change'] += post_test.bmi - pre_test.bmi
-            section_data[section_key]['bmi_change_count'] += 1
-
-        # Determine BMI status for each student based on post-test BMI
-        if post_test and post_test.bmi: 
-            status = get_bmi_status(post_test.bmi)
-            bmi_status[status] = bmi_status.get(status, 0) + 1
-    
-    # Calculate section averages
-    section_averages = {}
-    for section_key, data in section_data.items():
-        section_averages[section_key] = {
-            'bmi': {
-                'pre': float(data['pre_total_bmi'] / data['pre_count_bmi']) if data['pre_count_bmi'] > 0 else 0,
-                'post': float(data['post_total_bmi'] / data['post_count_bmi']) if data['post_count_bmi'] > 0 else 0,
-            },
-            'vo2_max': {
-                'pre': float(data['pre_total_vo2'] / data['pre_count_vo2']) if data['pre_count_vo2'] > 0 else 0,
-                'post': float(data['post_total_vo2'] / data['post_count_vo2']) if data['post_count_vo2'] > 0 else 0,
-            },
-            'flexibility_cm': {
-                'pre': float(data['pre_total_flexibility'] / data['pre_count_flexibility']) if data['pre_count_flexibility'] > 0 else 0,
-                'post': float(data['post_total_flexibility'] / data['post_count_flexibility']) if data['post_count_flexibility'] > 0 else 0,
-            },
-            'strength_reps': {
-                'pre': float(data['pre_total_strength'] / data['pre_count_strength']) if data['pre_count_strength'] > 0 else 0,
-                'post': float(data['post_total_strength'] / data['post_count_strength']) if data['post_count_strength'] > 0 else 0,
-            },
-            'agility_sec': {
-                'pre': float(data['pre_total_agility'] / data['pre_count_agility']) if data['pre_count_agility'] > 0 else 0,
-                'post': float(data['post_total_agility'] / data['post_count_agility']) if data['post_count_agility'] > 0 else 0,
-            },
-            'speed_sec': {
-                'pre': float(data['pre_total_speed'] / data['pre_count_speed']) if data['pre_count_speed'] > 0 else 0,
-                'post': float(data['post_total_speed'] / data['post_count_speed']) if data['post_count_speed'] > 0 else 0,
-            },
-            'endurance_sec': {
-                'pre': float(data['pre_total_endurance'] / data['pre_count_endurance']) if data['pre_count_endurance'] > 0 else 0,
-                'post': float(data['post_total_endurance'] / data['post_count_endurance']) if data['post_count_endurance'] > 0 else 0,
-            },
-            'bmi_change': float(data['bmi_change'] / data['bmi_change_count']) if data['bmi_change_count'] > 0 else 0,
-        }
-    
-    # Prepare BMI distribution data for chart
-    bmi_distribution = {
-        'underweight': bmi_status.get('Underweight', 0),
-        'normal': bmi_status.get('Normal', 0),
-        'overweight': bmi_status.get('Overweight', 0),
-        'obese': bmi_status.get('Obese', 0),
-    }
-    
-    average= {
-        'bmi': {
-            'pre': pre_total_bmi / pre_count_bmi if pre_count_bmi > 0 else 0,
-            'post': post_total_bmi / post_count_bmi if post_count_bmi > 0 else 0,
-        },
-        'vo2_max': {
-            'pre': pre_total_vo2 / pre_count_vo2 if pre_count_vo2 > 0 else 0,
-            'post': post_total_vo2 / post_count_vo2 if post_count_vo2 > 0 else 0,
-        },
-        'flexibility_cm': {
-            'pre': pre_total_flexibility / pre_count_flexibility if pre_count_flexibility > 0 else 0,
-            'post': post_total_flexibility / post_count_flexibility if post_count_flexibility > 0 else 0,
-        },
-        'strength_reps': {
-            'pre': pre_total_strength / pre_count_strength if pre_count_strength > 0 else 0,
-            'post': post_total_strength / post_count_strength if post_count_strength > 0 else 0,
-        },
-        'agility_sec': {
-            'pre': pre_total_agility / pre_count_agility if pre_count_agility > 0 else 0,
-            'post': post_total_agility / post_count_agility if post_count_agility > 0 else 0,
-        },
-        'speed_sec': {
-            'pre': pre_total_speed / pre_count_speed if pre_count_speed > 0 else 0,
-            'post': post_total_speed / post_count_speed if post_count_speed > 0 else 0,
-        },
-        'endurance_sec': {
-            'pre': pre_total_endurance / pre_count_endurance if pre_count_endurance > 0 else 0,
-            'post': post_total_endurance / post_count_endurance if post_count_endurance > 0 else 0,
-        },
-        'bmi_change': bmi_change / bmi_change_count if bmi_change_count > 0 else 0,
-    }
+    # Key of the cached chart and script fragments; read before the data, so a change
+    # in between leaves the new data under the old (already invalidated) version
+    data_version = dashboard_version()
 
-    # Prepare dates data
-    dates = {
-        'pre_test_dates': pre_test_dates,
-        'post_test_dates': post_test_dates,
-    }
+    # Averages, BMI change and BMI distribution are aggregated in the database and cached
+    aggregates = get_dashboard_aggregates()
+    with timer('serialize'):
+        section_averages_json = json.dumps(aggregates['section_averages'])
     
-    # Prepare individual student test data for date filtering
-    student_tests_data = []
-    for student in students:
-        # Get ALL tests for this student (not just the latest)
-        all_tests = student.fitness_tests.all().order_by('taken_at')
-        
-        for test in all_tests:
-            if not test.taken_at:
-                continue
-                
-            test_data = {
-                'section': f'{student.section_code}-{student.group_code}',
-                'test_type': test.test_type,
-                'date': test.taken_at.strftime('%Y-%m-%d'),
-                'bmi': float(test.bmi) if test.bmi else None,
-                'vo2_max': float(test.vo2_max) if test.vo2_max else None,
-                'flexibility_cm': float(test.flexibility_cm) if test.flexibility_cm else None,
-                'strength_reps': float(test.strength_reps) if test.strength_reps else None,
-                'agility_sec': float(test.agility_sec) if test.agility_sec else None,
-                'speed_sec': float(test.speed_sec) if test.speed_sec else None,
-                'endurance_sec': float(test.endurance_minutes * 60) if test.endurance_minutes is not None else None,
-            }
-            student_tests_data.append(test_data)
-
     context = {
-        'average': average,
-        'total_students': students.count(),
-        'total_sections': len(sections),
-        'bmi_distribution': bmi_distribution,
+        'average': aggregates['average'],
+        'total_students': aggregates['total_students'],
+        'total_sections': len(aggregates['sections']),
+        'bmi_distribution': aggregates['bmi_distribution'],
         'recent_updates': all_updates,
-        'sections': sorted(sections),
-        'section_averages_json': json.dumps(section_averages),
-        'dates': dates,
-        'student_tests_json': json.dumps(student_tests_data),
+        'sections': aggregates['sections'],
+        'section_averages_json': section_averages_json,
+        'stddev': aggregates['stddev'],
+        'dates': aggregates['dates'],
+        'data_version': data_version,
     }
 
     return render(request, 'teacher-dashboard.html', context)
 
+def _parse_date_range(request):
+    """Read optional start_date/end_date (YYYY-MM-DD) query parameters; raises ValueError if malformed."""
+    dates = []
+    for param in ('start_date', 'end_date'):
+        value = request.GET.get(param, '')
+        try:
+            dates.append(datetime.strptime(value, '%Y-%m-%d').date() if value else None)
+        except ValueError:
+            raise ValueError(f'Invalid {param}')
+    return dates
+
+# Page size for the teacher dashboard test data API
+TESTS_PAGE_SIZE = 500
+TESTS_PAGE_MAX = 2000
+
+# Columns read for the teacher dashboard test records
+DASHBOARD_TEST_COLUMNS = [
+    'test_id', 'student__section_code', 'student__group_code', 'test_type', 'taken_at', 'bmi', 'vo2_max',
+] + metrics.TEST_FIELDS
+
+def _dashboard_test_records(rows):
+    """Per-test records used by the teacher dashboard date filter, from DASHBOARD_TEST_COLUMNS rows."""
+    data = metrics.columns(rows, DASHBOARD_TEST_COLUMNS)
+    endurance_sec = metrics.endurance_seconds(data['endurance_minutes'], data['endurance_seconds'])
+    records = []
+    for index, test_id in enumerate(data['test_id']):
+        flexibility = data['flexibility_cm'][index]
+        strength = data['strength_reps'][index]
+        agility = data['agility_sec'][index]
+        speed = data['speed_sec'][index]
+        endurance = endurance_sec[index]
+        records.append({
+            'test_id': test_id,
+            'section': f"{data['student__section_code'][index]}-{data['student__group_code'][index]}",
+            'test_type': data['test_type'][index],
+            'date': data['taken_at'][index].strftime('%Y-%m-%d'),
+            'bmi': data['bmi'][index],
+            'vo2_max': data['vo2_max'][index],
+            'flexibility_cm': float(flexibility) if flexibility else None,
+            'strength_reps': float(strength) if strength else None,
+            'agility_sec': float(agility) if agility else None,
+            'speed_sec': float(speed) if speed else None,
+            'endurance_sec': float(endurance) if endurance is not None else None,
+        })
+    return records
+
+@login_required
+def teacher_tests_api(request):
+    """
+    Stream fitness test records as JSON (staff only).
+
+    API only: no page calls it since the dashboard's date filter switched to the
+    server-side averages of teacher_averages_api. It is for exporting raw records
+    from scripts; TeacherTestsApiTests covers its filters and paging.
+
+    Records are keyset-paginated by test_id: pass the returned `next_cursor` as
+    `after` to fetch the next page. Optional filters: `start_date`/`end_date`
+    (YYYY-MM-DD, inclusive), `section` (e.g. "BSIT-1A-G1") and `bmi_min`/`bmi_max`.
+    """
+    import json
+    from django.http import JsonResponse, StreamingHttpResponse
+
+    if not (request.user.is_staff or request.user.is_superuser):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    try:
+        after = int(request.GET.get('after') or 0)
+        limit = min(max(int(request.GET.get('limit') or TESTS_PAGE_SIZE), 1), TESTS_PAGE_MAX)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor or limit'}, status=400)
+
+    tests = FitnessTest.objects.filter(test_id__gt=after, taken_at__isnull=False)
+
+    # Filter by date range and section ("<section_code>-<group_code>", as shown on the dashboard)
+    try:
+        start_date, end_date = _parse_date_range(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    tests = filter_section(filter_date_range(tests, start_date, end_date), request.GET.get('section', ''))
+
+    # BMI range (e.g. bmi_min=30), filtered on the indexed bmi column
+    try:
+        if request.GET.get('bmi_min'):
+            tests = tests.filter(bmi__gte=float(request.GET['bmi_min']))
+        if request.GET.get('bmi_max'):
+            tests = tests.filter(bmi__lt=float(request.GET['bmi_max']))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid BMI range'}, status=400)
+
+    # Fetch one extra row to know whether another page exists
+    rows = list(tests.values_list(*DASHBOARD_TEST_COLUMNS).order_by('test_id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    def stream():
+        yield '{"results": ['
+        # Derived metrics are computed a chunk of rows at a time
+        for start in range(0, len(rows), TESTS_PAGE_SIZE):
+            records = _dashboard_test_records(rows[start:start + TESTS_PAGE_SIZE])
+            yield (',' if start else '') + ','.join(json.dumps(record) for record in records)
+        last_id = rows[-1][0] if rows else None
+        yield '], "next_cursor": ' + json.dumps(last_id if has_more else None) + '}'
+
+    return StreamingHttpResponse(stream(), content_type='application/json')
+
+@login_required
+def teacher_averages_api(request):
+    """
+    Return per-metric pre/post averages for the teacher dashboard charts (staff only).
+
+    Accepts optional `start_date`/`end_date` (YYYY-MM-DD, inclusive), `section`
+    and `test_type` ('pre' or 'post'). Averages are keyed like section_averages_json.
+    """
+    from django.http import JsonResponse
+
+    if not (request.user.is_staff or request.user.is_superuser):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    try:
+        start_date, end_date = _parse_date_range(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    test_type = request.GET.get('test_type', '')
+    if test_type and test_type not in ('pre', 'post'):
+        return JsonResponse({'success': False, 'error': 'Invalid test_type'}, status=400)
+
+    averages = compute_range_averages(
+        start_date=start_date,
+        end_date=end_date,
+        section=request.GET.get('section', ''),
+        test_type=test_type,
+    )
+    return JsonResponse({'success': True, 'averages': averages})
+
+@login_required
+def export_tests(request):
+    """
+    Stream every fitness test with its student and derived metrics as a CSV download (staff only).
+
+    Accepts the same `start_date`/`end_date` and `section` filters as the test data API.
+    """
+    from django.http import JsonResponse, StreamingHttpResponse
+    from .exporter import export_rows, iter_csv
+
+    if not (request.user.is_staff or request.user.is_superuser):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    try:
+        start_date, end_date = _parse_date_range(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    rows = export_rows(start_date, end_date, request.GET.get('section', ''))
+    response = StreamingHttpResponse(iter_csv(rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="trakfit-tests-{timezone.now():%Y%m%d}.csv"'
+    return response
+
+@login_required
+def import_roster(request):
+    """
+    Bulk-import an uploaded CSV/XLSX roster and/or fitness test results (staff only).
+
+    Returns the number of students and tests created and the per-row errors.
+    See trakfit_app.importer for the expected columns.
+    """
+    from django.conf import settings
+    from django.http import JsonResponse
+    from .importer import import_rows, read_rows
+
+    if not (request.user.is_staff or request.user.is_superuser):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'success': False, 'error': 'No file uploaded'}, status=400)
+
+    try:
+        result = import_rows(
+            read_rows(upload.file, upload.name),
+            default_password=request.POST.get('default_password') or None,
+            hash_workers=settings.TRAKFIT_HASH_WORKERS,
+        )
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    return JsonResponse({'success': True, **result.as_dict()})
+
 @login_required
 def student_management(request):
+    # Only the first page is rendered; the table loads further pages and search results from student_search_api
+    students, next_cursor = _search_students(request.GET.get('q', ''), limit=STUDENTS_PAGE_SIZE)
     data = {
-        'students': Student.objects.all(),
+        'students': students,
+        'next_cursor': next_cursor,
+        'q': request.GET.get('q', ''),
     }
     return render(request, 'student-management.html', data)
 
+# Page size for the student management table and search
+STUDENTS_PAGE_SIZE = 50
+STUDENTS_PAGE_MAX = 200
+
+# Student fields matched by the student management search when the database has
+# no full-text index (each has an index)
+STUDENT_SEARCH_FIELDS = ['student_no', 'first_name', 'last_name', 'section_code', 'group_code', 'user__email']
+
+def _search_students(query, after='', limit=STUDENTS_PAGE_SIZE):
+    """
+    One page of students matching `query`: returns (students, next_cursor),
+    next_cursor being None on the last page.
+
+    Every word of the query must be the start of a word of the student's search
+    document (see search.py); matches are ranked best first and paginated by
+    offset. Without a query, or on a database without a search index, students
+    are ordered by student number and keyset-paginated on student_no, every
+    word having to be the start of one of STUDENT_SEARCH_FIELDS (a
+    "<section>-<group>" word also matches).
+    """
+    from django.db.models import Q
+    from . import search
+
+    if query.strip() and search.enabled():
+        offset = int(after) if after.isdigit() else 0
+        matches = search.search(query, kind=search.STUDENT, limit=limit + 1, offset=offset)
+        found = Student.objects.select_related('user').in_bulk([match['object_id'] for match in matches[:limit]])
+        page = [found[match['object_id']] for match in matches[:limit] if match['object_id'] in found]
+        return page, str(offset + limit) if len(matches) > limit else None
+
+    students = Student.objects.select_related('user').order_by('student_no')
+    for word in query.split():
+        match = Q()
+        for field in STUDENT_SEARCH_FIELDS:
+            match |= Q(**{f'{field}__istartswith': word})
+        section, _, group = word.rpartition('-')
+        if section and group:
+            match |= Q(section_code__iexact=section, group_code__istartswith=group)
+        students = students.filter(match)
+    if after:
+        students = students.filter(student_no__gt=after)
+
+    # Fetch one extra row to know whether another page exists
+    page = list(students[:limit + 1])
+    if len(page) > limit:
+        return page[:limit], page[limit - 1].student_no
+    return page, None
+
+@login_required
+def student_search_api(request):
+    """
+    Return one page of the student management table as JSON (staff only).
+
+    Optional `q` (search words, see _search_students), `after` (the previous
+    page's `next_cursor`) and `limit`.
+    """
+    from django.http import JsonResponse
+    from django.urls import reverse
+    from django.utils.timesince import timesince
+
+    if not (request.user.is_staff or request.user.is_superuser):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    try:
+        limit = min(max(int(request.GET.get('limit') or STUDENTS_PAGE_SIZE), 1), STUDENTS_PAGE_MAX)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid limit'}, status=400)
+
+    students, next_cursor = _search_students(request.GET.get('q', ''), request.GET.get('after', ''), limit)
+    results = [
+        {
+            'student_no': student.student_no,
+            'name': f"{student.first_name} {student.last_name}",
+            'section': f"{student.section_code}-{student.group_code}" if student.group_code else student.section_code,
+            'age': student.age,
+            'gender': student.gender,
+            'email': student.user.email,
+            'last_update': f"{timesince(student.updated_at)} ago",
+            'url': reverse('student_profile', args=[student.student_no]),
+        }
+        for student in students
+    ]
+    return JsonResponse({'success': True, 'results': results, 'next_cursor': next_cursor})
+
+@login_required
+def search_api(request):
+    """
+    Ranked full-text search over students and fitness test remarks (staff only).
+
+    `q` (search words, each matching the start of a word), optional `kind`
+    ('student' or 'remark'), `offset` and `limit`. Every result carries the
+    student and a highlighted snippet; remark results also carry their test.
+    """
+    from django.http import JsonResponse
+    from django.urls import reverse
+    from .models import FitnessTest
+    from . import search
+
+    if not (request.user.is_staff or request.user.is_superuser):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    kind = request.GET.get('kind') or None
+    if kind not in (None, search.STUDENT, search.REMARK):
+        return JsonResponse({'success': False, 'error': 'Invalid kind'}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit') or STUDENTS_PAGE_SIZE), 1), STUDENTS_PAGE_MAX)
+        offset = max(int(request.GET.get('offset') or 0), 0)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid limit or offset'}, status=400)
+    if not search.enabled():
+        return JsonResponse({'success': False, 'error': 'Search is not available on this database'}, status=503)
+
+    matches = search.search(request.GET.get('q', ''), kind=kind, limit=limit + 1, offset=offset)
+    page = matches[:limit]
+
+    # One query for the students and one for the tests of the page
+    students = Student.objects.in_bulk({match['student_id'] for match in page})
+    tests = FitnessTest.objects.only('test_id', 'test_type', 'sequence_no', 'taken_at').in_bulk(
+        [match['object_id'] for match in page if match['kind'] == search.REMARK]
+    )
+    results = []
+    for match in page:
+        student = students.get(match['student_id'])
+        if student is None:
+            continue
+        result = {
+            'kind': match['kind'],
+            'student_no': student.student_no,
+            'name': f"{student.first_name} {student.last_name}",
+            'section': f"{student.section_code}-{student.group_code}" if student.group_code else student.section_code,
+            'snippet': match['snippet'],
+            'url': reverse('student_profile', args=[student.student_no]),
+        }
+        if match['kind'] == search.REMARK:
+            test = tests.get(match['object_id'])
+            if test is None:
+                continue
+            result.update({
+                'test_id': test.test_id,
+                'test_type': test.test_type,
+                'sequence_no': test.sequence_no,
+                'taken_at': test.taken_at.isoformat(),
+            })
+        results.append(result)
+    next_offset = offset + limit if len(matches) > limit else None
+    return JsonResponse({'success': True, 'results': results, 'next_offset': next_offset})
+
 @login_required
 def student_profile(request, student_no):
     from .models import FitnessTest
     
     student = Student.objects.get(student_no=student_no)
-    
-    # Get pre-test and post-test
-
-    tests= student.fitness_tests.all().order_by('-taken_at')
+    # Key of the cached test list and script fragments, read before the tests (see teacher_dashboard)
+    data_version = student_version(student.user_id)
     
     template = "student-profile.html"
 
-    # Get pre-test (only one per student ever)
-    pre_test = student.fitness_tests.filter(test_type='pre').order_by('-taken_at').first()
-    post_test = student.fitness_tests.filter(test_type='post').order_by('-taken_at').first()
+    # Get pre-test (only one per student ever) and latest post-test from the snapshot
+    snapshot = StudentFitnessSnapshot.objects.for_student(student)
+    pre_test = snapshot.latest_pre
+    post_test = snapshot.latest_post
+
+    # Get all tests (most recent first), each paired with the test taken before it
+    timeline = TestTimeline(student.fitness_tests.all().order_by('-taken_at'), pre_test=pre_test, precision=2)
+    tests = timeline.tests
     
     # Compute endurance as decimal minutes (minutes + seconds/60) for chart rendering
     def _endurance_decimal(test):
@@ -935,60 +926,17 @@ def student_profile(request, student_no):
     pre_endurance_decimal = _endurance_decimal(pre_test)
     post_endurance_decimal = _endurance_decimal(post_test)
     
-    # Get all tests ordered by date for finding previous test
-    all_tests_ordered = list(student.fitness_tests.all().order_by('-taken_at'))
-
-    # Get all post-tests ordered by taken_at to calculate post-test numbers
-    post_tests_ordered = student.fitness_tests.filter(test_type='post').order_by('taken_at')
-    post_test_numbers = {test.test_id: idx + 1 for idx, test in enumerate(post_tests_ordered)}
-    
     # Prepare test data with BMI, VO2 Max, remarks, pre-test, and previous test for JSON
     tests_data = []
-    for idx, test in enumerate(tests):
-        # Get remarks for this test
-
-        # Build pre-test data
-        pre_test_data = None
-        if pre_test:
-            pre_test_data = {
-                'test_id': pre_test.test_id,
-                'bmi': round(pre_test.bmi, 2) if pre_test.bmi else None,
-                'vo2_max': round(pre_test.vo2_max, 2) if pre_test.vo2_max else None,
-                'height_cm': float(pre_test.height_cm) if pre_test.height_cm else None,
-                'weight_kg': float(pre_test.weight_kg) if pre_test.weight_kg else None,
-                'flexibility_cm': float(pre_test.flexibility_cm) if pre_test.flexibility_cm else None,
-                'strength_reps': pre_test.strength_reps,
-                'agility_sec': float(pre_test.agility_sec) if pre_test.agility_sec else None,
-                'speed_sec': float(pre_test.speed_sec) if pre_test.speed_sec else None,
-                'endurance_display': pre_test.get_endurance_display(),
-            }
+    for test, previous_test in timeline:
+        # Pre-test baseline is serialized once; previous test is looked up in O(1)
+        pre_test_data = timeline.pre_test_data
+        previous_test_data = timeline.serialize(previous_test)
 
-        # Find previous test (the one taken before the current test)
-        previous_test_data = None
-        try:
-            # Find the current test in the all_tests_ordered list
-            current_test_index = next(i for i, t in enumerate(all_tests_ordered) if t.test_id == test.test_id)
-            # Previous test is the next one in the list (since list is sorted by -taken_at)
-            if current_test_index + 1 < len(all_tests_ordered):
-                previous_test = all_tests_ordered[current_test_index + 1]
-                previous_test_data = {
-                    'test_id': previous_test.test_id,
-                    'bmi': round(previous_test.bmi, 2) if previous_test.bmi else None,
-                    'vo2_max': round(previous_test.vo2_max, 2) if previous_test.vo2_max else None,
-                    'height_cm': float(previous_test.height_cm) if previous_test.height_cm else None,
-                    'weight_kg': float(previous_test.weight_kg) if previous_test.weight_kg else None,
-                    'flexibility_cm': float(previous_test.flexibility_cm) if previous_test.flexibility_cm else None,
-                    'strength_reps': previous_test.strength_reps,
-                    'agility_sec': float(previous_test.agility_sec) if previous_test.agility_sec else None,
-                    'speed_sec': float(previous_test.speed_sec) if previous_test.speed_sec else None,
-                    'endurance_display': previous_test.get_endurance_display(),
-                }
-        except StopIteration:
-            pass
-
-        # Get post-test number for this test if it's a post-test
-        post_test_number = post_test_numbers.get(test.test_id, None) if test.test_type == 'post' else None
+        # Post-test number is stored on the test
+        post_test_number = test.sequence_no if test.test_type == 'post' else None
 
+        derived = timeline.derived(test)
         test_dict = {
             'test_id': test.test_id,
             'test_type': test.get_test_type_display(),
@@ -996,15 +944,15 @@ def student_profile(request, student_no):
             'post_test_number': post_test_number,
             'taken_at': test.taken_at.strftime('%B %d, %Y') if test.taken_at else 'N/A',
             'updated_at': test.updated_at.strftime('%B %d, %Y') if test.updated_at else 'N/A',
-            'bmi': round(test.bmi, 2) if test.bmi else None,
-            'vo2_max': round(test.vo2_max, 2) if test.vo2_max else None,
+            'bmi': round(derived['bmi'], 2) if derived['bmi'] else None,
+            'vo2_max': round(derived['vo2_max'], 2) if derived['vo2_max'] else None,
             'height_cm': float(test.height_cm) if test.height_cm else None,
             'weight_kg': float(test.weight_kg) if test.weight_kg else None,
             'flexibility_cm': float(test.flexibility_cm) if test.flexibility_cm else None,
             'strength_reps': test.strength_reps,
             'agility_sec': float(test.agility_sec) if test.agility_sec else None,
             'speed_sec': float(test.speed_sec) if test.speed_sec else None,
-            'endurance_display': test.get_endurance_display(),
+            'endurance_display': derived['endurance_display'],
             'remarks': test.remarks,
             'remarksCreated': test.remarksCreated.strftime('%B %d, %Y') if test.remarksCreated else None,
             'pre_test': pre_test_data,
@@ -1013,6 +961,8 @@ def student_profile(request, student_no):
         tests_data.append(test_dict)
 
     import json
+    with timer('serialize'):
+        tests_json = json.dumps(tests_data)
     
     data = {
         'student': student,
@@ -1021,7 +971,8 @@ def student_profile(request, student_no):
         'post_test': post_test,
         'pre_endurance_decimal': pre_endurance_decimal,
         'post_endurance_decimal': post_endurance_decimal,
-        'tests_json': json.dumps(tests_data),
+        'tests_json': tests_json,
+        'data_version': data_version,
     }
 
 
@@ -1067,25 +1018,12 @@ def add_remark(request):
 def change_password(request):
     return render(request, 'change-password.html')
 
-def get_bmi_status(bmi):
-    """Helper function to categorize BMI"""
-    if bmi is None:
-        return 'N/A'
-    if bmi < 18.5:
-        return 'Underweight'
-    elif bmi < 25:
-        return 'Normal'
-    elif bmi < 30:
-        return 'Overweight'
-    else:
-        return 'Obese'
-
 @login_required
 def student_history(request):
     from datetime import datetime
     import json
     
-    student = request.user.student_profile
+    student = request.student
     
     # Get all fitness tests for the student, sorted by latest first
     tests = student.fitness_tests.all().order_by('-taken_at')
@@ -1115,74 +1053,39 @@ def student_history(request):
             pass
     
     # Get pre-test (only one per student ever)
-    pre_test = student.fitness_tests.filter(test_type='pre').order_by('-taken_at').first()
+    pre_test = StudentFitnessSnapshot.objects.for_student(student).latest_pre
 
-    # Get all tests ordered by date for finding previous test
-    all_tests_ordered = list(student.fitness_tests.all().order_by('-taken_at'))
+    # Get all tests (unfiltered) so each test is compared with the one actually taken before it
+    timeline = TestTimeline(student.fitness_tests.all().order_by('-taken_at'), pre_test=pre_test)
     
     # Prepare test data with BMI, VO2 Max, remarks, pre-test, and previous test for JSON
     tests_data = []
-    for idx, test in enumerate(tests):
+    for test in tests:
         # Get remarks for this test (now stored as text field)
         remarks_text = test.remarks if test.remarks else None
         
-        # Build pre-test data
-        pre_test_data = None
-        if pre_test:
-            pre_test_data = {
-                'test_id': pre_test.test_id,
-                'height_cm': float(pre_test.height_cm) if pre_test.height_cm else None,
-                'weight_kg': float(pre_test.weight_kg) if pre_test.weight_kg else None,
-                'bmi': round(pre_test.bmi, 1) if pre_test.bmi else None,
-                'vo2_distance_m': float(pre_test.vo2_distance_m) if pre_test.vo2_distance_m else None,
-                'vo2_max': round(pre_test.vo2_max, 1) if pre_test.vo2_max else None,
-                'flexibility_cm': float(pre_test.flexibility_cm) if pre_test.flexibility_cm else None,
-                'strength_reps': pre_test.strength_reps,
-                'agility_sec': float(pre_test.agility_sec) if pre_test.agility_sec else None,
-                'speed_sec': float(pre_test.speed_sec) if pre_test.speed_sec else None,
-                'endurance_display': pre_test.get_endurance_display(),
-            }
-        
-        # Find previous test (the one taken before the current test)
-        previous_test_data = None
-        try:
-            # Find the current test in the all_tests_ordered list
-            current_test_index = next(i for i, t in enumerate(all_tests_ordered) if t.test_id == test.test_id)
-            # Previous test is the next one in the list (since list is sorted by -taken_at)
-            if current_test_index + 1 < len(all_tests_ordered):
-                previous_test = all_tests_ordered[current_test_index + 1]
-                previous_test_data = {
-                    'test_id': previous_test.test_id,
-                    'height_cm': float(previous_test.height_cm) if previous_test.height_cm else None,
-                    'weight_kg': float(previous_test.weight_kg) if previous_test.weight_kg else None,
-                    'bmi': round(previous_test.bmi, 1) if previous_test.bmi else None,
-                    'vo2_distance_m': float(previous_test.vo2_distance_m) if previous_test.vo2_distance_m else None,
-                    'vo2_max': round(previous_test.vo2_max, 1) if previous_test.vo2_max else None,
-                    'flexibility_cm': float(previous_test.flexibility_cm) if previous_test.flexibility_cm else None,
-                    'strength_reps': previous_test.strength_reps,
-                    'agility_sec': float(previous_test.agility_sec) if previous_test.agility_sec else None,
-                    'speed_sec': float(previous_test.speed_sec) if previous_test.speed_sec else None,
-                    'endurance_display': previous_test.get_endurance_display(),
-                }
-        except StopIteration:
-            pass
+        # Pre-test baseline is serialized once; previous test is looked up in O(1)
+        pre_test_data = timeline.pre_test_data
+        previous_test_data = timeline.previous_data(test)
+        derived = timeline.derived(test)
         
         test_dict = {
             'test_id': test.test_id,
             'test_type': test.get_test_type_display(),
             'test_type_key': test.test_type,
+            'sequence_no': test.sequence_no,
             'taken_at': test.taken_at.strftime('%B %d, %Y') if test.taken_at else 'N/A',
             'updated_at': test.updated_at.strftime('%B %d, %Y') if test.updated_at else 'N/A',
             'height_cm': float(test.height_cm) if test.height_cm else None,
             'weight_kg': float(test.weight_kg) if test.weight_kg else None,
-            'bmi': round(test.bmi, 1) if test.bmi else None,
+            'bmi': round(derived['bmi'], 1) if derived['bmi'] else None,
             'vo2_distance_m': float(test.vo2_distance_m) if test.vo2_distance_m else None,
-            'vo2_max': round(test.vo2_max, 1) if test.vo2_max else None,
+            'vo2_max': round(derived['vo2_max'], 1) if derived['vo2_max'] else None,
             'flexibility_cm': float(test.flexibility_cm) if test.flexibility_cm else None,
             'strength_reps': test.strength_reps,
             'agility_sec': float(test.agility_sec) if test.agility_sec else None,
             'speed_sec': float(test.speed_sec) if test.speed_sec else None,
-            'endurance_display': test.get_endurance_display(),
+            'endurance_display': derived['endurance_display'],
             'remarks': remarks_text,
             'remarksCreated': test.remarksCreated.strftime('%B %d, %Y at %I:%M %p') if test.remarksCreated else None,
             'pre_test': pre_test_data,
@@ -1190,10 +1093,13 @@ def student_history(request):
         }
         tests_data.append(test_dict)
     
+    with timer('serialize'):
+        tests_json = json.dumps(tests_data)
+
     context = {
         'student': student,
         'tests': tests,
-        'tests_json': json.dumps(tests_data),
+        'tests_json': tests_json,
         'test_type_filter': test_type,
         'start_date_filter': start_date,
         'end_date_filter': end_date,